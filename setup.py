@@ -26,6 +26,10 @@ setup(
         'requests>=2,<3',
         'colorlog>=3.0.1'
     ],
+    extras_require={
+        'async': ['aiohttp>=3.5'],
+        'thumbnails': ['Pillow']
+    },
     test_suite='tests',
     entry_points={
         'console_scripts': [
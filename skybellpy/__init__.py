@@ -13,18 +13,35 @@ Published under the MIT license - See LICENSE file for more details.
 "Skybell" is a trademark owned by SkyBell Technologies, Inc, see
 www.skybell.com for more information. I am in no way affiliated with Skybell.
 """
-import os.path
+import collections
+import functools
 import json
 import logging
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
 import requests
 from requests.exceptions import RequestException
 
-from skybellpy.device import SkybellDevice
+from skybellpy.auth import TokenManager
+from skybellpy.cache import PickleCache
+from skybellpy.device import SkybellDevice, _deadline
+from skybellpy.images import ImageCache
+from skybellpy.media import MediaCache
+from skybellpy.pool import PoolStats, SkybellAdapter
+from skybellpy.push import SkybellPush
+from skybellpy.reconcile import ReconcileReport, desired_settings
+from skybellpy.retry import (
+    CircuitBreaker, backoff_delay, endpoint_family, is_retryable,
+    is_transient)
+from skybellpy.scheduler import RateLimiter, SkybellScheduler
 from skybellpy.exceptions import (
     SkybellAuthenticationException, SkybellException)
 import skybellpy.helpers.constants as CONST
 import skybellpy.helpers.errors as ERROR
+import skybellpy.settings as SETTINGS
 import skybellpy.utils as UTILS
 
 _LOGGER = logging.getLogger(__name__)
@@ -37,17 +54,115 @@ class Skybell():
                  auto_login=False, get_devices=False,
                  cache_path=CONST.CACHE_PATH, disable_cache=False,
                  agent_identifier=CONST.DEFAULT_AGENT_IDENTIFIER,
-                 login_sleep=True):
+                 login_sleep=True, max_workers=0, cache_backend=None,
+                 cache_flush_interval=0, endpoint_ttls=None,
+                 bulk_hydrate=False, lazy_load=False,
+                 requests_per_second=None,
+                 max_retries=CONST.DEFAULT_MAX_RETRIES,
+                 backoff_base=CONST.DEFAULT_BACKOFF_BASE,
+                 breaker_threshold=CONST.DEFAULT_BREAKER_THRESHOLD,
+                 breaker_cooldown=CONST.DEFAULT_BREAKER_COOLDOWN,
+                 token_lifetime=None, pool_size=None, pool_block=False,
+                 keep_alive=True, timeout=CONST.DEFAULT_TIMEOUT,
+                 activity_retention=CONST.DEFAULT_ACTIVITY_RETENTION,
+                 activity_max_age=None, keep_activity_json=False,
+                 activity_archive=None, media_cache=None,
+                 image_cache_size=CONST.DEFAULT_IMAGE_CACHE_SIZE,
+                 optimistic_settings=False):
         """Init Abode object."""
         self._username = username
         self._password = password
         self._session = None
         self._cache_path = cache_path
         self._disable_cache = disable_cache
+        self._cache_backend = cache_backend or PickleCache(cache_path)
+        self._cache_flush_interval = cache_flush_interval
         self._devices = None
-        self._session = requests.session()
         self._user_agent = '{} ({})'.format(CONST.USER_AGENT, agent_identifier)
         self._login_sleep = login_sleep
+        self._bulk_hydrate = bulk_hydrate
+        self._lazy_load = lazy_load
+        self._scheduler = None
+        self._push = None
+
+        # One warm pool is kept for the life of the client, a worker pool
+        # bigger than the connection pool would keep reconnecting
+        self._pool_stats = PoolStats()
+        self._pool_size = pool_size or max(CONST.DEFAULT_POOL_SIZE,
+                                           max_workers)
+        self._pool_block = pool_block
+        self._keep_alive = keep_alive
+
+        # Connect and read timeouts so a hung connection can't stall us
+        if not isinstance(timeout, (list, tuple)):
+            timeout = (timeout, timeout)
+
+        self._timeout = tuple(timeout)
+        self._session = self._new_session()
+
+        # Logins are single-flight, later callers share the result
+        self._login_lock = threading.RLock()
+        self._login_generation = 0
+        self._login_error = None
+        self._devices_lock = threading.RLock()
+
+        # New tokens settle before use instead of sleeping after a login
+        self._token_manager = TokenManager(
+            self, CONST.LOGIN_SETTLE_TIME if login_sleep else 0,
+            token_lifetime)
+
+        # Global request budget shared by every caller
+        self._rate_limiter = None
+
+        if requests_per_second:
+            self._rate_limiter = RateLimiter(requests_per_second)
+
+        # Backoff for throttled or failing requests
+        self._max_retries = max_retries
+        self._backoff_base = backoff_base
+        self._breaker_threshold = breaker_threshold
+        self._breaker_cooldown = breaker_cooldown
+        self._breakers = {}
+        self._breaker_lock = threading.Lock()
+
+        # Per endpoint freshness policy for device refreshes
+        self._endpoint_ttls = dict(CONST.DEFAULT_ENDPOINT_TTLS)
+
+        for endpoint, ttl in (endpoint_ttls or {}).items():
+            if endpoint not in self._endpoint_ttls:
+                raise SkybellException(ERROR.INVALID_ENDPOINT, endpoint)
+
+            self._endpoint_ttls[endpoint] = ttl
+
+        # How many activities, and for how many seconds, devices keep
+        self._activity_retention = (activity_retention, activity_max_age)
+        self._keep_activity_json = keep_activity_json
+
+        # Optional ActivityArchive keeping every activity seen
+        self._activity_archive = activity_archive
+        self._media_cache = media_cache or MediaCache()
+        self._image_cache = ImageCache(self._media_cache, image_cache_size)
+
+        # Setters show new values at once and confirm them in the background
+        self._optimistic_settings = optimistic_settings
+
+        # Per url validators used to revalidate GET requests
+        self._validators = {}
+        self._stats = collections.Counter()
+        self._stats_lock = threading.Lock()
+
+        # Optional worker pool shared by all devices for concurrent requests
+        self._executor = None
+        self._local = threading.local()
+
+        if max_workers:
+            self._executor = ThreadPoolExecutor(max_workers=max_workers)
+
+        # Cache writes are coalesced by tracking which keys changed
+        self._cache_lock = threading.RLock()
+        self._cache_dirty = set()
+        self._cache_flushed_at = None
+        self._cache_timer = None
 
         # Create a new cache template
         self._cache = {
@@ -71,7 +186,66 @@ class Skybell():
             self.get_devices()
 
     def login(self, username=None, password=None, sleep=False):
-        """Execute Skybell login."""
+        """Execute Skybell login.
+
+        Only one login runs at a time. Callers that waited on a login that
+        was already running share its result instead of logging in again.
+        """
+        generation = self._login_generation
+
+        with self._login_lock:
+            if (generation != self._login_generation and
+                    username is None and password is None):
+                if self._login_error is not None:
+                    raise self._login_error
+
+                return True
+
+            try:
+                self._login(username, password)
+                self._login_error = None
+            except SkybellException as exc:
+                self._login_error = exc
+                raise
+            finally:
+                self._login_generation += 1
+
+        return True
+
+    def _login(self, username=None, password=None):
+        """Send the login request and store the new access token."""
+        login_data = self._login_data(username, password)
+
+        try:
+            response = self.send_request('post', CONST.LOGIN_URL,
+                                         json_data=login_data, retry=False)
+        except Exception as exc:
+            raise SkybellAuthenticationException(ERROR.LOGIN_FAILED, exc)
+
+        self._login_success(response.text)
+
+    def _reauthorize(self, failed_token):
+        """Log in again unless another caller already replaced the token."""
+        with self._login_lock:
+            if self.cache(CONST.ACCESS_TOKEN) == failed_token:
+                self.login()
+
+    def refresh_token(self):
+        """Get a new access token while the current one stays in use."""
+        login_data = self._login_data(clear_token=False)
+
+        try:
+            response = self.send_request('post', CONST.LOGIN_URL,
+                                         json_data=login_data, retry=False)
+        except Exception as exc:
+            raise SkybellAuthenticationException(ERROR.LOGIN_FAILED, exc)
+
+        self._login_success(response.text, replace=True)
+
+        return True
+
+    def _login_data(self, username=None, password=None, clear_token=True):
+        """Validate credentials and build the login request body."""
         if username is not None:
             self._username = username
         if password is not None:
@@ -83,98 +257,398 @@ class Skybell():
         if self._password is None or not isinstance(self._password, str):
             raise SkybellAuthenticationException(ERROR.PASSWORD)
 
-        self.update_cache(
-            {
-                CONST.ACCESS_TOKEN: None
-            })
+        if clear_token:
+            self.update_cache(
+                {
+                    CONST.ACCESS_TOKEN: None
+                })
 
-        self._session = requests.session()
-
-        login_data = {
+        return {
             'username': self._username,
             'password': self._password,
             'appId': self.cache(CONST.APP_ID),
             CONST.TOKEN: self.cache(CONST.TOKEN)
         }
 
-        try:
-            response = self.send_request('post', CONST.LOGIN_URL,
-                                         json_data=login_data, retry=False)
-        except Exception as exc:
-            raise SkybellAuthenticationException(ERROR.LOGIN_FAILED, exc)
-
-        _LOGGER.debug("Login Response: %s", response.text)
+    def _login_success(self, response_text, replace=False, loop=None):
+        """Hand the access token from a login response to the manager."""
+        _LOGGER.debug("Login Response: %s", response_text)
 
-        response_object = json.loads(response.text)
+        response_object = json.loads(response_text)
 
-        self.update_cache({
-            CONST.ACCESS_TOKEN: response_object[CONST.ACCESS_TOKEN]})
+        self._token_manager.issued(response_object[CONST.ACCESS_TOKEN],
+                                   replace, loop)
 
-        if self._login_sleep:
-            _LOGGER.info("Login successful, waiting 5 seconds...")
-            time.sleep(5)
-        else:
+        if self._token_manager.ready:
             _LOGGER.info("Login successful")
+        else:
+            _LOGGER.info("Login successful, token usable in %s seconds",
+                         CONST.LOGIN_SETTLE_TIME)
 
-        return True
+    @property
+    def token_ready(self):
+        """Get if the access token may be used for requests."""
+        return self._token_manager.ready
 
     def logout(self):
         """Explicit Skybell logout."""
-        if self.cache(CONST.ACCESS_TOKEN):
-            # No explicit logout call as it doesn't seem to matter
-            # if a logout happens without registering the app which
-            # we aren't currently doing.
-            self._session = requests.session()
-            self._devices = None
+        # Never hold both locks, get_devices() holds the devices lock while
+        # its requests may need the login lock to log in again
+        with self._login_lock:
+            logged_in = bool(self.cache(CONST.ACCESS_TOKEN))
+
+            if logged_in:
+                # No explicit logout call as it doesn't seem to matter
+                # if a logout happens without registering the app which
+                # we aren't currently doing. The connection pool is kept.
+                self._session.cookies.clear()
+                self._validators = {}
+                self._token_manager.invalidate()
 
-            self.update_cache({CONST.ACCESS_TOKEN: None})
+                self.update_cache({CONST.ACCESS_TOKEN: None})
+
+        if logged_in:
+            with self._devices_lock:
+                self._devices = None
 
         return True
 
     def get_devices(self, refresh=False):
         """Get all devices from Abode."""
-        if refresh or self._devices is None:
-            if self._devices is None:
-                self._devices = {}
+        with self._devices_lock:
+            if refresh or self._devices is None:
+                self._update_devices()
 
-            _LOGGER.info("Updating all devices...")
-            response = self.send_request("get", CONST.DEVICES_URL)
-            response_object = json.loads(response.text)
+            return list(self._devices.values())
 
-            _LOGGER.debug("Get Devices Response: %s", response.text)
+    def _update_devices(self):
+        """Request the device list and create or update every device."""
+        if self._devices is None:
+            self._devices = {}
 
-            for device_json in response_object:
-                # Attempt to reuse an existing device
-                device = self._devices.get(device_json['id'])
+        _LOGGER.info("Updating all devices...")
 
-                # No existing device, create a new one
-                if device:
-                    device.update(device_json)
-                else:
-                    device = SkybellDevice(device_json, self)
-                    self._devices[device.device_id] = device
+        # Subscriptions embed the same device json as the device list, so
+        # either way info, settings and activities are requested per device
+        if self._bulk_hydrate:
+            response = self.send_request("get", CONST.SUBSCRIPTIONS_URL)
+            entries = _subscription_entries(json.loads(response.text))
+        else:
+            response = self.send_request("get", CONST.DEVICES_URL)
+            entries = [(device_json, _device_seed(device_json))
+                       for device_json in json.loads(response.text)]
+
+        _LOGGER.debug("Get Devices Response: %s", response.text)
+
+        for device_json, seed in entries:
+            # Attempt to reuse an existing device
+            device = self._devices.get(device_json['id'])
 
-        return list(self._devices.values())
+            # No existing device, create a new one
+            if device:
+                device.update(device_json)
+                device.hydrate(seed)
+            else:
+                device = SkybellDevice(device_json, self, seed)
+                self._devices[device.device_id] = device
 
     def get_device(self, device_id, refresh=False):
         """Get a single device."""
-        if self._devices is None:
-            self.get_devices()
-            refresh = False
+        with self._devices_lock:
+            if self._devices is None:
+                self.get_devices()
+                refresh = False
 
-        device = self._devices.get(device_id)
+            device = self._devices.get(device_id)
 
         if device and refresh:
             device.refresh()
 
         return device
 
+    def apply_settings(self, settings, timeout=None, force=False):
+        """Apply settings to several devices, one PATCH per device.
+
+        settings maps device ids to settings. Everything is validated
+        before any request is sent and the requests run on the worker pool
+        if one is set. Unless force is set only changed settings are sent.
+        Returns a tuple of (results, errors) dicts keyed by device id.
+        """
+        if self._devices is None:
+            self.get_devices()
+
+        self._validate_device_settings(settings)
+
+        return self.gather(
+            ((device_id, functools.partial(
+                self._devices[device_id].apply_settings, device_settings,
+                force))
+             for device_id, device_settings in settings.items()),
+            _deadline(timeout))
+
+    def reconcile(self, desired, dry_run=False, refresh=False,
+                  attempts=CONST.DEFAULT_RECONCILE_ATTEMPTS, timeout=None):
+        """Bring devices to the settings of a desired state document.
+
+        Only the settings that differ from the known device settings are
+        sent, one PATCH per device on the worker pool if one is set and
+        under the request rate limit. Devices failing with a transient
+        error are tried again up to attempts times. With dry_run the plan
+        is computed without sending anything. Returns a ReconcileReport.
+        """
+        if refresh or self._devices is None:
+            self.get_devices(refresh=refresh)
+
+        report = self._reconcile_plan(desired, dry_run)
+        deadline = _deadline(timeout)
+        pending = {} if dry_run else {
+            device_id: settings
+            for device_id, settings in report.plan.items() if settings}
+        attempt = 0
+
+        while pending:
+            results, errors = self.gather(
+                ((device_id, functools.partial(
+                    self._devices[device_id].apply_settings, settings))
+                 for device_id, settings in pending.items()), deadline)
+
+            pending = self._reconcile_round(report, pending, results,
+                                            errors, attempt, attempts)
+            attempt += 1
+
+            if pending:
+                delay = self._reconcile_delay(report, pending, attempt,
+                                              deadline)
+
+                if delay is None:
+                    break
+
+                time.sleep(delay)
+
+        return report
+
+    def _reconcile_plan(self, desired, dry_run):
+        """Validate a desired state and diff it against every device."""
+        desired = desired_settings(desired, self._devices)
+        self._validate_device_settings(desired)
+
+        return ReconcileReport(
+            {device_id: self._devices[device_id].settings_diff(settings)
+             for device_id, settings in desired.items()}, dry_run)
+
+    @staticmethod
+    def _reconcile_round(report, pending, results, errors, attempt,
+                         attempts):
+        """Record a round of settings writes, returning what to retry."""
+        retry = {}
+
+        for device_id in pending:
+            report.attempts[device_id] = attempt + 1
+
+        report.applied.update(results)
+
+        for device_id, exc in errors.items():
+            if attempt + 1 < attempts and is_transient(exc):
+                retry[device_id] = pending[device_id]
+            else:
+                report.failed[device_id] = exc
+
+        return retry
+
+    def _reconcile_delay(self, report, pending, attempt, deadline):
+        """Get how long to back off before retrying failed devices.
+
+        Returns None, failing the devices, if the retry would only happen
+        past the deadline.
+        """
+        delay = backoff_delay(attempt - 1, self._backoff_base)
+
+        if deadline is not None and delay >= deadline - time.monotonic():
+            for device_id in pending:
+                report.failed[device_id] = SkybellException(
+                    ERROR.DEADLINE_EXCEEDED, device_id)
+
+            return None
+
+        return delay
+
+    def _validate_device_settings(self, settings):
+        """Validate the settings of every device before any is sent."""
+        for device_id, device_settings in settings.items():
+            if device_id not in self._devices:
+                raise SkybellException(ERROR.UNKNOWN_DEVICE, device_id)
+
+            SETTINGS.validate_settings(device_settings)
+
+    def prefetch(self, endpoints=None):
+        """Load endpoints for every device, concurrently if enabled."""
+        _, errors = self.gather(
+            (device.device_id,
+             functools.partial(device.prefetch, endpoints))
+            for device in self.get_devices())
+
+        if errors:
+            raise SkybellException(ERROR.ENDPOINT_REQUESTS_FAILED, errors)
+
+    @property
+    def lazy_load(self):
+        """Get if device endpoints are only requested on first use."""
+        return self._lazy_load
+
     def send_request(self, method, url, headers=None,
-                     json_data=None, retry=True):
-        """Send requests to Skybell."""
+                     json_data=None, retry=True, conditional=False,
+                     deadline=None):
+        """Send requests to Skybell.
+
+        A conditional request sends the validators stored for the url and
+        may return a 304 response with no body if nothing has changed.
+        The optional deadline, a time.monotonic() value, bounds the request
+        and its retries.
+        """
         if not self.cache(CONST.ACCESS_TOKEN) and url != CONST.LOGIN_URL:
-            self.login()
+            self._reauthorize(None)
 
+        breaker = self._breaker(url)
+        reauthorized = not retry
+        check_breaker = True
+        attempt = 0
+
+        while True:
+            # Share the wait for a new token instead of sleeping per login
+            if url != CONST.LOGIN_URL and \
+                    not self._token_manager.wait(self._remaining(deadline)):
+                raise SkybellException(ERROR.DEADLINE_EXCEEDED, url)
+
+            timeout = self._request_timeout(deadline)
+
+            # Past this point every attempt settles the breaker, the retry
+            # after logging in again is part of the same attempt
+            if check_breaker:
+                self._check_breaker(breaker, url)
+
+            check_breaker = True
+
+            # Rebuilt every attempt so a new access token is picked up
+            token = self.cache(CONST.ACCESS_TOKEN)
+            request_headers = self._request_headers(dict(headers or {}))
+
+            if conditional:
+                request_headers.update(self._validators.get(url, {}))
+
+            _LOGGER.debug("HTTP %s %s Request with headers: %s",
+                          method, url, request_headers)
+
+            if self._rate_limiter is not None:
+                self._rate_limiter.acquire()
+
+            status = None
+            retry_after = None
+
+            try:
+                response = getattr(self._session, method)(
+                    url, headers=request_headers, json=json_data,
+                    timeout=timeout)
+                _LOGGER.debug("%s %s", response, response.text)
+
+                status = response.status_code
+
+                if status < 400:
+                    breaker.success()
+                    self._count_revalidation(request_headers, status)
+                    return response
+
+                retry_after = response.headers.get(CONST.RETRY_AFTER)
+            except RequestException as exc:
+                _LOGGER.warning("Skybell request exception: %s", exc)
+
+            # Any other client error still means the server is reachable
+            if not is_retryable(status):
+                breaker.success()
+
+            # Only an auth failure is fixed by logging in again
+            if status in CONST.HTTP_AUTH_ERRORS and not reauthorized:
+                self._reauthorize(token)
+                reauthorized = True
+                check_breaker = False
+                continue
+
+            time.sleep(self._retry_delay(breaker, status, retry_after,
+                                         attempt, retry, deadline))
+            attempt += 1
+
+    def _remaining(self, deadline):
+        """Get the seconds left before a deadline, None without one."""
+        if deadline is None:
+            return None
+
+        remaining = deadline - time.monotonic()
+
+        if remaining <= 0:
+            raise SkybellException(ERROR.DEADLINE_EXCEEDED)
+
+        return remaining
+
+    def _request_timeout(self, deadline=None):
+        """Get the (connect, read) timeout, clipped to any deadline."""
+        remaining = self._remaining(deadline)
+
+        if remaining is None:
+            return self._timeout
+
+        return tuple(remaining if timeout is None else min(timeout, remaining)
+                     for timeout in self._timeout)
+
+    def _breaker(self, url):
+        """Get the circuit breaker for the endpoint family of a url."""
+        family = endpoint_family(url)
+
+        with self._breaker_lock:
+            if family not in self._breakers:
+                self._breakers[family] = CircuitBreaker(
+                    self._breaker_threshold, self._breaker_cooldown)
+
+            return self._breakers[family]
+
+    def _check_breaker(self, breaker, url):
+        """Refuse to send a request while its endpoint family is failing."""
+        if not breaker.allow():
+            self._count(CONST.STAT_SHORT_CIRCUITS)
+            raise SkybellException(ERROR.CIRCUIT_OPEN, endpoint_family(url))
+
+    def _retry_delay(self, breaker, status, retry_after, attempt, retry,
+                     deadline=None):
+        """Get how long to back off before retrying a failed request.
+
+        Raises a SkybellException if the request shouldn't be retried.
+        """
+        if not is_retryable(status):
+            raise SkybellException(ERROR.REQUEST, status)
+
+        retry_after = UTILS.parse_retry_after(retry_after)
+        breaker.failure(retry_after)
+
+        delay = None
+
+        if retry and attempt < self._max_retries:
+            delay = backoff_delay(attempt, self._backoff_base,
+                                  CONST.DEFAULT_BACKOFF_MAX, retry_after)
+
+        if delay is None:
+            raise SkybellException(ERROR.REQUEST, "Retry failed")
+
+        remaining = self._remaining(deadline)
+
+        if remaining is not None and delay >= remaining:
+            raise SkybellException(ERROR.DEADLINE_EXCEEDED, status)
+
+        _LOGGER.info("Request failed with %s, retrying in %.1fs",
+                     status, delay)
+        self._count(CONST.STAT_RETRIES)
+
+        return delay
+
+    def _request_headers(self, headers=None):
+        """Add the Skybell authentication and app headers to a request."""
         if not headers:
             headers = {}
 
@@ -182,31 +656,242 @@ class Skybell():
             headers['Authorization'] = 'Bearer ' + \
                 self.cache(CONST.ACCESS_TOKEN)
 
+        if not self._keep_alive:
+            headers['connection'] = 'close'
+
         headers['user-agent'] = self._user_agent
         headers['content-type'] = 'application/json'
         headers['accepts'] = '*/*'
         headers['x-skybell-app-id'] = self.cache(CONST.APP_ID)
         headers['x-skybell-client-id'] = self.cache(CONST.CLIENT_ID)
 
-        _LOGGER.debug("HTTP %s %s Request with headers: %s",
-                      method, url, headers)
+        return headers
 
-        try:
-            response = getattr(self._session, method)(
-                url, headers=headers, json=json_data)
-            _LOGGER.debug("%s %s", response, response.text)
+    def _count_revalidation(self, headers, status):
+        """Count if a conditional request found its data unchanged."""
+        if CONST.IF_NONE_MATCH in headers or \
+                CONST.IF_MODIFIED_SINCE in headers:
+            if status == CONST.HTTP_NOT_MODIFIED:
+                self._count(CONST.STAT_REVALIDATION_HITS)
+            else:
+                self._count(CONST.STAT_REVALIDATION_MISSES)
 
-            if response and response.status_code < 400:
-                return response
-        except RequestException as exc:
-            _LOGGER.warning("Skybell request exception: %s", exc)
+    def _store_validators(self, url, resp_headers):
+        """Store the validators of a response once its body is used.
 
-        if retry:
-            self.login()
+        Stored validators make the next conditional request for the url
+        return 304 until the data changes, so they are only kept for
+        responses that were merged.
+        """
+        validators = {}
+
+        if resp_headers.get(CONST.ETAG):
+            validators[CONST.IF_NONE_MATCH] = resp_headers[CONST.ETAG]
+
+        if resp_headers.get(CONST.LAST_MODIFIED):
+            validators[CONST.IF_MODIFIED_SINCE] = \
+                resp_headers[CONST.LAST_MODIFIED]
+
+        if validators:
+            self._validators[url] = validators
+        else:
+            self._validators.pop(url, None)
+
+    def endpoint_ttl(self, endpoint):
+        """Get the seconds a device endpoint response stays fresh."""
+        return self._endpoint_ttls.get(endpoint, 0)
+
+    @property
+    def activity_retention(self):
+        """Get the activity count and age in seconds devices keep."""
+        return self._activity_retention
+
+    @property
+    def keep_activity_json(self):
+        """Get if activity records keep their full json."""
+        return self._keep_activity_json
+
+    @property
+    def optimistic_settings(self):
+        """Get if setting changes are shown before they are confirmed."""
+        return self._optimistic_settings
+
+    @property
+    def activity_archive(self):
+        """Get the activity archive, None if activities aren't archived."""
+        return self._activity_archive
+
+    def stream(self, url, headers=None):
+        """Start a streamed download using the shared connection pool.
+
+        Media urls aren't api urls, so no Skybell auth headers are sent.
+        """
+        headers = dict(headers or {})
+        headers['user-agent'] = self._user_agent
+
+        return self._session.get(url, headers=headers, stream=True,
+                                 timeout=self._timeout)
+
+    def fetch_media(self, key, url):
+        """Get the local path of media, downloading it if not cached."""
+        return self._media_cache.fetch(key, url, self.stream)
+
+    def fetch_image(self, key, url, size=None):
+        """Get the bytes of an image, or of a thumbnail fitting in size."""
+        return self._image_cache.fetch(key, url, self.stream, size)
+
+    def download_media(self, limit=1, event=None, small=False,
+                       timeout=None):
+        """Download the media of recent activities of every device.
+
+        Returns a tuple of (paths, errors) dicts keyed by (device id,
+        activity id), downloads run on the worker pool if one is set.
+        """
+        calls = []
+
+        for device in self.get_devices():
+            for activity in device.activities(limit=limit, event=event):
+                if device.media_ready(activity, small):
+                    calls.append(((device.device_id, activity.id),
+                                  functools.partial(device.download_media,
+                                                    activity, small)))
+
+        return self.gather(calls, _deadline(timeout))
 
-            return self.send_request(method, url, headers, json_data, False)
+    def _new_session(self):
+        """Create a requests session using the sized connection pool."""
+        session = requests.session()
+        adapter = SkybellAdapter(self._pool_stats, self._pool_size,
+                                 self._pool_block)
+
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
 
-        raise SkybellException(ERROR.REQUEST, "Retry failed")
+        return session
+
+    @property
+    def stats(self):
+        """Get a snapshot of the request and connection pool counters."""
+        with self._stats_lock:
+            stats = dict(self._stats)
+
+        stats.update(self._pool_stats.snapshot())
+
+        return stats
+
+    def _count(self, stat, amount=1):
+        """Increment a request counter."""
+        with self._stats_lock:
+            self._stats[stat] += amount
+
+    def gather(self, calls, deadline=None):
+        """Run named request calls, concurrently if a worker pool is set.
+
+        Returns a tuple of (results, errors) dicts keyed by call name so a
+        single failed request doesn't discard the ones that succeeded. Calls
+        still running at the deadline are reported as deadline errors.
+        """
+        results = {}
+        errors = {}
+
+        # Calls made from a worker thread run inline so nested fan-outs
+        # can never exhaust the bounded pool and deadlock
+        if self._executor is None or getattr(self._local, 'worker', False):
+            for name, call in calls:
+                try:
+                    results[name] = call()
+                except (SkybellException, ValueError) as exc:
+                    errors[name] = exc
+
+            return results, errors
+
+        futures = [(name, self._executor.submit(self._worker_call, call))
+                   for name, call in calls]
+
+        for name, future in futures:
+            try:
+                results[name] = future.result(
+                    None if deadline is None
+                    else max(0, deadline - time.monotonic()))
+            except FutureTimeoutError:
+                errors[name] = SkybellException(ERROR.DEADLINE_EXCEEDED,
+                                                name)
+            except (SkybellException, ValueError) as exc:
+                errors[name] = exc
+
+        return results, errors
+
+    def submit(self, call):
+        """Run a call in the background, on the worker pool if one is set."""
+        if self._executor is not None:
+            return self._executor.submit(self._worker_call, call)
+
+        thread = threading.Thread(target=call, daemon=True)
+        thread.start()
+
+        return thread
+
+    def _worker_call(self, call):
+        """Execute a call inside of the worker pool."""
+        self._local.worker = True
+
+        return call()
+
+    def start_polling(self, **kwargs):
+        """Start refreshing all devices in the background.
+
+        Keyword arguments are passed on to SkybellScheduler.
+        """
+        if self._scheduler is None:
+            self._scheduler = SkybellScheduler(self, **kwargs)
+            self._scheduler.start()
+
+        return self._scheduler
+
+    def stop_polling(self):
+        """Stop the background device refreshes."""
+        if self._scheduler is not None:
+            self._scheduler.stop()
+            self._scheduler = None
+
+    def start_push(self, register=True, **kwargs):
+        """Start receiving pushed activities in the background.
+
+        The app is registered for pushes first unless register is False.
+        Keyword arguments are passed on to SkybellPush.
+        """
+        if self._push is None:
+            self._push = SkybellPush(self, **kwargs)
+            self._push.start(register)
+
+        return self._push
+
+    def stop_push(self):
+        """Close the push connection and stop its fallback polling."""
+        if self._push is not None:
+            self._push.stop()
+            self._push = None
+
+    def close(self):
+        """Flush the cache and release the resources held by Skybell."""
+        self.stop_push()
+        self.stop_polling()
+        self._token_manager.stop()
+
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+        with self._cache_lock:
+            if self._cache_timer is not None:
+                self._cache_timer.cancel()
+                self._cache_timer = None
+
+        self.flush_cache()
+        self._cache_backend.close()
+
+        if self._activity_archive is not None:
+            self._activity_archive.close()
 
     def cache(self, key):
         """Get a cached value."""
@@ -214,7 +899,16 @@ class Skybell():
 
     def update_cache(self, data):
         """Update a cached value."""
-        UTILS.update(self._cache, data)
+        with self._cache_lock:
+            UTILS.update(self._cache, data)
+
+            for key, value in data.items():
+                if key == CONST.DEVICES:
+                    self._cache_dirty.update(
+                        (CONST.DEVICES, device_id) for device_id in value)
+                else:
+                    self._cache_dirty.add(key)
+
         self._save_cache()
 
     def dev_cache(self, device, key=None):
@@ -226,30 +920,104 @@ class Skybell():
 
         return device_cache
 
-    def update_dev_cache(self, device, data):
-        """Update cached values for a device."""
-        self.update_cache(
-            {
-                CONST.DEVICES: {
-                    device.device_id: data
-                }
-            })
+    def update_dev_cache(self, device, data, replace=False):
+        """Update cached values for a device.
+
+        With replace the values take the place of the cached ones instead
+        of being merged into them key by key.
+        """
+        with self._cache_lock:
+            device_cache = self.dev_cache(device)
+
+            if replace and device_cache:
+                for key in data:
+                    device_cache.pop(key, None)
+
+            self.update_cache(
+                {
+                    CONST.DEVICES: {
+                        device.device_id: data
+                    }
+                })
 
     def _load_cache(self):
         """Load existing cache and merge for updating if required."""
         if not self._disable_cache:
-            if os.path.exists(self._cache_path):
-                _LOGGER.debug("Cache found at: %s", self._cache_path)
-                if os.path.getsize(self._cache_path) > 0:
-                    loaded_cache = UTILS.load_cache(self._cache_path)
-                    UTILS.update(self._cache, loaded_cache)
-                else:
-                    _LOGGER.debug("Cache file is empty.  Removing it.")
-                    os.remove(self._cache_path)
+            loaded_cache = self._cache_backend.load()
+
+            if loaded_cache:
+                UTILS.update(self._cache, loaded_cache)
+
+        # Write out the merged template in full
+        with self._cache_lock:
+            self._cache_dirty = None
 
         self._save_cache()
 
     def _save_cache(self):
-        """Trigger a cache save."""
-        if not self._disable_cache:
-            UTILS.save_cache(self._cache, self._cache_path)
+        """Trigger a cache save, coalescing writes if an interval is set."""
+        if self._disable_cache:
+            return
+
+        with self._cache_lock:
+            wait = 0
+
+            if self._cache_flushed_at is not None:
+                wait = (self._cache_flushed_at +
+                        self._cache_flush_interval - time.monotonic())
+
+            if wait > 0:
+                # Write-behind, a timer flushes everything dirty at once
+                if self._cache_timer is None:
+                    self._cache_timer = threading.Timer(wait,
+                                                        self.flush_cache)
+                    self._cache_timer.daemon = True
+                    self._cache_timer.start()
+                return
+
+        self.flush_cache()
+
+    def flush_cache(self):
+        """Write any dirty cache entries to the cache backend."""
+        if self._disable_cache:
+            return
+
+        with self._cache_lock:
+            self._cache_timer = None
+
+            if self._cache_dirty is not None and not self._cache_dirty:
+                return
+
+            self._cache_backend.save(self._cache, self._cache_dirty)
+            self._cache_dirty = set()
+            self._cache_flushed_at = time.monotonic()
+
+
+def _device_seed(device_json):
+    """Get the device endpoint responses embedded in a device json.
+
+    The device json carries its avatar, so the avatar endpoint doesn't
+    need to be requested when a device is created.
+    """
+    if isinstance(device_json.get(CONST.AVATAR), dict):
+        return {CONST.ENDPOINT_AVATAR: dict(device_json[CONST.AVATAR])}
+
+    return {}
+
+
+def _subscription_entries(subscriptions):
+    """Get (device_json, seed) pairs from a subscriptions response.
+
+    Subscriptions only embed the device and its owner, so they seed the
+    same avatar as the device list and save no further requests.
+    """
+    entries = []
+
+    for subscription in subscriptions:
+        device_json = subscription.get(CONST.SUBSCRIPTION_DEVICE)
+
+        # The device is only embedded when it was included in the request
+        if isinstance(device_json, dict):
+            entries.append((device_json, _device_seed(device_json)))
+
+    return entries
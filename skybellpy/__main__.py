@@ -18,6 +18,7 @@ from colorlog import ColoredFormatter
 
 import skybellpy
 import skybellpy.helpers.constants as CONST
+import skybellpy.settings as SETTINGS
 from skybellpy.exceptions import SkybellException
 
 _LOGGER = logging.getLogger('skybellcl')
@@ -72,8 +73,9 @@ def get_arguments():
 
     parser.add_argument(
         '--set',
-        metavar='setting=value',
-        help='Set setting to a value',
+        metavar='[device_id:]setting=value',
+        help='Set setting to a value, on every device unless a device_id '
+             'is given',
         required=False, action='append')
 
     parser.add_argument(
@@ -138,6 +140,24 @@ def get_arguments():
     return parser.parse_args()
 
 
+def _parse_settings(values, device_ids):
+    """Parse [device_id:]setting=value arguments into settings by device."""
+    settings = {}
+
+    for text in values:
+        device_id, sep, setting = text.partition(':')
+
+        if not sep or '=' in device_id:
+            device_id, setting = None, text
+
+        setting, value = SETTINGS.parse_setting(setting)
+
+        for target in [device_id] if device_id else device_ids:
+            settings.setdefault(target, {})[setting] = value
+
+    return settings
+
+
 def call():
     """Execute command line helper."""
     args = get_arguments()
@@ -161,11 +181,20 @@ def call():
                                     get_devices=True,
                                     agent_identifier='skybellcl')
 
-    # # Set setting
-    # for setting in args.set or []:
-    #     keyval = setting.split("=")
-    #     if skybell.set_setting(keyval[0], keyval[1]):
-    #         _LOGGER.info("Setting %s changed to %s", keyval[0], keyval[1])
+        # Set settings
+        if args.set:
+            results, errors = skybell.apply_settings(_parse_settings(
+                args.set, [device.device_id
+                           for device in skybell.get_devices()]))
+
+            for device_id, settings in results.items():
+                for setting, value in settings.items():
+                    _LOGGER.info("Device %s setting %s changed to %s",
+                                 device_id, setting, value)
+
+            for device_id, exc in errors.items():
+                _LOGGER.warning("Device %s settings failed: %s",
+                                device_id, exc)
 
         # Output Json
         for device_id in args.json or []:
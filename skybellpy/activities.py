@@ -0,0 +1,297 @@
+"""
+Activity records and store used by SkybellPy.
+
+Activities are parsed once into compact records with an epoch creation
+time. The store keeps a bounded, time ordered window of them with an
+index per event type, so range queries are a bisect and the latest
+activity of an event type is a lookup instead of a scan of every activity.
+"""
+import bisect
+import itertools
+import time
+
+from collections.abc import Mapping
+
+import skybellpy.helpers.constants as CONST
+import skybellpy.utils as UTILS
+
+
+# Activity json keys and the record fields holding them
+_FIELDS = {
+    CONST.ID: 'id',
+    CONST.EVENT: 'event',
+    CONST.CREATED_AT: 'created_at',
+    CONST.STATE: 'state',
+    CONST.VIDEO_STATE: 'video_state',
+    CONST.MEDIA_URL: 'media',
+    CONST.MEDIA_SMALL_URL: 'media_small'
+}
+
+
+class Activity(Mapping):
+    """Compact activity record, readable like the activity json.
+
+    Only the fields skybellpy uses are kept, the full json is kept too
+    when asked for. Records compare equal to json of the same activity.
+    """
+
+    __slots__ = ('id', 'event', 'created_at', 'state', 'video_state',
+                 'media', 'media_small', '_json')
+
+    # pylint: disable=invalid-name,too-many-arguments
+    def __init__(self, id, event, created_at, state=None, video_state=None,
+                 media=None, media_small=None, activity_json=None):
+        """Set up the activity record, created_at is in epoch seconds."""
+        self.id = id
+        self.event = event
+        self.created_at = created_at
+        self.state = state
+        self.video_state = video_state
+        self.media = media
+        self.media_small = media_small
+        self._json = activity_json
+
+    @classmethod
+    def from_json(cls, activity_json, keep_json=False):
+        """Create a record from activity json, records are returned as is."""
+        if isinstance(activity_json, Activity):
+            return activity_json
+
+        return cls(activity_json.get(CONST.ID),
+                   activity_json.get(CONST.EVENT),
+                   UTILS.parse_timestamp(
+                       activity_json.get(CONST.CREATED_AT)),
+                   activity_json.get(CONST.STATE),
+                   activity_json.get(CONST.VIDEO_STATE),
+                   activity_json.get(CONST.MEDIA_URL),
+                   activity_json.get(CONST.MEDIA_SMALL_URL),
+                   dict(activity_json) if keep_json else None)
+
+    @property
+    def kept_json(self):
+        """Get if the record holds the full activity json."""
+        return self._json is not None
+
+    @property
+    def json(self):
+        """Get the activity json, rebuilt from the record if not kept."""
+        if self._json is not None:
+            return self._json
+
+        return {key: self[key] for key in _FIELDS}
+
+    def _key(self):
+        """Get the fields identifying the activity."""
+        return tuple(getattr(self, field) for field in _FIELDS.values())
+
+    def __getitem__(self, key):
+        """Get an activity json value."""
+        if self._json is not None:
+            return self._json[key]
+
+        if key not in _FIELDS:
+            raise KeyError(key)
+
+        if key == CONST.CREATED_AT:
+            return _format_timestamp(self.created_at)
+
+        return getattr(self, _FIELDS[key])
+
+    def __iter__(self):
+        """Iterate over the activity json keys."""
+        return iter(self._json if self._json is not None else _FIELDS)
+
+    def __len__(self):
+        """Get the number of activity json keys."""
+        return len(self._json if self._json is not None else _FIELDS)
+
+    def __eq__(self, other):
+        """Compare with another record or activity json."""
+        if isinstance(other, Mapping) and not isinstance(other, Activity):
+            other = Activity.from_json(other)
+
+        if not isinstance(other, Activity):
+            return NotImplemented
+
+        return self._key() == other._key()
+
+    def __ne__(self, other):
+        """Compare with another record or activity json."""
+        equal = self.__eq__(other)
+
+        return equal if equal is NotImplemented else not equal
+
+    __hash__ = None
+
+    def __repr__(self):
+        """Get the activity json representation."""
+        return '{}({!r})'.format(type(self).__name__, self.json)
+
+
+class ActivityStore():
+    """Time indexed activities with count and age retention."""
+
+    def __init__(self, max_count=CONST.DEFAULT_ACTIVITY_RETENTION,
+                 max_age=None):
+        """Set up an empty store."""
+        self._max_count = max_count
+        self._max_age = max_age
+        self._seq = itertools.count()
+
+        # Sorted (created_at, seq) keys with their activities, per event
+        # and for all activities under the None key
+        self._keys = {None: []}
+        self._activities = {None: []}
+
+    def __len__(self):
+        """Get the number of stored activities."""
+        return len(self._keys[None])
+
+    def add(self, activities):
+        """Add activities, evicting the oldest past the retention limits.
+
+        Activity json is parsed into records first.
+        """
+        for activity in activities:
+            activity = Activity.from_json(activity)
+            key = (activity.created_at or 0, next(self._seq))
+
+            for event in _indexes(activity):
+                keys = self._keys.setdefault(event, [])
+                index = bisect.bisect(keys, key)
+
+                keys.insert(index, key)
+                self._activities.setdefault(event, []).insert(index, activity)
+
+        self._prune()
+
+    def update(self, activities):
+        """Replace stored activities with fresh records of them.
+
+        Records match by id and creation time, activities that aren't
+        stored are ignored. Returns the number of replaced activities.
+        """
+        fresh = {}
+
+        for activity in activities:
+            activity = Activity.from_json(activity)
+            fresh[(activity.id, activity.created_at)] = activity
+
+        moved = []
+        replaced = 0
+
+        for key, activity in zip(self._keys[None], self._activities[None]):
+            record = fresh.get((activity.id, activity.created_at))
+
+            if record is None or record is activity:
+                continue
+
+            replaced += 1
+
+            if record.event != activity.event:
+                moved.append((key, activity, record))
+                continue
+
+            for event in _indexes(activity):
+                index = bisect.bisect_left(self._keys[event], key)
+                self._activities[event][index] = record
+
+        # A changed event type moves the activity to another index
+        for key, activity, _ in moved:
+            for event in _indexes(activity):
+                index = bisect.bisect_left(self._keys[event], key)
+
+                del self._keys[event][index]
+                del self._activities[event][index]
+
+        if moved:
+            self.add(record for _, _, record in moved)
+
+        return replaced
+
+    def replace(self, activities):
+        """Replace every stored activity."""
+        self._keys = {None: []}
+        self._activities = {None: []}
+
+        self.add(activities)
+
+    def query(self, event=None, since=None, until=None, limit=None):
+        """Get activities newest first, optionally within a time range.
+
+        since and until are epoch seconds or ISO 8601 timestamps and are
+        both inclusive.
+        """
+        self._prune()
+
+        keys = self._keys.get(event, [])
+        activities = self._activities.get(event, [])
+
+        start = 0
+        end = len(keys)
+
+        if since is not None:
+            start = bisect.bisect_left(keys, (UTILS.to_epoch(since),))
+
+        if until is not None:
+            end = bisect.bisect_left(
+                keys, (UTILS.to_epoch(until), float('inf')))
+
+        if limit is not None:
+            start = max(start, end - limit)
+
+        return activities[start:end][::-1]
+
+    def latest(self, event=None):
+        """Get the newest activity, of an event type if given."""
+        activities = self._activities.get(event)
+
+        return activities[-1] if activities else None
+
+    def _prune(self):
+        """Evict activities past the count or age retention limits."""
+        keys = self._keys[None]
+        evict = 0
+
+        if self._max_count is not None:
+            evict = max(0, len(keys) - self._max_count)
+
+        if self._max_age is not None:
+            evict = max(evict, bisect.bisect_left(
+                keys, (time.time() - self._max_age,)))
+
+        for key, activity in zip(keys[:evict],
+                                 self._activities[None][:evict]):
+            # The oldest activity overall is also the oldest of its event
+            event = activity.event
+
+            if (event is not None and self._keys[event] and
+                    self._keys[event][0] == key):
+                del self._keys[event][0]
+                del self._activities[event][0]
+
+        del keys[:evict]
+        del self._activities[None][:evict]
+
+
+def _indexes(activity):
+    """Get the index keys of an activity, None indexes every activity."""
+    if activity.event is None:
+        return (None,)
+
+    return (None, activity.event)
+
+
+def _format_timestamp(seconds):
+    """Format epoch seconds the way the api does, None if unknown."""
+    if seconds is None:
+        return None
+
+    millis = int(round(seconds * 1000))
+    timestamp = time.strftime('%Y-%m-%dT%H:%M:%S',
+                              time.gmtime(millis // 1000))
+
+    if millis % 1000:
+        timestamp += '.{:03d}'.format(millis % 1000)
+
+    return timestamp + 'Z'
@@ -0,0 +1,576 @@
+"""
+Asyncio versions of the Skybell and SkybellDevice classes.
+
+These mirror the blocking API in skybellpy but issue their requests with
+aiohttp, so the login, cache, device map and device properties all behave
+the same while every network call is awaitable.
+"""
+import asyncio
+import json
+import logging
+
+import aiohttp
+
+from skybellpy import Skybell, _device_seed, _subscription_entries
+from skybellpy.device import SkybellDevice, _deadline
+from skybellpy.retry import is_retryable
+from skybellpy.exceptions import (
+    SkybellAuthenticationException, SkybellException)
+import skybellpy.helpers.constants as CONST
+import skybellpy.helpers.errors as ERROR
+import skybellpy.settings as SETTINGS
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class AsyncSkybell(Skybell):
+    """Asyncio version of the main Skybell class."""
+
+    def __init__(self, username=None, password=None,
+                 cache_path=CONST.CACHE_PATH, disable_cache=False,
+                 agent_identifier=CONST.DEFAULT_AGENT_IDENTIFIER,
+                 login_sleep=True,
+                 max_concurrency=CONST.DEFAULT_MAX_CONCURRENCY,
+                 session=None, cache_backend=None, cache_flush_interval=0,
+                 endpoint_ttls=None, bulk_hydrate=False,
+                 requests_per_second=None,
+                 max_retries=CONST.DEFAULT_MAX_RETRIES,
+                 backoff_base=CONST.DEFAULT_BACKOFF_BASE,
+                 breaker_threshold=CONST.DEFAULT_BREAKER_THRESHOLD,
+                 breaker_cooldown=CONST.DEFAULT_BREAKER_COOLDOWN,
+                 token_lifetime=None, timeout=CONST.DEFAULT_TIMEOUT,
+                 activity_retention=CONST.DEFAULT_ACTIVITY_RETENTION,
+                 activity_max_age=None, keep_activity_json=False,
+                 activity_archive=None,
+                 optimistic_settings=False):
+        """Init AsyncSkybell object."""
+        super(AsyncSkybell, self).__init__(
+            username=username, password=password,
+            cache_path=cache_path, disable_cache=disable_cache,
+            agent_identifier=agent_identifier, login_sleep=login_sleep,
+            cache_backend=cache_backend,
+            cache_flush_interval=cache_flush_interval,
+            endpoint_ttls=endpoint_ttls, bulk_hydrate=bulk_hydrate,
+            requests_per_second=requests_per_second,
+            max_retries=max_retries, backoff_base=backoff_base,
+            breaker_threshold=breaker_threshold,
+            breaker_cooldown=breaker_cooldown,
+            token_lifetime=token_lifetime, timeout=timeout,
+            activity_retention=activity_retention,
+            activity_max_age=activity_max_age,
+            keep_activity_json=keep_activity_json,
+            activity_archive=activity_archive,
+            optimistic_settings=optimistic_settings)
+
+        self._session = session
+        self._max_concurrency = max_concurrency
+        self._semaphore = None
+        self._async_login_lock = None
+
+    async def login(self, username=None, password=None, sleep=False):
+        """Execute Skybell login.
+
+        Only one login runs at a time. Callers that waited on a login that
+        was already running share its result instead of logging in again.
+        """
+        generation = self._login_generation
+
+        async with self._login_lock_async():
+            if (generation != self._login_generation and
+                    username is None and password is None):
+                if self._login_error is not None:
+                    raise self._login_error
+
+                return True
+
+            await self._login_locked(username, password)
+
+        return True
+
+    async def _reauthorize(self, failed_token):
+        """Log in again unless another caller already replaced the token."""
+        async with self._login_lock_async():
+            if self.cache(CONST.ACCESS_TOKEN) == failed_token:
+                await self._login_locked()
+
+    def _login_lock_async(self):
+        """Get the login lock, creating it inside the running loop."""
+        if self._async_login_lock is None:
+            self._async_login_lock = asyncio.Lock()
+
+        return self._async_login_lock
+
+    async def _login_locked(self, username=None, password=None):
+        """Log in while holding the login lock, sharing the outcome."""
+        try:
+            await self._login(username, password)
+            self._login_error = None
+        except SkybellException as exc:
+            self._login_error = exc
+            raise
+        finally:
+            self._login_generation += 1
+
+    async def _login(self, username=None, password=None):
+        """Send the login request and store the new access token."""
+        login_data = self._login_data(username, password)
+
+        try:
+            response = await self.send_request(
+                'post', CONST.LOGIN_URL, json_data=login_data, retry=False)
+        except Exception as exc:
+            raise SkybellAuthenticationException(ERROR.LOGIN_FAILED, exc)
+
+        self._login_success(await response.text(),
+                            loop=asyncio.get_event_loop())
+
+    async def refresh_token(self):
+        """Get a new access token while the current one stays in use."""
+        login_data = self._login_data(clear_token=False)
+
+        try:
+            response = await self.send_request(
+                'post', CONST.LOGIN_URL, json_data=login_data, retry=False)
+        except Exception as exc:
+            raise SkybellAuthenticationException(ERROR.LOGIN_FAILED, exc)
+
+        self._login_success(await response.text(), replace=True,
+                            loop=asyncio.get_event_loop())
+
+        return True
+
+    async def logout(self):
+        """Explicit Skybell logout."""
+        if self.cache(CONST.ACCESS_TOKEN):
+            self._devices = None
+            self._validators = {}
+            self._token_manager.invalidate()
+
+            self.update_cache({CONST.ACCESS_TOKEN: None})
+
+        return True
+
+    async def get_devices(self, refresh=False):
+        """Get all devices, refreshing every endpoint concurrently."""
+        if refresh or self._devices is None:
+            if self._devices is None:
+                self._devices = {}
+
+            _LOGGER.info("Updating all devices...")
+
+            if self._bulk_hydrate:
+                response = await self.send_request(
+                    "get", CONST.SUBSCRIPTIONS_URL)
+                response_text = await response.text()
+                entries = _subscription_entries(json.loads(response_text))
+            else:
+                response = await self.send_request("get", CONST.DEVICES_URL)
+                response_text = await response.text()
+                entries = [(device_json, _device_seed(device_json))
+                           for device_json in json.loads(response_text)]
+
+            _LOGGER.debug("Get Devices Response: %s", response_text)
+
+            loads = []
+
+            for device_json, seed in entries:
+                # Attempt to reuse an existing device
+                device = self._devices.get(device_json['id'])
+
+                # No existing device, create a new one
+                if device:
+                    device.update(device_json)
+                    device.hydrate(seed)
+                    loads.append(device.refresh())
+                else:
+                    device = AsyncSkybellDevice(device_json, self, seed)
+                    self._devices[device.device_id] = device
+                    loads.append(device.load())
+
+            await asyncio.gather(*loads)
+
+        return list(self._devices.values())
+
+    async def apply_settings(self, settings, force=False):
+        """Apply settings to several devices, one PATCH per device.
+
+        settings maps device ids to settings. Everything is validated
+        before any request is sent and the requests run concurrently.
+        Unless force is set only changed settings are sent. Returns a
+        tuple of (results, errors) dicts keyed by device id.
+        """
+        if self._devices is None:
+            await self.get_devices()
+
+        self._validate_device_settings(settings)
+
+        return await self._apply_device_settings(settings, force)
+
+    async def reconcile(self, desired, dry_run=False, refresh=False,
+                        attempts=CONST.DEFAULT_RECONCILE_ATTEMPTS):
+        """Bring devices to the settings of a desired state document.
+
+        Mirrors Skybell.reconcile, the writes are sent concurrently.
+        """
+        if refresh or self._devices is None:
+            await self.get_devices(refresh=refresh)
+
+        report = self._reconcile_plan(desired, dry_run)
+        pending = {} if dry_run else {
+            device_id: settings
+            for device_id, settings in report.plan.items() if settings}
+        attempt = 0
+
+        while pending:
+            results, errors = await self._apply_device_settings(pending)
+
+            pending = self._reconcile_round(report, pending, results,
+                                            errors, attempt, attempts)
+            attempt += 1
+
+            if pending:
+                delay = self._reconcile_delay(report, pending, attempt, None)
+                await asyncio.sleep(delay)
+
+        return report
+
+    async def prefetch(self, endpoints=None):
+        """Load endpoints for every device concurrently."""
+        devices = await self.get_devices()
+        responses = await asyncio.gather(
+            *(device.prefetch(endpoints) for device in devices),
+            return_exceptions=True)
+
+        _, errors = _split_responses(
+            [device.device_id for device in devices], responses)
+
+        if errors:
+            raise SkybellException(ERROR.ENDPOINT_REQUESTS_FAILED, errors)
+
+    def start_polling(self, **kwargs):
+        """Refuse to poll, the scheduler runs blocking refreshes."""
+        raise SkybellException(ERROR.ASYNC_UNSUPPORTED, 'start_polling')
+
+    def start_push(self, register=True, **kwargs):
+        """Refuse to push, the push thread makes blocking requests."""
+        raise SkybellException(ERROR.ASYNC_UNSUPPORTED, 'start_push')
+
+    def stream(self, url, headers=None):
+        """Refuse to stream, the media cache reads blocking responses."""
+        raise SkybellException(ERROR.ASYNC_UNSUPPORTED, 'stream')
+
+    def fetch_media(self, key, url):
+        """Refuse to download media, see stream()."""
+        raise SkybellException(ERROR.ASYNC_UNSUPPORTED, 'fetch_media')
+
+    def fetch_image(self, key, url, size=None):
+        """Refuse to download images, see stream()."""
+        raise SkybellException(ERROR.ASYNC_UNSUPPORTED, 'fetch_image')
+
+    def download_media(self, limit=1, event=None, small=False,
+                       timeout=None):
+        """Refuse to download media, see stream()."""
+        raise SkybellException(ERROR.ASYNC_UNSUPPORTED, 'download_media')
+
+    async def _apply_device_settings(self, settings, force=False):
+        """Send settings per device id concurrently."""
+        responses = await asyncio.gather(
+            *(self._devices[device_id].apply_settings(
+                device_settings, force)
+              for device_id, device_settings in settings.items()),
+            return_exceptions=True)
+
+        return _split_responses(settings, responses)
+
+    async def get_device(self, device_id, refresh=False):
+        """Get a single device."""
+        if self._devices is None:
+            await self.get_devices()
+            refresh = False
+
+        device = self._devices.get(device_id)
+
+        if device and refresh:
+            await device.refresh()
+
+        return device
+
+    async def send_request(self, method, url, headers=None,
+                           json_data=None, retry=True, conditional=False,
+                           deadline=None):
+        """Send requests to Skybell."""
+        if not self.cache(CONST.ACCESS_TOKEN) and url != CONST.LOGIN_URL:
+            await self._reauthorize(None)
+
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self._max_concurrency)
+
+        breaker = self._breaker(url)
+        reauthorized = not retry
+        check_breaker = True
+        attempt = 0
+
+        while True:
+            # Share the wait for a new token instead of sleeping per login
+            if url != CONST.LOGIN_URL and not await \
+                    self._token_manager.wait_async(self._remaining(deadline)):
+                raise SkybellException(ERROR.DEADLINE_EXCEEDED, url)
+
+            connect, read = self._request_timeout(deadline)
+            total = self._remaining(deadline)
+
+            # Rebuilt every attempt so a new access token is picked up
+            token = self.cache(CONST.ACCESS_TOKEN)
+
+            # Past this point every attempt settles the breaker, the retry
+            # after logging in again is part of the same attempt
+            if check_breaker:
+                self._check_breaker(breaker, url)
+
+            check_breaker = True
+
+            request_headers = self._request_headers(dict(headers or {}))
+
+            if conditional:
+                request_headers.update(self._validators.get(url, {}))
+
+            _LOGGER.debug("HTTP %s %s Request with headers: %s",
+                          method, url, request_headers)
+
+            if self._rate_limiter is not None:
+                await self._rate_limiter.acquire_async()
+
+            status = None
+            retry_after = None
+
+            try:
+                async with self._semaphore:
+                    response = await self._get_session().request(
+                        method, url, headers=request_headers, json=json_data,
+                        timeout=aiohttp.ClientTimeout(
+                            total=total,
+                            sock_connect=connect, sock_read=read))
+                    # Read the body while holding the slot, aiohttp caches it
+                    response_text = await response.text()
+                _LOGGER.debug("%s %s", response, response_text)
+
+                status = response.status
+
+                if status < 400:
+                    breaker.success()
+                    self._count_revalidation(request_headers, status)
+                    return response
+
+                retry_after = response.headers.get(CONST.RETRY_AFTER)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as exc:
+                _LOGGER.warning("Skybell request exception: %s", exc)
+
+            # Any other client error still means the server is reachable
+            if not is_retryable(status):
+                breaker.success()
+
+            # Only an auth failure is fixed by logging in again
+            if status in CONST.HTTP_AUTH_ERRORS and not reauthorized:
+                await self._reauthorize(token)
+                reauthorized = True
+                check_breaker = False
+                continue
+
+            await asyncio.sleep(self._retry_delay(
+                breaker, status, retry_after, attempt, retry, deadline))
+            attempt += 1
+
+    def _get_session(self):
+        """Get the aiohttp session, creating it inside the running loop."""
+        if self._session is None:
+            self._session = aiohttp.ClientSession()
+
+        return self._session
+
+    async def close(self):
+        """Close the aiohttp session and flush the cache."""
+        super(AsyncSkybell, self).close()
+
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+
+class AsyncSkybellDevice(SkybellDevice):
+    """Asyncio version of the Skybell device class."""
+
+    def __init__(self, device_json, skybell, seed=None):
+        """Set up Skybell device, await load() before reading it."""
+        # pylint: disable=super-init-not-called
+        self._setup(device_json, skybell)
+        self.hydrate(seed)
+
+        self._setting_tasks = set()
+
+    async def load(self):
+        """Request the initial device endpoints that weren't seeded."""
+        await self._load(self._unloaded_endpoints())
+
+    async def prefetch(self, endpoints=None):
+        """Request endpoints that haven't been loaded yet concurrently."""
+        await self._load(self._prefetch_endpoints(endpoints))
+
+    def download_media(self, activity=None, small=False):
+        """Refuse to download media, see AsyncSkybell.stream()."""
+        raise SkybellException(ERROR.ASYNC_UNSUPPORTED, 'download_media')
+
+    def image_bytes(self, size=None):
+        """Refuse to download the avatar, see AsyncSkybell.stream()."""
+        raise SkybellException(ERROR.ASYNC_UNSUPPORTED, 'image_bytes')
+
+    async def refresh(self, force=False, timeout=None):
+        """Refresh the devices json object data.
+
+        Returns the endpoints that were refreshed within the timeout.
+        """
+        endpoints = CONST.ALL_ENDPOINTS if force else self._stale_endpoints()
+
+        return await self._load(endpoints, conditional=True,
+                                deadline=_deadline(timeout))
+
+    async def _load(self, endpoints, conditional=False, deadline=None):
+        """Request the given endpoints concurrently and merge them."""
+        if not endpoints:
+            return []
+
+        validators = {}
+        responses = await asyncio.gather(
+            *(self._endpoint_request(endpoint, conditional=conditional,
+                                     deadline=deadline,
+                                     validators=validators)
+              for endpoint in endpoints),
+            return_exceptions=True)
+
+        return self._merge(*_split_responses(endpoints, responses),
+                           validators=validators)
+
+    async def _endpoint_request(self, endpoint, method="get",
+                                json_data=None, conditional=False,
+                                deadline=None, validators=None):
+        url = str.replace(CONST.ENDPOINT_URLS[endpoint],
+                          '$DEVID$', self.device_id)
+        response = await self._skybell.send_request(method=method,
+                                                    url=url,
+                                                    json_data=json_data,
+                                                    conditional=conditional,
+                                                    deadline=deadline)
+
+        if response.status == CONST.HTTP_NOT_MODIFIED:
+            return None
+
+        result = json.loads(await response.text())
+
+        if validators is not None:
+            validators[endpoint] = (url, response.headers)
+
+        return result
+
+    async def apply_settings(self, settings, force=False):
+        """Validate the settings and then send them in one PATCH request.
+
+        Nothing is sent unless every setting is valid. Unless force is set
+        settings that already hold their value are left out, and nothing
+        is sent if none changed. Returns the settings that were sent,
+        raises a SkybellException if the request fails.
+        """
+        settings = self._settings_to_send(settings, force)
+
+        if settings:
+            await self._endpoint_request(CONST.ENDPOINT_SETTINGS,
+                                         method="patch", json_data=settings)
+
+            self.update(settings_json=settings)
+
+        return settings
+
+    def _apply_batch(self, settings, force=False):
+        """Schedule the PATCH request for the settings of a batch."""
+        self._schedule_settings(settings, force)
+
+    def _set_setting(self, settings):
+        """Validate the settings and schedule the PATCH request."""
+        SETTINGS.validate_settings(settings)
+
+        if self._batched(settings):
+            return None
+
+        return self._schedule_settings(settings)
+
+    async def wait_for_settings(self, timeout=None):
+        """Wait until no scheduled setting change is pending.
+
+        Returns False if changes are still pending after the timeout.
+        """
+        if not self._setting_tasks:
+            return True
+
+        _, pending = await asyncio.wait(self._setting_tasks, timeout=timeout)
+
+        return not pending
+
+    def _schedule_settings(self, settings, force=False):
+        """Schedule a settings PATCH request as a tracked task."""
+        if self._skybell.optimistic_settings:
+            token, settings = self._begin_settings(settings, force)
+
+            if not settings:
+                return None
+
+            coro = self._confirm_settings(token, settings)
+        else:
+            coro = self._patch_settings(settings, force)
+
+        task = asyncio.ensure_future(coro)
+        self._setting_tasks.add(task)
+        task.add_done_callback(self._setting_tasks.discard)
+
+        return task
+
+    async def _patch_settings(self, settings, force=False):
+        """Send the settings PATCH request and merge it on success."""
+        try:
+            await self.apply_settings(settings, force)
+        except SkybellException as exc:
+            _LOGGER.warning("Exception changing settings: %s", settings)
+            _LOGGER.warning(exc)
+
+    async def _confirm_settings(self, token, settings):
+        """Send an optimistic write and re-read the settings to confirm."""
+        try:
+            await self._endpoint_request(CONST.ENDPOINT_SETTINGS,
+                                         method="patch", json_data=settings)
+        except SkybellException as exc:
+            self._finish_settings(token, settings, exc=exc)
+            return
+
+        try:
+            settings_json = await self._endpoint_request(
+                CONST.ENDPOINT_SETTINGS)
+        except SkybellException as exc:
+            # The write was accepted, trust it until the next refresh
+            _LOGGER.debug("Device %s settings confirmation failed: %s",
+                          self.device_id, exc)
+            settings_json = None
+
+        self._finish_settings(token, settings, settings_json)
+
+
+def _split_responses(names, responses):
+    """Split gathered responses into (results, errors) dicts by name."""
+    results = {}
+    errors = {}
+
+    for name, response in zip(names, responses):
+        if isinstance(response, (SkybellException, ValueError)):
+            errors[name] = response
+        elif isinstance(response, BaseException):
+            raise response
+        else:
+            results[name] = response
+
+    return results, errors
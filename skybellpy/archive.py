@@ -0,0 +1,133 @@
+"""
+Activity archive used by SkybellPy.
+
+The cloud only returns a recent window of activities. The archive keeps
+every activity a device reported in SQLite, indexed by device, event type
+and time, so history can be queried long after it left that window
+without any requests.
+"""
+import json
+import sqlite3
+import threading
+
+from skybellpy.activities import Activity
+import skybellpy.helpers.constants as CONST
+import skybellpy.utils as UTILS
+
+_COLUMNS = ('id', 'event', 'created_at', 'state', 'video_state', 'media',
+            'media_small', 'json')
+
+
+class ActivityArchive():
+    """Append-only SQLite store of device activities."""
+
+    def __init__(self, path=CONST.ARCHIVE_PATH):
+        """Set up the archive and create the table and indexes."""
+        self._path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+
+        with self._lock, self._conn:
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS activities '
+                '(device_id TEXT, id TEXT, event TEXT, created_at REAL, '
+                'state TEXT, video_state TEXT, media TEXT, '
+                'media_small TEXT, json TEXT, PRIMARY KEY (device_id, id))')
+            self._conn.execute(
+                'CREATE INDEX IF NOT EXISTS activities_time '
+                'ON activities (device_id, created_at)')
+            self._conn.execute(
+                'CREATE INDEX IF NOT EXISTS activities_event_time '
+                'ON activities (device_id, event, created_at)')
+
+    def append(self, device_id, activities):
+        """Archive activities, returning how many weren't archived yet."""
+        rows = []
+
+        for activity in activities:
+            activity = Activity.from_json(activity)
+            activity_json = activity.json if activity.kept_json else None
+
+            rows.append((device_id, activity.id, activity.event,
+                         activity.created_at, activity.state,
+                         activity.video_state, activity.media,
+                         activity.media_small,
+                         json.dumps(activity_json) if activity_json
+                         else None))
+
+        if not rows:
+            return 0
+
+        with self._lock, self._conn:
+            before = self._conn.total_changes
+            self._conn.executemany(
+                'INSERT OR IGNORE INTO activities (device_id, {}) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)'.format(
+                    ', '.join(_COLUMNS)), rows)
+
+            return self._conn.total_changes - before
+
+    def query(self, device_id, event=None, since=None, until=None,
+              limit=None):
+        """Get archived activities of a device newest first.
+
+        since and until are epoch seconds or ISO 8601 timestamps and are
+        both inclusive.
+        """
+        sql = 'SELECT {} FROM activities WHERE device_id = ?'.format(
+            ', '.join(_COLUMNS))
+        params = [device_id]
+
+        if event is not None:
+            sql += ' AND event = ?'
+            params.append(event)
+
+        if since is not None:
+            sql += ' AND created_at >= ?'
+            params.append(UTILS.to_epoch(since))
+
+        if until is not None:
+            sql += ' AND created_at <= ?'
+            params.append(UTILS.to_epoch(until))
+
+        sql += ' ORDER BY created_at DESC'
+
+        if limit is not None:
+            sql += ' LIMIT ?'
+            params.append(limit)
+
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+
+        return [_activity(row) for row in rows]
+
+    def latest(self, device_id, event=None):
+        """Get the newest archived activity, of an event type if given."""
+        activities = self.query(device_id, event=event, limit=1)
+
+        return activities[0] if activities else None
+
+    def count(self, device_id, event=None):
+        """Get the number of archived activities."""
+        sql = 'SELECT COUNT(*) FROM activities WHERE device_id = ?'
+        params = [device_id]
+
+        if event is not None:
+            sql += ' AND event = ?'
+            params.append(event)
+
+        with self._lock:
+            return self._conn.execute(sql, params).fetchone()[0]
+
+    def close(self):
+        """Close the database connection."""
+        with self._lock:
+            self._conn.close()
+
+
+def _activity(row):
+    """Create an activity record from an archive row."""
+    if row[-1] is not None:
+        return Activity.from_json(json.loads(row[-1]), keep_json=True)
+
+    return Activity(*row[:-1])
@@ -0,0 +1,177 @@
+"""
+Access token lifecycle used by SkybellPy.
+
+A new Skybell token takes a few seconds before the cloud accepts it. The
+TokenManager tracks when the token becomes usable so callers wait on one
+shared readiness event instead of each sleeping, and refreshes the token
+in the background before it expires.
+"""
+import asyncio
+import logging
+import threading
+import time
+
+from skybellpy.exceptions import SkybellException
+import skybellpy.helpers.constants as CONST
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class TokenManager():
+    """Track when the access token is usable and refresh it early."""
+
+    def __init__(self, skybell, settle_time=0, lifetime=None,
+                 refresh_margin=CONST.DEFAULT_TOKEN_REFRESH_MARGIN):
+        """Set up the token manager for a Skybell instance."""
+        self._skybell = skybell
+        self._settle_time = settle_time
+        self._lifetime = lifetime
+        self._refresh_margin = refresh_margin
+
+        self._ready = threading.Event()
+        self._ready.set()
+        self._usable_at = 0
+        self._expires_at = None
+
+        self._loop = None
+        self._lock = threading.RLock()
+        self._settle_timers = []
+        self._refresh_timer = None
+
+    @property
+    def ready(self):
+        """Get if the current token may be used."""
+        return self._ready.is_set()
+
+    @property
+    def expires_in(self):
+        """Get the seconds until the token expires, None if unknown."""
+        if self._expires_at is None:
+            return None
+
+        return max(0, self._expires_at - time.monotonic())
+
+    def wait(self, timeout=None):
+        """Block until the current token may be used."""
+        return self._ready.wait(timeout)
+
+    async def wait_async(self, timeout=None):
+        """Wait without blocking the event loop until the token is usable.
+
+        Returns False if the token still isn't usable after the timeout.
+        """
+        try:
+            await asyncio.wait_for(self._settle_async(), timeout)
+        except asyncio.TimeoutError:
+            return False
+
+        return True
+
+    async def _settle_async(self):
+        """Sleep on the event loop until the current token is usable."""
+        while not self._ready.is_set():
+            await asyncio.sleep(max(0.01, self._usable_at - time.monotonic()))
+
+    def issued(self, token, replace=False, loop=None):
+        """Start tracking a newly issued access token.
+
+        After a login there is no usable token, so callers wait until the
+        new one settles. A background refresh keeps using the old token
+        and only swaps in the new one once it has settled. An asyncio
+        client passes its loop so the refresh runs on it.
+        """
+        with self._lock:
+            # A pending settle still has to mark the current token ready
+            self._cancel_timers(settle=not replace)
+            self._loop = loop
+
+            now = time.monotonic()
+            self._usable_at = now + self._settle_time
+
+            if not replace:
+                self._skybell.update_cache({CONST.ACCESS_TOKEN: token})
+
+            if self._settle_time:
+                if not replace:
+                    self._ready.clear()
+
+                timer = threading.Timer(self._settle_time, self._settled,
+                                        (token if replace else None,))
+                timer.daemon = True
+                timer.start()
+
+                self._settle_timers = [pending for pending
+                                       in self._settle_timers
+                                       if pending.is_alive()]
+                self._settle_timers.append(timer)
+            else:
+                self._settled(token if replace else None)
+
+            self._expires_at = None
+
+            if self._lifetime:
+                self._expires_at = now + self._lifetime
+
+                self._refresh_timer = threading.Timer(
+                    max(0, self._lifetime - self._refresh_margin),
+                    self._refresh)
+                self._refresh_timer.daemon = True
+                self._refresh_timer.start()
+
+    def invalidate(self):
+        """Forget the current token and stop any pending refresh."""
+        with self._lock:
+            self._cancel_timers()
+            self._expires_at = None
+
+            # Nobody should keep waiting on a token that is gone
+            self._ready.set()
+
+    def stop(self):
+        """Stop the background timers."""
+        with self._lock:
+            self._cancel_timers()
+
+        self._ready.set()
+
+    def _settled(self, token=None):
+        """Mark the new token as usable, swapping it in if refreshed."""
+        if token is not None:
+            self._skybell.update_cache({CONST.ACCESS_TOKEN: token})
+
+        _LOGGER.debug("Access token is ready")
+        self._ready.set()
+
+    def _refresh(self):
+        """Refresh the token before it expires."""
+        _LOGGER.info("Refreshing access token before it expires")
+
+        try:
+            result = self._skybell.refresh_token()
+        except SkybellException as exc:
+            # The next request will log in again when the token expires
+            _LOGGER.warning("Access token refresh failed: %s", exc)
+            return
+
+        if asyncio.iscoroutine(result):
+            future = asyncio.run_coroutine_threadsafe(result, self._loop)
+            future.add_done_callback(self._refreshed)
+
+    @staticmethod
+    def _refreshed(future):
+        """Log the outcome of a refresh that ran on an event loop."""
+        if not future.cancelled() and future.exception() is not None:
+            _LOGGER.warning("Access token refresh failed: %s",
+                            future.exception())
+
+    def _cancel_timers(self, settle=True):
+        """Cancel the refresh timer and, optionally, the settle timer."""
+        if settle:
+            for timer in self._settle_timers:
+                timer.cancel()
+
+            self._settle_timers = []
+
+        if self._refresh_timer is not None:
+            self._refresh_timer.cancel()
+            self._refresh_timer = None
@@ -0,0 +1,120 @@
+"""
+Cache storage backends used by SkybellPy.
+
+A backend persists the Skybell cache dict. Every backend implements load(),
+save(data, dirty) and close(), where dirty is either None (save everything)
+or a set of changed top level keys, with individual devices given as
+(CONST.DEVICES, device_id) tuples.
+"""
+import logging
+import os.path
+import pickle
+import sqlite3
+import threading
+
+import skybellpy.helpers.constants as CONST
+import skybellpy.utils as UTILS
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class PickleCache():
+    """Store the whole cache in a single pickle file."""
+
+    def __init__(self, path=CONST.CACHE_PATH):
+        """Set up the pickle cache."""
+        self._path = path
+
+    def load(self):
+        """Load the cache, returning None if there isn't one."""
+        if not os.path.exists(self._path):
+            return None
+
+        _LOGGER.debug("Cache found at: %s", self._path)
+
+        if os.path.getsize(self._path) == 0:
+            _LOGGER.debug("Cache file is empty.  Removing it.")
+            os.remove(self._path)
+            return None
+
+        return UTILS.load_cache(self._path)
+
+    def save(self, data, dirty=None):
+        """Rewrite the whole cache file, pickle can't update in place."""
+        UTILS.save_cache(data, self._path)
+
+    def close(self):
+        """Nothing to release for a pickle file."""
+
+
+class SqliteCache():
+    """Store the cache in SQLite, writing only the changed entries."""
+
+    def __init__(self, path=CONST.SQLITE_CACHE_PATH):
+        """Set up the SQLite cache and create the tables."""
+        self._path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+
+        with self._lock, self._conn:
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS entries '
+                '(key TEXT PRIMARY KEY, value BLOB)')
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS devices '
+                '(device_id TEXT PRIMARY KEY, value BLOB)')
+
+    def load(self):
+        """Load the cache, returning None if there isn't one."""
+        with self._lock:
+            entries = self._conn.execute(
+                'SELECT key, value FROM entries').fetchall()
+            devices = self._conn.execute(
+                'SELECT device_id, value FROM devices').fetchall()
+
+        if not entries and not devices:
+            return None
+
+        data = {key: pickle.loads(value) for key, value in entries}
+        data[CONST.DEVICES] = {
+            device_id: pickle.loads(value) for device_id, value in devices}
+
+        return data
+
+    def save(self, data, dirty=None):
+        """Write the dirty entries, or everything if dirty is None."""
+        if dirty is None:
+            dirty = set(key for key in data if key != CONST.DEVICES)
+            dirty.update((CONST.DEVICES, device_id)
+                         for device_id in data.get(CONST.DEVICES, {}))
+
+        entries = []
+        devices = []
+        removed = []
+
+        for key in dirty:
+            if not isinstance(key, tuple):
+                entries.append((key, pickle.dumps(data.get(key))))
+                continue
+
+            device = data.get(CONST.DEVICES, {}).get(key[1])
+
+            if device is None:
+                removed.append((key[1],))
+            else:
+                devices.append((key[1], pickle.dumps(device)))
+
+        with self._lock, self._conn:
+            self._conn.executemany(
+                'DELETE FROM devices WHERE device_id = ?', removed)
+            self._conn.executemany(
+                'INSERT OR REPLACE INTO entries (key, value) VALUES (?, ?)',
+                entries)
+            self._conn.executemany(
+                'INSERT OR REPLACE INTO devices (device_id, value) '
+                'VALUES (?, ?)', devices)
+
+    def close(self):
+        """Close the database connection."""
+        with self._lock:
+            self._conn.close()
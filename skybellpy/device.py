@@ -1,86 +1,274 @@
 """The device class used by SkybellPy."""
+import contextlib
+import functools
 import json
 import logging
+import threading
+import time
 
 from distutils.util import strtobool
 
+from skybellpy.activities import Activity, ActivityStore
 from skybellpy.exceptions import SkybellException
 import skybellpy.helpers.constants as CONST
 import skybellpy.helpers.errors as ERROR
+import skybellpy.settings as SETTINGS
 import skybellpy.utils as UTILS
 
 _LOGGER = logging.getLogger(__name__)
 
 
-class SkybellDevice():
-    """Class to represent each Skybell device."""
+class _LazyEndpoint():
+    """Device attribute holding an endpoint response.
 
-    def __init__(self, device_json, skybell):
-        """Set up Skybell device."""
-        self._device_json = device_json
-        self._device_id = device_json.get(CONST.ID)
-        self._type = device_json.get(CONST.TYPE)
-        self._skybell = skybell
+    When the Skybell instance is in lazy mode the endpoint is requested on
+    first access and memoized until the next refresh.
+    """
+
+    def __init__(self, endpoint):
+        """Set up the lazy endpoint attribute."""
+        self._endpoint = endpoint
 
-        self._avatar_json = self._avatar_request()
-        self._info_json = self._info_request()
-        self._settings_json = self._settings_request()
+    def __get__(self, device, owner):
+        """Get the endpoint response, requesting it if required."""
+        if device is None:
+            return self
 
-        self._update_activities()
+        # pylint: disable=protected-access
+        if (device._lazy and
+                self._endpoint not in device._fetched_at):
+            device._load([self._endpoint])
 
-    def refresh(self):
-        """Refresh the devices json object data."""
-        # Update core device data
-        new_device_json = self._device_request()
-        _LOGGER.debug("Device Refresh Response: %s", new_device_json)
+        return device._endpoint_json[self._endpoint]
 
-        # Update avatar url
-        new_avatar_json = self._avatar_request()
-        _LOGGER.debug("Avatar Refresh Response: %s", new_avatar_json)
+    def __set__(self, device, value):
+        """Replace the endpoint response."""
+        # pylint: disable=protected-access
+        device._endpoint_json[self._endpoint] = value
 
-        # Update device detail info
-        new_info_json = self._info_request()
-        _LOGGER.debug("Device Info Refresh Response: %s", new_info_json)
 
-        # Update device setting details
-        new_settings_json = self._settings_request()
-        _LOGGER.debug("Device Settings Refresh Response: %s",
-                      new_settings_json)
+class _LazyActivities(_LazyEndpoint):
+    """Device attribute holding the activities response.
 
-        # Update the stored data
-        self.update(new_device_json, new_info_json, new_settings_json,
-                    new_avatar_json)
+    Replacing the response also replaces the indexed activity store.
+    """
 
-        # Update the activities
-        self._update_activities()
+    def __set__(self, device, value):
+        """Replace the activities response and the activity store."""
+        # pylint: disable=protected-access
+        value = device._activity_records(value)
 
-    def _device_request(self):
-        url = str.replace(CONST.DEVICE_URL, '$DEVID$', self.device_id)
-        response = self._skybell.send_request(method="get", url=url)
-        return json.loads(response.text)
+        super(_LazyActivities, self).__set__(device, value)
 
-    def _avatar_request(self):
-        url = str.replace(CONST.DEVICE_AVATAR_URL, '$DEVID$', self.device_id)
-        response = self._skybell.send_request(method="get", url=url)
-        return json.loads(response.text)
+        device._activity_store.replace(value)
 
-    def _info_request(self):
-        url = str.replace(CONST.DEVICE_INFO_URL, '$DEVID$', self.device_id)
-        response = self._skybell.send_request(method="get", url=url)
-        return json.loads(response.text)
 
-    def _settings_request(self, method="get", json_data=None):
-        url = str.replace(CONST.DEVICE_SETTINGS_URL, '$DEVID$', self.device_id)
+class SkybellDevice():
+    """Class to represent each Skybell device."""
+
+    _avatar_json = _LazyEndpoint(CONST.ENDPOINT_AVATAR)
+    _info_json = _LazyEndpoint(CONST.ENDPOINT_INFO)
+    _settings_json = _LazyEndpoint(CONST.ENDPOINT_SETTINGS)
+    _activities = _LazyActivities(CONST.ENDPOINT_ACTIVITIES)
+
+    def __init__(self, device_json, skybell, seed=None):
+        """Set up Skybell device.
+
+        The optional seed maps endpoints to responses that were already
+        fetched elsewhere, those endpoints are not requested again. In lazy
+        mode the remaining endpoints are requested on first use.
+        """
+        self._setup(device_json, skybell)
+        self.hydrate(seed)
+
+        if not self._lazy:
+            self._load(self._unloaded_endpoints())
+
+    def _setup(self, device_json, skybell):
+        """Set up the device state without requesting anything."""
+        self._device_json = device_json
+        self._device_id = device_json.get(CONST.ID)
+        self._type = device_json.get(CONST.TYPE)
+        self._skybell = skybell
+        self._lazy = skybell.lazy_load
+        self._keep_activity_json = skybell.keep_activity_json
+
+        # Guards the device state against concurrent refreshes and pushes
+        self._lock = threading.RLock()
+
+        # Settings collected by batch_settings(), per thread
+        self._batch = threading.local()
+
+        # Optimistic setting writes awaiting confirmation, by setting key
+        # the write token and the value to roll back to, and the state of
+        # the last write of each setting
+        self._setting_writes = {}
+        self._setting_states = {}
+        self._settings_confirmed = threading.Condition(self._lock)
+
+        # When each endpoint was last requested successfully
+        self._fetched_at = {}
+
+        self._callbacks = []
+        self._known_activities = None
+        self._activity_store = ActivityStore(*skybell.activity_retention)
+
+        self._endpoint_json = {}
+        self._avatar_json = {}
+        self._info_json = {}
+        self._settings_json = {}
+        self._activities = []
+
+    def _unloaded_endpoints(self):
+        """Get the initial endpoints that haven't been loaded yet."""
+        return [endpoint for endpoint in CONST.INITIAL_ENDPOINTS
+                if endpoint not in self._fetched_at]
+
+    def hydrate(self, endpoint_json):
+        """Merge already fetched endpoint responses into the device."""
+        if endpoint_json:
+            self._merge(dict(endpoint_json), {})
+
+    def prefetch(self, endpoints=None):
+        """Request endpoints that haven't been loaded yet in one batch."""
+        self._load(self._prefetch_endpoints(endpoints))
+
+    def _prefetch_endpoints(self, endpoints=None):
+        """Validate endpoints, returning the ones not loaded yet."""
+        if endpoints is None:
+            endpoints = CONST.INITIAL_ENDPOINTS
+
+        for endpoint in endpoints:
+            if endpoint not in CONST.ENDPOINT_URLS:
+                raise SkybellException(ERROR.INVALID_ENDPOINT, endpoint)
+
+        return [endpoint for endpoint in endpoints
+                if endpoint not in self._fetched_at]
+
+    def refresh(self, force=False, timeout=None):
+        """Refresh the devices json object data.
+
+        Only endpoints whose freshness TTL has expired are requested unless
+        force is set. In lazy mode endpoints that were never used are left
+        alone unless force is set. With a timeout, in seconds, endpoints
+        that haven't finished by then are left stale for the next refresh.
+
+        Returns the endpoints that were refreshed.
+        """
+        endpoints = CONST.ALL_ENDPOINTS if force else self._stale_endpoints()
+
+        return self._load(endpoints, conditional=True,
+                          deadline=_deadline(timeout))
+
+    def _stale_endpoints(self):
+        """Get the endpoints whose last response is older than its TTL."""
+        now = time.monotonic()
+        endpoints = []
+
+        for endpoint in CONST.ALL_ENDPOINTS:
+            fetched_at = self._fetched_at.get(endpoint)
+
+            if fetched_at is None:
+                if (not self._lazy or endpoint == CONST.ENDPOINT_DEVICE):
+                    endpoints.append(endpoint)
+            elif now - fetched_at >= self._skybell.endpoint_ttl(endpoint):
+                endpoints.append(endpoint)
+
+        return endpoints
+
+    def _load(self, endpoints, conditional=False, deadline=None):
+        """Request the given endpoints and merge whatever succeeded."""
+        if not endpoints:
+            return []
+
+        # Responses collect their validators here, a response arriving
+        # after the deadline is never merged so its validators aren't kept
+        validators = {}
+
+        results, errors = self._skybell.gather(
+            ((endpoint, functools.partial(self._endpoint_request, endpoint,
+                                          conditional=conditional,
+                                          deadline=deadline,
+                                          validators=validators))
+             for endpoint in endpoints), deadline)
+
+        return self._merge(results, errors, validators)
+
+    def _merge(self, results, errors, validators=None):
+        """Merge endpoint responses in update order and report failures.
+
+        Returns the endpoints that were merged, endpoints that ran out of
+        time are skipped rather than reported as failures. The validators
+        of the merged responses, (url, headers) by endpoint, are stored.
+        """
+        now = time.monotonic()
+        new_activities = []
+        merged = list(results)
+
+        for endpoint, exc in list(errors.items()):
+            if getattr(exc, 'errcode', None) == ERROR.DEADLINE_EXCEEDED[0]:
+                _LOGGER.debug("Device %s %s request ran out of time",
+                              self.device_id, endpoint)
+                del errors[endpoint]
+
+        with self._lock:
+            for endpoint, result in list(results.items()):
+                _LOGGER.debug("Device %s Response: %s", endpoint, result)
+
+                self._fetched_at[endpoint] = now
+
+                # Unchanged since the last request, nothing to merge
+                if result is None:
+                    del results[endpoint]
+
+            # Update the stored data
+            self.update(results.get(CONST.ENDPOINT_DEVICE),
+                        results.get(CONST.ENDPOINT_INFO),
+                        self._without_pending(
+                            results.get(CONST.ENDPOINT_SETTINGS)),
+                        results.get(CONST.ENDPOINT_AVATAR))
+
+            # Update the activities
+            if CONST.ENDPOINT_ACTIVITIES in results:
+                new_activities = self._update_activities(
+                    results[CONST.ENDPOINT_ACTIVITIES])
+
+            for endpoint in results:
+                if validators and endpoint in validators:
+                    # pylint: disable=protected-access
+                    self._skybell._store_validators(*validators[endpoint])
+
+        # Callbacks run outside of the lock so they may use the device
+        self._notify(new_activities)
+
+        if errors:
+            for endpoint, exc in errors.items():
+                _LOGGER.warning("Device %s %s request failed: %s",
+                                self.device_id, endpoint, exc)
+
+            raise SkybellException(ERROR.ENDPOINT_REQUESTS_FAILED, errors)
+
+        return merged
+
+    def _endpoint_request(self, endpoint, method="get", json_data=None,
+                          conditional=False, deadline=None, validators=None):
+        url = str.replace(CONST.ENDPOINT_URLS[endpoint],
+                          '$DEVID$', self.device_id)
         response = self._skybell.send_request(method=method,
                                               url=url,
-                                              json_data=json_data)
-        return json.loads(response.text)
+                                              json_data=json_data,
+                                              conditional=conditional,
+                                              deadline=deadline)
 
-    def _activities_request(self):
-        url = str.replace(CONST.DEVICE_ACTIVITIES_URL,
-                          '$DEVID$', self.device_id)
-        response = self._skybell.send_request(method="get", url=url)
-        return json.loads(response.text)
+        if response.status_code == CONST.HTTP_NOT_MODIFIED:
+            return None
+
+        result = json.loads(response.text)
+
+        if validators is not None:
+            validators[endpoint] = (url, response.headers)
+
+        return result
 
     def update(self, device_json=None, info_json=None, settings_json=None,
                avatar_json=None):
@@ -97,81 +285,448 @@ class SkybellDevice():
         if settings_json:
             UTILS.update(self._settings_json, settings_json)
 
-    def _update_activities(self):
-        """Update stored activities and update caches as required."""
-        self._activities = self._activities_request()
-        _LOGGER.debug("Device Activities Response: %s", self._activities)
+    def _update_activities(self, activities_json):
+        """Update stored activities, returning the ones not seen before.
 
-        if not self._activities:
-            self._activities = []
-        elif not isinstance(self._activities, (list, tuple)):
-            self._activities = [self._activities]
+        Only activities past the persisted high-water mark are processed,
+        so an unchanged list costs no cache writes or callbacks.
+        """
+        known = self._known_activities
 
-        self._update_events()
+        # The store keeps its history, so only new activities are indexed
+        # and the ones it already holds are refreshed
+        self._endpoint_json[CONST.ENDPOINT_ACTIVITIES] = \
+            self._activity_records(activities_json)
 
-    def _update_events(self):
-        """Update our cached list of latest activity events."""
-        events = self._skybell.dev_cache(self, CONST.EVENT) or {}
+        self._known_activities = set(
+            activity.id for activity in self._activities)
+
+        new_activities = self._new_activities(known)
+
+        if new_activities:
+            self._update_events(new_activities)
+
+        # Nothing can have been waiting on the very first response
+        if known is None:
+            self._store_activities(self._activities)
+
+            return []
+
+        # Activities seen before may have changed, e.g. their video state
+        new_ids = set(id(activity) for activity in new_activities)
+        self._activity_store.update(
+            activity for activity in self._activities
+            if id(activity) not in new_ids)
+
+        self._store_activities(new_activities)
+
+        return new_activities
+
+    def _store_activities(self, activities):
+        """Add activities to the activity store and the archive."""
+        self._activity_store.add(activities)
+
+        archive = self._skybell.activity_archive
+
+        if archive is not None and activities:
+            archive.append(self.device_id, activities)
+
+    def _new_activities(self, known):
+        """Get the activities past the high-water mark."""
+        cursor = self._skybell.dev_cache(self, CONST.ACTIVITY_CURSOR)
+
+        if not cursor:
+            return list(self._activities)
+
+        mark = _activity_time(cursor)
+        new_activities = []
 
         for activity in self._activities:
-            event = activity.get(CONST.EVENT)
-            created_at = activity.get(CONST.CREATED_AT)
+            created_at = activity.created_at or 0
+
+            # Same second as the mark, only new if we hadn't seen its id
+            if created_at > mark or (
+                    created_at == mark and known is not None and
+                    activity.id not in known and
+                    activity.id != cursor.get(CONST.ID)):
+                new_activities.append(activity)
+
+        return new_activities
+
+    def _activity_records(self, activities_json):
+        """Parse an activities response into a list of records."""
+        if not activities_json:
+            return []
+
+        if not isinstance(activities_json, (list, tuple)):
+            activities_json = [activities_json]
+
+        return [Activity.from_json(activity, self._keep_activity_json)
+                for activity in activities_json]
+
+    def add_activity(self, activity):
+        """Add a single activity, such as one pushed by the cloud."""
+        activity = Activity.from_json(activity, self._keep_activity_json)
+        activity_id = activity.id
+
+        with self._lock:
+            activities = self._activities or []
+
+            if any(existing.id == activity_id for existing in activities):
+                return
+
+            self._endpoint_json[CONST.ENDPOINT_ACTIVITIES] = \
+                [activity] + list(activities)
+            self._store_activities([activity])
+
+            if self._known_activities is not None:
+                self._known_activities.add(activity_id)
+
+            self._update_events([activity])
+
+        self._notify([activity])
+
+    def add_callback(self, callback, event=None):
+        """Call callback(device, activity) for new activities.
+
+        If event is given the callback only receives that event type.
+        """
+        self._callbacks.append((callback, event))
 
-            old_event = events.get(event)
+    def _notify(self, activities):
+        """Pass new activities to the registered callbacks."""
+        for activity in activities:
+            for callback, event in self._callbacks:
+                if event is None or activity.event == event:
+                    callback(self, activity)
 
-            if old_event and created_at < old_event.get(CONST.CREATED_AT):
+    def _update_events(self, activities=None):
+        """Update our cached latest activity events and high-water mark."""
+        if activities is None:
+            activities = self._activities
+
+        # Work on a copy, the cached events are only replaced under the
+        # cache lock the write-behind saver pickles them with
+        events = dict(self._skybell.dev_cache(self, CONST.EVENT) or {})
+        cursor = self._skybell.dev_cache(self, CONST.ACTIVITY_CURSOR)
+
+        for activity in activities:
+            created_at = activity.created_at or 0
+
+            if not cursor or created_at > _activity_time(cursor):
+                cursor = {
+                    CONST.CREATED_AT: activity[CONST.CREATED_AT],
+                    CONST.ID: activity.id
+                }
+
+            old_event = events.get(activity.event)
+
+            if old_event and created_at < (
+                    Activity.from_json(old_event).created_at or 0):
                 continue
 
-            events[event] = activity
+            # Persist plain json, records are internal and may change
+            events[activity.event] = dict(activity.json)
 
+        # Merging would mix the fields of an older event into the new one
         self._skybell.update_dev_cache(
             self,
             {
-                CONST.EVENT: events
-            })
+                CONST.EVENT: events,
+                CONST.ACTIVITY_CURSOR: cursor
+            }, replace=True)
 
-    def activities(self, limit=1, event=None):
-        """Return device activity information."""
-        activities = self._activities or []
+    def activities(self, limit=1, event=None, since=None, until=None):
+        """Return device activity information, newest first.
 
-        # Filter our activity array if requested
-        if event:
-            activities = list(
-                filter(
-                    lambda activity:
-                    activity[CONST.EVENT] == event, activities))
+        Activities may be limited to an event type and to a time range,
+        since and until are epoch seconds or ISO 8601 timestamps.
+        """
+        # In lazy mode the activities are requested on first use
+        if self._lazy:
+            self.prefetch([CONST.ENDPOINT_ACTIVITIES])
+
+        with self._lock:
+            return self._activity_store.query(event or None, since, until,
+                                              limit)
 
-        # Return the requested number
-        return activities[:limit]
+    def history(self, limit=None, event=None, since=None, until=None):
+        """Return archived device activities, newest first.
+
+        Without an activity archive only the activities kept in memory
+        are available.
+        """
+        archive = self._skybell.activity_archive
+
+        if archive is None:
+            return self.activities(limit, event, since, until)
+
+        return archive.query(self.device_id, event or None, since, until,
+                             limit)
 
     def latest(self, event=None):
         """Return the latest event activity."""
+        with self._lock:
+            latest = self._activity_store.latest(event or None)
+
+        if latest is not None:
+            return latest
+
+        # Events seen before a restart are only in the cache
         events = self._skybell.dev_cache(self, CONST.EVENT) or {}
         _LOGGER.debug(events)
 
+        events = [Activity.from_json(evt, self._keep_activity_json)
+                  for evt in events.values()]
+
         if event:
-            return events.get(event)
+            events = [evt for evt in events if evt.event == event]
+
+        return max(events, key=lambda evt: evt.created_at or 0,
+                   default=None)
+
+    def media_ready(self, activity, small=False):
+        """Get if the media of an activity can be downloaded."""
+        activity = Activity.from_json(activity)
 
-        latest = None
-        for _, evt in events.items():
-            if not latest or \
-                    latest.get(CONST.CREATED_AT) < evt.get(CONST.CREATED_AT):
-                latest = evt
-        return latest
+        if small:
+            return bool(activity.media_small)
+
+        return bool(activity.media) and \
+            activity.video_state == CONST.VIDEO_STATE_READY
+
+    def download_media(self, activity=None, small=False):
+        """Download the media of an activity, the latest by default.
+
+        The media is streamed into the Skybell media cache, returns the
+        path of the local file.
+        """
+        if activity is None:
+            activity = self.latest()
+
+        if activity is None or not self.media_ready(activity, small):
+            raise SkybellException(ERROR.MEDIA_NOT_READY, self.device_id)
+
+        activity = Activity.from_json(activity)
+        kind = CONST.MEDIA_SMALL_URL if small else CONST.MEDIA_URL
+        key = '{}/{}/{}'.format(self.device_id, activity.id, kind)
+
+        return self._skybell.fetch_media(key, activity[kind])
+
+    def apply_settings(self, settings, force=False):
+        """Validate the settings and then send them in one PATCH request.
+
+        Nothing is sent unless every setting is valid. Unless force is set
+        settings that already hold their value are left out, and nothing
+        is sent if none changed. Returns the settings that were sent,
+        raises a SkybellException if the request fails.
+        """
+        settings = self._settings_to_send(settings, force)
+
+        if settings:
+            self._endpoint_request(CONST.ENDPOINT_SETTINGS,
+                                   method="patch", json_data=settings)
+
+            with self._lock:
+                self.update(settings_json=settings)
+
+        return settings
+
+    def settings_diff(self, settings):
+        """Get the settings that differ from the known device settings."""
+        with self._lock:
+            return {key: value for key, value in settings.items()
+                    if not _same_setting(self._settings_json.get(key),
+                                         value)}
+
+    def _settings_to_send(self, settings, force=False):
+        """Validate settings and drop the ones that wouldn't change."""
+        settings = dict(settings)
+        SETTINGS.validate_settings(settings)
+
+        if force:
+            return settings
+
+        changed = self.settings_diff(settings)
+
+        if len(changed) < len(settings):
+            # pylint: disable=protected-access
+            self._skybell._count(CONST.STAT_SUPPRESSED_SETTINGS,
+                                 len(settings) - len(changed))
+
+            if not changed:
+                self._skybell._count(CONST.STAT_SUPPRESSED_WRITES)
+
+        return changed
+
+    @contextlib.contextmanager
+    def batch_settings(self, force=False):
+        """Collect the settings set on this thread and send them at once.
+
+        Setting properties inside the block validates them immediately,
+        the merged settings are sent in one PATCH request when the block
+        exits without an exception. force sends unchanged settings too.
+        """
+        # Nested batches are sent by the outermost one
+        if getattr(self._batch, 'settings', None) is not None:
+            yield self
+            return
+
+        self._batch.settings = settings = {}
+
+        try:
+            yield self
+        finally:
+            self._batch.settings = None
+
+        self._apply_batch(settings, force)
+
+    def _apply_batch(self, settings, force=False):
+        """Send the settings collected by a batch."""
+        if self._skybell.optimistic_settings:
+            self._write_optimistic(settings, force)
+        else:
+            self.apply_settings(settings, force)
+
+    def _batched(self, settings):
+        """Add settings to the current batch, False without one."""
+        batch = getattr(self._batch, 'settings', None)
+
+        if batch is None:
+            return False
+
+        batch.update(settings)
+
+        return True
 
     def _set_setting(self, settings):
         """Validate the settings and then send the PATCH request."""
-        for key, value in settings.items():
-            _validate_setting(key, value)
+        SETTINGS.validate_settings(settings)
 
-        try:
-            self._settings_request(method="patch", json_data=settings)
+        if self._batched(settings):
+            return
+
+        if self._skybell.optimistic_settings:
+            self._write_optimistic(settings)
+            return
 
-            self.update(settings_json=settings)
+        try:
+            self.apply_settings(settings)
         except SkybellException as exc:
             _LOGGER.warning("Exception changing settings: %s", settings)
             _LOGGER.warning(exc)
 
+    def setting_state(self, setting):
+        """Get if the last optimistic change of a setting is pending.
+
+        Returns CONST.SETTING_PENDING, SETTING_CONFIRMED or SETTING_FAILED,
+        or None if the setting wasn't changed optimistically.
+        """
+        with self._lock:
+            return self._setting_states.get(setting)
+
+    def wait_for_settings(self, timeout=None):
+        """Wait until no optimistic setting change is pending.
+
+        Returns False if changes are still pending after the timeout.
+        """
+        with self._settings_confirmed:
+            return self._settings_confirmed.wait_for(
+                lambda: not self._setting_writes, timeout)
+
+    def _write_optimistic(self, settings, force=False):
+        """Show new settings at once and confirm them in the background."""
+        token, settings = self._begin_settings(settings, force)
+
+        if settings:
+            self._skybell.submit(
+                functools.partial(self._confirm_settings, token, settings))
+
+    def _confirm_settings(self, token, settings):
+        """Send an optimistic write and re-read the settings to confirm."""
+        try:
+            self._endpoint_request(CONST.ENDPOINT_SETTINGS,
+                                   method="patch", json_data=settings)
+        except (SkybellException, ValueError) as exc:
+            self._finish_settings(token, settings, exc=exc)
+            return
+
+        try:
+            settings_json = self._endpoint_request(CONST.ENDPOINT_SETTINGS)
+        except (SkybellException, ValueError) as exc:
+            # The write was accepted, trust it until the next refresh
+            _LOGGER.debug("Device %s settings confirmation failed: %s",
+                          self.device_id, exc)
+            settings_json = None
+
+        self._finish_settings(token, settings, settings_json)
+
+    def _begin_settings(self, settings, force=False):
+        """Merge settings before they are sent and mark them pending.
+
+        Returns a write token and the settings to send.
+        """
+        token = object()
+
+        with self._lock:
+            settings = self._settings_to_send(settings, force)
+
+            for key, value in settings.items():
+                # Overlapping writes roll back to the last confirmed value
+                previous = self._setting_writes.get(
+                    key, (None, self._settings_json.get(key)))[1]
+
+                self._setting_writes[key] = (token, previous)
+                self._setting_states[key] = CONST.SETTING_PENDING
+                self._settings_json[key] = value
+
+        return token, settings
+
+    def _finish_settings(self, token, settings, settings_json=None,
+                         exc=None):
+        """Confirm or roll back the settings of an optimistic write.
+
+        With an exception the previous values are restored, otherwise
+        settings the re-read settings_json doesn't hold are failed and
+        take the value the device reports. Settings changed again since
+        are left to the later write.
+        """
+        if exc is not None:
+            _LOGGER.warning("Exception changing settings: %s", settings)
+            _LOGGER.warning(exc)
+
+        with self._settings_confirmed:
+            for key, value in settings.items():
+                owner, previous = self._setting_writes.get(key, (None, None))
+
+                if owner is not token:
+                    continue
+
+                del self._setting_writes[key]
+
+                if exc is not None:
+                    self._setting_states[key] = CONST.SETTING_FAILED
+                    self._settings_json[key] = previous
+
+                    if previous is None:
+                        del self._settings_json[key]
+                elif (settings_json is not None and
+                      not _same_setting(settings_json.get(key), value)):
+                    self._setting_states[key] = CONST.SETTING_FAILED
+                else:
+                    self._setting_states[key] = CONST.SETTING_CONFIRMED
+
+            self.update(settings_json=self._without_pending(settings_json))
+            self._settings_confirmed.notify_all()
+
+    def _without_pending(self, settings_json):
+        """Drop the settings with optimistic writes still pending."""
+        if not settings_json or not self._setting_writes:
+            return settings_json
+
+        return {key: value for key, value in settings_json.items()
+                if key not in self._setting_writes}
+
     @property
     def name(self):
         """Get the name of this device."""
@@ -210,6 +765,24 @@ class SkybellDevice():
         """Get the most recent 'avatar' image."""
         return self._avatar_json.get(CONST.AVATAR_URL)
 
+    def image_bytes(self, size=None):
+        """Get the most recent 'avatar' image, None without one.
+
+        The image is only downloaded again once the device reports a new
+        avatar. With a (width, height) size a thumbnail fitting in it is
+        returned instead, which requires Pillow.
+        """
+        url = self.image
+
+        if not url:
+            return None
+
+        key = '{}/{}/{}/{}'.format(
+            self.device_id, CONST.ENDPOINT_AVATAR,
+            self._avatar_json.get(CONST.CREATED_AT), url)
+
+        return self._skybell.fetch_image(key, url, size)
+
     @property
     def activity_image(self):
         """Get the most recent activity image."""
@@ -241,7 +814,8 @@ class SkybellDevice():
         """Set do not disturb."""
         self._set_setting(
             {
-                CONST.SETTINGS_DO_NOT_DISTURB: str(enabled).lower()
+                CONST.SETTINGS_DO_NOT_DISTURB: SETTINGS.encode_setting(
+                    CONST.SETTINGS_DO_NOT_DISTURB, enabled)
             })
 
     @property
@@ -339,47 +913,23 @@ class SkybellDevice():
             self.status, self.wifi_status)
 
 
-def _validate_setting(setting, value):
-    """Validate the setting and value."""
-    if setting not in CONST.ALL_SETTINGS:
-        raise SkybellException(ERROR.INVALID_SETTING, setting)
-
-    if setting == CONST.SETTINGS_DO_NOT_DISTURB:
-        if value not in CONST.SETTINGS_DO_NOT_DISTURB_VALUES:
-            raise SkybellException(ERROR.INVALID_SETTING_VALUE,
-                                   (setting, value))
-
-    if setting == CONST.SETTINGS_OUTDOOR_CHIME:
-        if value not in CONST.SETTINGS_OUTDOOR_CHIME_VALUES:
-            raise SkybellException(ERROR.INVALID_SETTING_VALUE,
-                                   (setting, value))
+def _activity_time(activity):
+    """Get the creation time of an activity in epoch seconds."""
+    return UTILS.parse_timestamp(activity.get(CONST.CREATED_AT)) or 0
 
-    if setting == CONST.SETTINGS_MOTION_POLICY:
-        if value not in CONST.SETTINGS_MOTION_POLICY_VALUES:
-            raise SkybellException(ERROR.INVALID_SETTING_VALUE,
-                                   (setting, value))
 
-    if setting == CONST.SETTINGS_MOTION_THRESHOLD:
-        if value not in CONST.SETTINGS_MOTION_THRESHOLD_VALUES:
-            raise SkybellException(ERROR.INVALID_SETTING_VALUE,
-                                   (setting, value))
+def _deadline(timeout):
+    """Turn a timeout in seconds into a time.monotonic() deadline."""
+    if timeout is None:
+        return None
 
-    if setting == CONST.SETTINGS_VIDEO_PROFILE:
-        if value not in CONST.SETTINGS_VIDEO_PROFILE_VALUES:
-            raise SkybellException(ERROR.INVALID_SETTING_VALUE,
-                                   (setting, value))
+    return time.monotonic() + timeout
 
-    if setting in CONST.SETTINGS_LED_COLOR:
-        if (value < CONST.SETTINGS_LED_VALUES[0] or
-                value > CONST.SETTINGS_LED_VALUES[1]):
-            raise SkybellException(ERROR.INVALID_SETTING_VALUE,
-                                   (setting, value))
 
-    if setting == CONST.SETTINGS_LED_INTENSITY:
-        if not isinstance(value, int):
-            raise SkybellException(ERROR.COLOR_INTENSITY_NOT_VALID, value)
+def _same_setting(current, value):
+    """Get if a known setting value already equals a new value."""
+    if current is None:
+        return False
 
-        if (value < CONST.SETTINGS_LED_INTENSITY_VALUES[0] or
-                value > CONST.SETTINGS_LED_INTENSITY_VALUES[1]):
-            raise SkybellException(ERROR.INVALID_SETTING_VALUE,
-                                   (setting, value))
+    # The api returns some settings as json booleans or numbers
+    return current == value or str(current).lower() == str(value).lower()
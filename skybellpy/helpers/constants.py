@@ -39,6 +39,9 @@ PROJECT_GITHUB_REPOSITORY = 'skybellpy'
 PYPI_URL = 'https://pypi.python.org/pypi/{}'.format(PROJECT_PACKAGE_NAME)
 
 CACHE_PATH = './skybell.pickle'
+SQLITE_CACHE_PATH = './skybell.db'
+ARCHIVE_PATH = './skybell_archive.db'
+MEDIA_CACHE_PATH = './skybell_media'
 
 USER_AGENT = 'skybellpy/{}.{}.{}'.format(MAJOR_VERSION,
                                          MINOR_VERSION,
@@ -46,12 +49,56 @@ USER_AGENT = 'skybellpy/{}.{}.{}'.format(MAJOR_VERSION,
 
 DEFAULT_AGENT_IDENTIFIER = 'default'
 
+DEFAULT_MAX_CONCURRENCY = 10
+DEFAULT_POOL_SIZE = 10
+
+# POLLING (seconds)
+DEFAULT_POLL_INTERVAL = 60
+DEFAULT_POLL_ACTIVE_INTERVAL = 15
+DEFAULT_POLL_IDLE_INTERVAL = 300
+DEFAULT_POLL_DOWN_INTERVAL = 600
+DEFAULT_POLL_ACTIVE_WINDOW = 300
+DEFAULT_POLL_IDLE_WINDOW = 86400
+DEFAULT_POLL_JITTER = 0.1
+
+# LOGIN (seconds)
+LOGIN_SETTLE_TIME = 5
+DEFAULT_TOKEN_REFRESH_MARGIN = 60
+
+# TIMEOUTS (seconds)
+DEFAULT_CONNECT_TIMEOUT = 5
+DEFAULT_READ_TIMEOUT = 30
+DEFAULT_TIMEOUT = (DEFAULT_CONNECT_TIMEOUT, DEFAULT_READ_TIMEOUT)
+
+# RETRIES (seconds)
+DEFAULT_MAX_RETRIES = 2
+DEFAULT_BACKOFF_BASE = 0.5
+DEFAULT_BACKOFF_MAX = 30
+DEFAULT_BREAKER_THRESHOLD = 5
+DEFAULT_BREAKER_COOLDOWN = 30
+
+# RECONCILE
+DEFAULT_RECONCILE_ATTEMPTS = 3
+RECONCILE_DEFAULT = 'default'
+RECONCILE_GROUPS = 'groups'
+RECONCILE_DEVICES = 'devices'
+RECONCILE_SETTINGS = 'settings'
+
+# ACTIVITIES
+DEFAULT_ACTIVITY_RETENTION = 500
+
+# MEDIA (bytes)
+DEFAULT_MEDIA_CACHE_SIZE = 512 * 1024 * 1024
+MEDIA_CHUNK_SIZE = 64 * 1024
+DEFAULT_IMAGE_CACHE_SIZE = 32 * 1024 * 1024
+
 # URLS
 BASE_URL = 'https://cloud.myskybell.com/api/v3/'
 BASE_URL_V4 = 'https://cloud.myskybell.com/api/v4/'
 
 LOGIN_URL = BASE_URL + 'login/'
 LOGOUT_URL = BASE_URL + 'logout/'
+REGISTER_URL = BASE_URL + 'register/'
 
 USERS_ME_URL = BASE_URL + 'users/me/'
 
@@ -67,6 +114,47 @@ SUBSCRIPTION_URL = BASE_URL + 'subscriptions/$SUBSCRIPTIONID$'
 SUBSCRIPTION_INFO_URL = SUBSCRIPTION_URL + '/info/'
 SUBSCRIPTION_SETTINGS_URL = SUBSCRIPTION_URL + '/settings/'
 
+# PUSH
+PUSH_URL = 'https://cloud.myskybell.com/'
+PUSH_PATH = '/socket.io/'
+PUSH_PROTOCOL = 'socketio'
+PUSH_URL_KEY = 'url'
+DEFAULT_PUSH_FALLBACK_INTERVAL = 60
+DEFAULT_PUSH_PING_INTERVAL = 25
+DEFAULT_PUSH_PING_TIMEOUT = 5
+
+# HTTP
+HTTP_OK = 200
+HTTP_PARTIAL_CONTENT = 206
+HTTP_NOT_MODIFIED = 304
+HTTP_UNAUTHORIZED = 401
+HTTP_FORBIDDEN = 403
+HTTP_RANGE_NOT_SATISFIABLE = 416
+HTTP_TOO_MANY_REQUESTS = 429
+HTTP_SERVER_ERROR = 500
+HTTP_AUTH_ERRORS = (HTTP_UNAUTHORIZED, HTTP_FORBIDDEN)
+RETRY_AFTER = 'Retry-After'
+ETAG = 'ETag'
+LAST_MODIFIED = 'Last-Modified'
+IF_NONE_MATCH = 'If-None-Match'
+IF_MODIFIED_SINCE = 'If-Modified-Since'
+
+# STATS
+STAT_REVALIDATION_HITS = 'revalidation_hits'
+STAT_REVALIDATION_MISSES = 'revalidation_misses'
+STAT_RETRIES = 'retries'
+STAT_SHORT_CIRCUITS = 'short_circuits'
+STAT_CONNECTIONS_OPENED = 'connections_opened'
+STAT_CONNECTIONS_REUSED = 'connections_reused'
+STAT_CONNECTIONS_WAITED = 'connections_waited'
+STAT_SUPPRESSED_WRITES = 'suppressed_writes'
+STAT_SUPPRESSED_SETTINGS = 'suppressed_settings'
+
+# OPTIMISTIC SETTING STATES
+SETTING_PENDING = 'pending'
+SETTING_CONFIRMED = 'confirmed'
+SETTING_FAILED = 'failed'
+
 # GENERAL
 APP_ID = 'app_id'
 CLIENT_ID = 'client_id'
@@ -74,6 +162,9 @@ TOKEN = 'token'
 ACCESS_TOKEN = 'access_token'
 DEVICES = 'devices'
 
+# SUBSCRIPTION
+SUBSCRIPTION_DEVICE = 'device'
+
 # DEVICE
 NAME = 'name'
 ID = 'id'
@@ -86,6 +177,39 @@ LOCATION_LNG = 'lng'
 AVATAR = 'avatar'
 AVATAR_URL = 'url'
 MEDIA_URL = 'media'
+MEDIA_SMALL_URL = 'mediaSmall'
+
+# DEVICE ENDPOINTS
+ENDPOINT_DEVICE = 'device'
+ENDPOINT_AVATAR = 'avatar'
+ENDPOINT_INFO = 'info'
+ENDPOINT_SETTINGS = 'settings'
+ENDPOINT_ACTIVITIES = 'activities'
+
+# Listed in the order responses are merged into the device
+ALL_ENDPOINTS = [ENDPOINT_DEVICE, ENDPOINT_AVATAR, ENDPOINT_INFO,
+                 ENDPOINT_SETTINGS, ENDPOINT_ACTIVITIES]
+
+# Requested when a device is created, the device json is already known
+INITIAL_ENDPOINTS = [ENDPOINT_AVATAR, ENDPOINT_INFO,
+                     ENDPOINT_SETTINGS, ENDPOINT_ACTIVITIES]
+
+ENDPOINT_URLS = {
+    ENDPOINT_DEVICE: DEVICE_URL,
+    ENDPOINT_AVATAR: DEVICE_AVATAR_URL,
+    ENDPOINT_INFO: DEVICE_INFO_URL,
+    ENDPOINT_SETTINGS: DEVICE_SETTINGS_URL,
+    ENDPOINT_ACTIVITIES: DEVICE_ACTIVITIES_URL
+}
+
+# Seconds a response stays fresh before refresh() requests it again
+DEFAULT_ENDPOINT_TTLS = {
+    ENDPOINT_DEVICE: 0,
+    ENDPOINT_AVATAR: 0,
+    ENDPOINT_INFO: 0,
+    ENDPOINT_SETTINGS: 0,
+    ENDPOINT_ACTIVITIES: 0
+}
 
 # DEVICE INFO
 WIFI_LINK = 'wifiLink'
@@ -98,6 +222,8 @@ EVENT_ON_DEMAND = 'application:on-demand'
 EVENT_BUTTON = 'device:sensor:button'
 EVENT_MOTION = 'device:sensor:motion'
 CREATED_AT = 'createdAt'
+ACTIVITY_CURSOR = 'activity_cursor'
+ACTIVITY_DEVICE = 'device'
 
 STATE = 'state'
 STATE_READY = 'ready'
@@ -18,3 +18,33 @@ COLOR_VALUE_NOT_VALID = (
 
 COLOR_INTENSITY_NOT_VALID = (
     7, "Intensity value is not a valid integer")
+
+ENDPOINT_REQUESTS_FAILED = (
+    8, "One or more device endpoint requests failed")
+
+INVALID_ENDPOINT = (
+    9, "Device endpoint is not valid")
+
+PUSH_FAILED = (
+    10, "Push connection failed")
+
+CIRCUIT_OPEN = (
+    11, "Endpoint is failing, requests are paused")
+
+DEADLINE_EXCEEDED = (
+    12, "Request deadline exceeded")
+
+MEDIA_NOT_READY = (
+    13, "Activity media is not ready for download")
+
+MEDIA_DOWNLOAD_FAILED = (
+    14, "Media download failed")
+
+THUMBNAILS_UNAVAILABLE = (
+    15, "Thumbnails are unavailable")
+
+UNKNOWN_DEVICE = (
+    16, "Device is not known")
+
+ASYNC_UNSUPPORTED = (
+    17, "Not supported by the asyncio client")
@@ -0,0 +1,104 @@
+"""
+Image cache used by SkybellPy.
+
+Device avatars are kept in a size bounded in-memory LRU in front of the
+on-disk media cache. Images are keyed by their url and creation time, so
+an avatar is only downloaded again once the device reports a new one.
+Thumbnails are generated once per image and cached the same way, which
+requires Pillow.
+"""
+import collections
+import io
+import threading
+
+from skybellpy.exceptions import SkybellException
+import skybellpy.helpers.constants as CONST
+import skybellpy.helpers.errors as ERROR
+
+
+class ImageCache():
+    """Memory LRU of image bytes backed by a MediaCache."""
+
+    def __init__(self, media_cache, max_size=CONST.DEFAULT_IMAGE_CACHE_SIZE):
+        """Set up the image cache, max_size bounds the bytes in memory."""
+        self._media_cache = media_cache
+        self._max_size = max_size
+        self._size = 0
+        self._images = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def fetch(self, key, url, get, size=None):
+        """Get the bytes of an image, or of a thumbnail fitting in size.
+
+        get(url, headers) must return a streamed requests response.
+        """
+        if size is not None:
+            size = tuple(size)
+            key = '{}@{}x{}'.format(key, *size)
+
+        data = self._get(key)
+
+        if data is not None:
+            return data
+
+        path = self._media_cache.get(key)
+
+        if path is not None:
+            data = _read(path)
+        elif size is None:
+            data = _read(self._media_cache.fetch(key, url, get))
+        else:
+            data = _thumbnail(self.fetch(key.rsplit('@', 1)[0], url, get),
+                              size)
+            self._media_cache.put(key, data)
+
+        self._put(key, data)
+
+        return data
+
+    def _get(self, key):
+        """Get image bytes from memory, marking them recently used."""
+        with self._lock:
+            data = self._images.get(key)
+
+            if data is not None:
+                self._images.move_to_end(key)
+
+            return data
+
+    def _put(self, key, data):
+        """Keep image bytes in memory, evicting the least recently used."""
+        with self._lock:
+            if key in self._images:
+                self._size -= len(self._images.pop(key))
+
+            self._images[key] = data
+            self._size += len(data)
+
+            while self._size > self._max_size and len(self._images) > 1:
+                _, evicted = self._images.popitem(last=False)
+                self._size -= len(evicted)
+
+
+def _read(path):
+    """Read the bytes of a cached file."""
+    with open(path, 'rb') as handle:
+        return handle.read()
+
+
+def _thumbnail(data, size):
+    """Resize image bytes to fit in a (width, height) size."""
+    try:
+        from PIL import Image  # pylint: disable=import-outside-toplevel
+    except ImportError:
+        raise SkybellException(ERROR.THUMBNAILS_UNAVAILABLE,
+                               "Pillow is not installed")
+
+    image = Image.open(io.BytesIO(data))
+    image_format = image.format or 'JPEG'
+    image.thumbnail(size)
+
+    output = io.BytesIO()
+    image.save(output, format=image_format)
+
+    return output.getvalue()
@@ -0,0 +1,201 @@
+"""
+Media cache used by SkybellPy.
+
+Activity videos and images are streamed to disk in chunks and stored by
+the sha256 of their content, so the same media referenced by several
+activities is only kept once. Interrupted downloads resume from their
+partial file. The least recently used media is evicted once the cache
+grows past its size limit.
+"""
+import hashlib
+import logging
+import os
+import threading
+
+from requests.exceptions import RequestException
+
+from skybellpy.exceptions import SkybellException
+import skybellpy.helpers.constants as CONST
+import skybellpy.helpers.errors as ERROR
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class MediaCache():
+    """Content addressed, size bounded on-disk media cache."""
+
+    def __init__(self, path=CONST.MEDIA_CACHE_PATH,
+                 max_size=CONST.DEFAULT_MEDIA_CACHE_SIZE,
+                 chunk_size=CONST.MEDIA_CHUNK_SIZE):
+        """Set up the media cache, directories are created on first use."""
+        self._objects = os.path.join(path, 'objects')
+        self._refs = os.path.join(path, 'refs')
+        self._partial = os.path.join(path, 'partial')
+        self._max_size = max_size
+        self._chunk_size = chunk_size
+
+        # Downloads of the same media share one partial file
+        self._lock = threading.Lock()
+        self._key_locks = {}
+
+    def get(self, key):
+        """Get the path of cached media, None if it isn't cached."""
+        path = self._object_path(key)
+
+        if path is None:
+            return None
+
+        # The modification time orders media for eviction
+        try:
+            os.utime(path)
+        except OSError:
+            return None
+
+        return path
+
+    def fetch(self, key, url, get):
+        """Get the path of media, downloading it if it isn't cached.
+
+        get(url, headers) must return a streamed requests response.
+        """
+        with self._key_lock(key):
+            path = self.get(key)
+
+            if path is not None:
+                return path
+
+            self._makedirs()
+
+            path = self._download(key, url, get)
+
+        self._evict(keep=path)
+
+        return path
+
+    def put(self, key, data):
+        """Store media that is already in memory, returning its path."""
+        with self._key_lock(key):
+            self._makedirs()
+
+            partial = os.path.join(self._partial, _digest(key))
+
+            with open(partial, 'wb') as handle:
+                handle.write(data)
+
+            path = self._commit(key, partial, hashlib.sha256(data))
+
+        self._evict(keep=path)
+
+        return path
+
+    def _makedirs(self):
+        """Create the cache directories."""
+        for directory in (self._objects, self._refs, self._partial):
+            os.makedirs(directory, exist_ok=True)
+
+    def _download(self, key, url, get):
+        """Stream media into its partial file and move it into the cache."""
+        partial = os.path.join(self._partial, _digest(key))
+        sha = hashlib.sha256()
+        offset = 0
+
+        # Hash what an earlier attempt already downloaded to resume it
+        if os.path.exists(partial):
+            with open(partial, 'rb') as handle:
+                for chunk in iter(lambda: handle.read(self._chunk_size), b''):
+                    sha.update(chunk)
+                    offset += len(chunk)
+
+        headers = {'Range': 'bytes={}-'.format(offset)} if offset else {}
+
+        try:
+            response = get(url, headers)
+
+            if offset and \
+                    response.status_code == CONST.HTTP_RANGE_NOT_SATISFIABLE:
+                # The partial file already holds everything
+                response.close()
+            elif response.status_code not in (CONST.HTTP_OK,
+                                              CONST.HTTP_PARTIAL_CONTENT):
+                response.close()
+                raise SkybellException(ERROR.MEDIA_DOWNLOAD_FAILED,
+                                       response.status_code)
+            else:
+                resumed = response.status_code == CONST.HTTP_PARTIAL_CONTENT
+
+                if offset and not resumed:
+                    _LOGGER.debug("Media %s can't resume, restarting", key)
+                    sha = hashlib.sha256()
+
+                mode = 'ab' if resumed else 'wb'
+
+                with response, open(partial, mode) as handle:
+                    for chunk in response.iter_content(self._chunk_size):
+                        sha.update(chunk)
+                        handle.write(chunk)
+        except RequestException as exc:
+            raise SkybellException(ERROR.MEDIA_DOWNLOAD_FAILED, exc)
+
+        return self._commit(key, partial, sha)
+
+    def _commit(self, key, partial, sha):
+        """Move a complete partial file into the cache under its hash."""
+        digest = sha.hexdigest()
+        path = os.path.join(self._objects, digest)
+
+        # Identical media is only stored once
+        if os.path.exists(path):
+            os.remove(partial)
+        else:
+            os.replace(partial, path)
+
+        with open(os.path.join(self._refs, _digest(key)), 'w') as handle:
+            handle.write(digest)
+
+        return path
+
+    def _object_path(self, key):
+        """Get the path a key refers to, None if it doesn't exist."""
+        try:
+            with open(os.path.join(self._refs, _digest(key))) as handle:
+                path = os.path.join(self._objects, handle.read().strip())
+        except OSError:
+            return None
+
+        return path if os.path.exists(path) else None
+
+    def _key_lock(self, key):
+        """Get the lock serializing downloads of a key."""
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def _evict(self, keep=None):
+        """Remove the least recently used media past the size limit."""
+        if self._max_size is None:
+            return
+
+        with self._lock:
+            entries = []
+
+            for name in os.listdir(self._objects):
+                stat = os.stat(os.path.join(self._objects, name))
+                entries.append((stat.st_mtime, stat.st_size, name))
+
+            size = sum(entry[1] for entry in entries)
+
+            # Never evict the media that was just asked for
+            entries = [entry for entry in entries
+                       if os.path.join(self._objects, entry[2]) != keep]
+
+            # References to evicted media become misses
+            for _, entry_size, name in sorted(entries):
+                if size <= self._max_size:
+                    break
+
+                os.remove(os.path.join(self._objects, name))
+                size -= entry_size
+
+
+def _digest(value):
+    """Get the sha256 hex digest of a string."""
+    return hashlib.sha256(value.encode('utf-8')).hexdigest()
@@ -0,0 +1,96 @@
+"""
+Connection pooling used by SkybellPy.
+
+Every request goes to the same Skybell cloud host, so the size of the
+pool for that host bounds how many requests can share warm connections.
+The adapter here sizes the pool and counts how its connections are used.
+"""
+import threading
+
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+import skybellpy.helpers.constants as CONST
+
+
+class PoolStats():
+    """Thread safe counters of connection pool usage."""
+
+    def __init__(self):
+        """Set up the pool counters."""
+        self._acquired = 0
+        self._opened = 0
+        self._waited = 0
+        self._lock = threading.Lock()
+
+    def acquired(self, waited=False):
+        """Count a connection taken from the pool."""
+        with self._lock:
+            self._acquired += 1
+
+            if waited:
+                self._waited += 1
+
+    def opened(self):
+        """Count a new connection being opened."""
+        with self._lock:
+            self._opened += 1
+
+    def snapshot(self):
+        """Get the pool counters as a dict."""
+        with self._lock:
+            return {
+                CONST.STAT_CONNECTIONS_OPENED: self._opened,
+                CONST.STAT_CONNECTIONS_REUSED: max(
+                    0, self._acquired - self._opened),
+                CONST.STAT_CONNECTIONS_WAITED: self._waited
+            }
+
+
+class SkybellAdapter(HTTPAdapter):
+    """HTTP adapter with a sized, instrumented connection pool."""
+
+    def __init__(self, stats, pool_size=CONST.DEFAULT_POOL_SIZE,
+                 pool_block=False):
+        """Set up the adapter, stats must exist before the pool manager."""
+        self._stats = stats
+
+        super(SkybellAdapter, self).__init__(pool_connections=pool_size,
+                                             pool_maxsize=pool_size,
+                                             pool_block=pool_block)
+
+    def init_poolmanager(self, *args, **kwargs):
+        """Create the pool manager using the counting pools."""
+        super(SkybellAdapter, self).init_poolmanager(*args, **kwargs)
+
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': _counting_pool(HTTPConnectionPool, self._stats),
+            'https': _counting_pool(HTTPSConnectionPool, self._stats)
+        }
+
+
+def _counting_pool(base, stats):
+    """Create a connection pool class that reports to stats."""
+    class CountingConnection(base.ConnectionCls):
+        """Connection that counts every socket it opens."""
+
+        def connect(self):
+            """Open the socket, also after a dropped connection."""
+            stats.opened()
+
+            return super(CountingConnection, self).connect()
+
+    class CountingPool(base):
+        """Connection pool that counts opened and reused connections."""
+
+        ConnectionCls = CountingConnection
+
+        def _get_conn(self, timeout=None):
+            """Take a connection, noting if we had to wait for one."""
+            waited = bool(self.block and self.pool is not None and
+                          self.pool.empty())
+            stats.acquired(waited)
+
+            return super(CountingPool, self)._get_conn(timeout)
+
+    return CountingPool
@@ -0,0 +1,273 @@
+"""
+Push events from the Skybell cloud.
+
+The Skybell app registers itself with the "socketio" protocol and then
+receives activity events over a socket.io connection. SkybellPush speaks
+the engine.io long-polling transport with plain requests, hands pushed
+activities to their devices and falls back to polling while disconnected.
+"""
+import json
+import logging
+import re
+import threading
+import time
+
+import requests
+from requests.exceptions import RequestException
+
+from skybellpy.exceptions import SkybellException
+import skybellpy.helpers.constants as CONST
+import skybellpy.helpers.errors as ERROR
+
+_LOGGER = logging.getLogger(__name__)
+
+# engine.io packet types
+EIO_OPEN = '0'
+EIO_CLOSE = '1'
+EIO_PING = '2'
+EIO_PONG = '3'
+EIO_MESSAGE = '4'
+EIO_NOOP = '6'
+
+# socket.io packet types, carried inside engine.io messages
+SIO_CONNECT = '0'
+SIO_DISCONNECT = '1'
+SIO_EVENT = '2'
+
+_LENGTH_PREFIX = re.compile(r'^\d+:')
+
+
+class SkybellPush():
+    """Receive Skybell activities pushed over socket.io."""
+
+    def __init__(self, skybell, url=CONST.PUSH_URL,
+                 fallback_interval=CONST.DEFAULT_PUSH_FALLBACK_INTERVAL):
+        """Set up the push subsystem for a Skybell instance."""
+        self._skybell = skybell
+        self._url = url
+        self._fallback_interval = fallback_interval
+
+        # Long polls block, so they get their own connection pool
+        self._session = requests.session()
+        self._sid = None
+        self._ping_interval = CONST.DEFAULT_PUSH_PING_INTERVAL
+        self._ping_timeout = CONST.DEFAULT_PUSH_PING_TIMEOUT
+        self._last_ping = 0
+
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def connected(self):
+        """Get if the push connection is currently open."""
+        return self._sid is not None
+
+    def register(self):
+        """Register this app to receive socket.io pushes."""
+        response = self._skybell.send_request(
+            'post', CONST.REGISTER_URL,
+            json_data={
+                'appId': self._skybell.cache(CONST.APP_ID),
+                'protocol': CONST.PUSH_PROTOCOL,
+                CONST.TOKEN: self._skybell.cache(CONST.TOKEN)
+            })
+
+        _LOGGER.debug("Register Response: %s", response.text)
+
+        try:
+            response_object = json.loads(response.text)
+        except ValueError:
+            response_object = None
+
+        # Use the push host the cloud hands back, if it does
+        if isinstance(response_object, dict) and \
+                response_object.get(CONST.PUSH_URL_KEY):
+            self._url = response_object[CONST.PUSH_URL_KEY]
+
+    def start(self, register=True):
+        """Register and start receiving pushes in a background thread."""
+        if self._thread is not None:
+            return
+
+        if register:
+            try:
+                self.register()
+            except SkybellException as exc:
+                _LOGGER.warning("Push registration failed: %s", exc)
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run,
+                                        name='skybellpy-push',
+                                        daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Close the push connection and stop the background thread."""
+        self._stop.set()
+
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+        self._sid = None
+
+    def _run(self):
+        """Stay connected, polling the devices whenever we can't."""
+        while not self._stop.is_set():
+            try:
+                self._connect()
+
+                while not self._stop.is_set():
+                    self._poll()
+            except (RequestException, SkybellException, ValueError) as exc:
+                _LOGGER.warning("Push connection lost: %s", exc)
+
+            self._sid = None
+
+            if self._stop.is_set():
+                break
+
+            self._fallback_poll()
+            self._stop.wait(self._fallback_interval)
+
+    def _connect(self):
+        """Open an engine.io session and wait for the socket.io connect."""
+        for packet in self._request('get'):
+            if packet[:1] == EIO_OPEN:
+                self._open(json.loads(packet[1:]))
+            else:
+                self._handle_packet(packet)
+
+        if self._sid is None:
+            raise SkybellException(ERROR.PUSH_FAILED, "No handshake")
+
+        _LOGGER.info("Push connected to %s", self._url)
+
+    def _open(self, handshake):
+        """Start the engine.io session described by a handshake."""
+        try:
+            sid = handshake['sid']
+            ping_interval = handshake.get(
+                'pingInterval', self._ping_interval * 1000) / 1000
+            ping_timeout = handshake.get(
+                'pingTimeout', self._ping_timeout * 1000) / 1000
+        except (AttributeError, KeyError, TypeError):
+            raise SkybellException(ERROR.PUSH_FAILED, "Invalid handshake")
+
+        if not sid or not isinstance(sid, str):
+            raise SkybellException(ERROR.PUSH_FAILED, "Invalid handshake")
+
+        self._sid = sid
+        self._ping_interval = ping_interval
+        self._ping_timeout = ping_timeout
+        self._last_ping = time.monotonic()
+
+    def _poll(self):
+        """Wait for the next batch of packets and handle them."""
+        if time.monotonic() - self._last_ping >= self._ping_interval:
+            self._request('post', [EIO_PING])
+            self._last_ping = time.monotonic()
+
+        for packet in self._request('get'):
+            self._handle_packet(packet)
+
+    def _request(self, method, packets=None):
+        """Send an engine.io polling request and decode the response."""
+        params = {'EIO': '3', 'transport': 'polling', 'b64': '1',
+                  'appId': self._skybell.cache(CONST.APP_ID),
+                  CONST.TOKEN: self._skybell.cache(CONST.TOKEN)}
+
+        if self._sid is not None:
+            params['sid'] = self._sid
+
+        # pylint: disable=protected-access
+        headers = self._skybell._request_headers()
+        headers['content-type'] = 'text/plain;charset=UTF-8'
+
+        response = getattr(self._session, method)(
+            self._url.rstrip('/') + CONST.PUSH_PATH, params=params,
+            headers=headers, data=_encode_payload(packets or []),
+            timeout=self._ping_interval + self._ping_timeout)
+
+        if response.status_code >= 400:
+            raise SkybellException(ERROR.PUSH_FAILED, response.status_code)
+
+        if method != 'get':
+            return []
+
+        return _decode_payload(response.text)
+
+    def _handle_packet(self, packet):
+        """Handle a single engine.io packet."""
+        packet_type = packet[:1]
+
+        if packet_type == EIO_CLOSE:
+            raise SkybellException(ERROR.PUSH_FAILED, "Closed by server")
+
+        if packet_type == EIO_PING:
+            self._request('post', [EIO_PONG + packet[1:]])
+            return
+
+        if packet_type != EIO_MESSAGE:
+            return
+
+        sio_type = packet[1:2]
+
+        if sio_type == SIO_DISCONNECT:
+            raise SkybellException(ERROR.PUSH_FAILED, "Disconnected")
+
+        if sio_type == SIO_EVENT:
+            # Strip any namespace or ack id ahead of the json array
+            message = json.loads(packet[packet.index('['):])
+
+            if message:
+                self._dispatch(message[0], message[1:])
+
+    def _dispatch(self, name, args):
+        """Hand pushed activities to their devices."""
+        _LOGGER.debug("Push event %s: %s", name, args)
+
+        for activity in args:
+            if not isinstance(activity, dict) or \
+                    CONST.EVENT not in activity:
+                continue
+
+            device = self._skybell.get_device(
+                activity.get(CONST.ACTIVITY_DEVICE))
+
+            if device:
+                device.add_activity(activity)
+
+    def _fallback_poll(self):
+        """Refresh every device while the push connection is down."""
+        try:
+            devices = self._skybell.get_devices()
+        except (SkybellException, ValueError) as exc:
+            _LOGGER.warning("Fallback poll failed: %s", exc)
+            return
+
+        for device in devices:
+            try:
+                device.refresh()
+            except (SkybellException, ValueError) as exc:
+                _LOGGER.warning("Fallback poll failed: %s", exc)
+
+
+def _encode_payload(packets):
+    """Encode packets as an engine.io v3 text payload."""
+    return ''.join('{}:{}'.format(len(packet), packet) for packet in packets)
+
+
+def _decode_payload(payload):
+    """Decode an engine.io v3 or v4 text payload into packets."""
+    if not _LENGTH_PREFIX.match(payload):
+        return [packet for packet in payload.split('\x1e') if packet]
+
+    packets = []
+
+    while payload:
+        length, _, payload = payload.partition(':')
+        packets.append(payload[:int(length)])
+        payload = payload[int(length):]
+
+    return packets
@@ -0,0 +1,100 @@
+"""
+Desired state reconciliation used by SkybellPy.
+
+A desired state document declares settings for every device, for groups
+of devices and for single devices, later sections overriding earlier ones:
+
+    {
+        'default': {setting: value},
+        'groups': {
+            name: {'devices': [device_id], 'settings': {setting: value}}
+        },
+        'devices': {device_id: {setting: value}}
+    }
+
+Reconciling compares the resolved settings with the known settings of
+each device and only sends the settings that differ.
+"""
+from skybellpy.exceptions import SkybellException
+import skybellpy.helpers.constants as CONST
+import skybellpy.helpers.errors as ERROR
+
+
+class ReconcileReport():
+    """Outcome of reconciling devices with a desired state."""
+
+    def __init__(self, plan, dry_run=False):
+        """Set up the report for a plan of settings per device id."""
+        self.plan = plan
+        self.dry_run = dry_run
+        self.applied = {}
+        self.failed = {}
+        self.attempts = {}
+
+    @property
+    def unchanged(self):
+        """Get the devices already in the desired state."""
+        return sorted(device_id for device_id, settings in self.plan.items()
+                      if not settings)
+
+    @property
+    def pending(self):
+        """Get the devices with changes that weren't applied or failed."""
+        return sorted(device_id for device_id, settings in self.plan.items()
+                      if settings and device_id not in self.applied and
+                      device_id not in self.failed)
+
+    @property
+    def ok(self):
+        """Get if no device failed to reach the desired state."""
+        return not self.failed
+
+    def as_dict(self):
+        """Get the report as a dict, failures as their message."""
+        return {
+            'dry_run': self.dry_run,
+            'plan': self.plan,
+            'applied': self.applied,
+            'unchanged': self.unchanged,
+            'pending': self.pending,
+            'failed': {device_id: str(exc)
+                       for device_id, exc in self.failed.items()},
+            'attempts': self.attempts
+        }
+
+    def __repr__(self):
+        """Get a summary of the report."""
+        return ('<ReconcileReport dry_run={} applied={} unchanged={} '
+                'pending={} failed={}>').format(
+                    self.dry_run, len(self.applied), len(self.unchanged),
+                    len(self.pending), len(self.failed))
+
+
+def desired_settings(document, device_ids):
+    """Resolve a desired state document into settings per device id.
+
+    Raises a SkybellException for devices that aren't in device_ids.
+    """
+    device_ids = list(device_ids)
+    desired = {}
+
+    def _merge(device_id, settings):
+        """Merge settings into the desired settings of a device."""
+        if device_id not in device_ids:
+            raise SkybellException(ERROR.UNKNOWN_DEVICE, device_id)
+
+        desired.setdefault(device_id, {}).update(settings)
+
+    if document.get(CONST.RECONCILE_DEFAULT):
+        for device_id in device_ids:
+            _merge(device_id, document[CONST.RECONCILE_DEFAULT])
+
+    for group in (document.get(CONST.RECONCILE_GROUPS) or {}).values():
+        for device_id in group.get(CONST.RECONCILE_DEVICES, []):
+            _merge(device_id, group.get(CONST.RECONCILE_SETTINGS, {}))
+
+    for device_id, settings in (
+            document.get(CONST.RECONCILE_DEVICES) or {}).items():
+        _merge(device_id, settings)
+
+    return desired
@@ -0,0 +1,111 @@
+"""
+Retry policy used by SkybellPy.
+
+Backs off exponentially on throttled or failing requests, honoring any
+Retry-After the server sends, and trips a circuit breaker per endpoint
+family so an API that is down isn't hammered by every device and caller.
+"""
+import random
+import re
+import threading
+import time
+
+import skybellpy.helpers.constants as CONST
+import skybellpy.helpers.errors as ERROR
+
+# Device and subscription ids are dropped so all devices share a family
+_ID_SEGMENT = re.compile(r'/(devices|subscriptions)/[^/?]+')
+
+
+class CircuitBreaker():
+    """Pause requests to an endpoint family after repeated failures."""
+
+    def __init__(self, threshold=CONST.DEFAULT_BREAKER_THRESHOLD,
+                 cooldown=CONST.DEFAULT_BREAKER_COOLDOWN):
+        """Set up the circuit breaker."""
+        self._threshold = threshold
+        self._cooldown = cooldown
+        self._failures = 0
+        self._open_until = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self):
+        """Get if requests are currently paused."""
+        with self._lock:
+            return self._open_until is not None and \
+                time.monotonic() < self._open_until
+
+    def allow(self):
+        """Get if a request may be sent, letting one trial through."""
+        with self._lock:
+            if self._open_until is None:
+                return True
+
+            if time.monotonic() < self._open_until or self._trial:
+                return False
+
+            # Cooldown is over, probe with a single request
+            self._trial = True
+            return True
+
+    def success(self):
+        """Close the breaker after a successful request."""
+        with self._lock:
+            self._failures = 0
+            self._open_until = None
+            self._trial = False
+
+    def failure(self, retry_after=None):
+        """Count a failed request, opening the breaker if needed."""
+        with self._lock:
+            self._failures += 1
+            self._trial = False
+
+            pause = None
+
+            if self._failures >= self._threshold:
+                pause = self._cooldown
+
+            # The server told us when to come back
+            if retry_after is not None:
+                pause = max(pause or 0, retry_after)
+
+            if pause is not None:
+                self._open_until = time.monotonic() + pause
+
+
+def backoff_delay(attempt, base=CONST.DEFAULT_BACKOFF_BASE,
+                  cap=CONST.DEFAULT_BACKOFF_MAX, retry_after=None):
+    """Get how long to wait before a retry, None to give up."""
+    if retry_after is not None:
+        return retry_after if retry_after <= cap else None
+
+    # Full jitter keeps many clients from retrying in lockstep
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+def endpoint_family(url):
+    """Get the endpoint family a request url belongs to."""
+    return _ID_SEGMENT.sub(r'/\1', url.split('?')[0])
+
+
+def is_transient(exc):
+    """Get if a failed request may succeed when it is tried again later."""
+    errcode = getattr(exc, 'errcode', None)
+
+    if errcode in (ERROR.CIRCUIT_OPEN[0], ERROR.DEADLINE_EXCEEDED[0]):
+        return True
+
+    # Requests that failed with a status the server won't change its mind on
+    if errcode == ERROR.REQUEST[0]:
+        return not isinstance(exc.details, int) or is_retryable(exc.details)
+
+    return False
+
+
+def is_retryable(status):
+    """Get if a failed request with this status may be retried."""
+    return status is None or status == CONST.HTTP_TOO_MANY_REQUESTS or \
+        status >= CONST.HTTP_SERVER_ERROR
@@ -0,0 +1,170 @@
+"""
+Polling scheduler used by SkybellPy.
+
+Spreads device refreshes across the polling interval with jitter, polls
+recently active devices faster and idle or offline ones slower, and keeps
+every request within a global requests-per-second budget.
+"""
+import asyncio
+import heapq
+import logging
+import random
+import threading
+import time
+
+from skybellpy.exceptions import SkybellException
+import skybellpy.helpers.constants as CONST
+import skybellpy.utils as UTILS
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class RateLimiter():
+    """Token bucket limiting how many requests start per second."""
+
+    def __init__(self, rate, burst=1):
+        """Set up the rate limiter."""
+        self._rate = float(rate)
+        self._burst = max(1, burst)
+        self._tokens = float(self._burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a request may be sent."""
+        wait = self._take()
+
+        while wait:
+            time.sleep(wait)
+            wait = self._take()
+
+    async def acquire_async(self):
+        """Wait without blocking the event loop until a request may be sent."""
+        wait = self._take()
+
+        while wait:
+            await asyncio.sleep(wait)
+            wait = self._take()
+
+    def _take(self):
+        """Take a token, returning how long to wait if there isn't one."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self._burst,
+                self._tokens + (now - self._updated) * self._rate)
+            self._updated = now
+
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0
+
+            return (1 - self._tokens) / self._rate
+
+
+class SkybellScheduler():
+    """Refresh every device on its own adaptive, jittered schedule."""
+
+    def __init__(self, skybell, interval=CONST.DEFAULT_POLL_INTERVAL,
+                 active_interval=CONST.DEFAULT_POLL_ACTIVE_INTERVAL,
+                 idle_interval=CONST.DEFAULT_POLL_IDLE_INTERVAL,
+                 down_interval=CONST.DEFAULT_POLL_DOWN_INTERVAL,
+                 active_window=CONST.DEFAULT_POLL_ACTIVE_WINDOW,
+                 idle_window=CONST.DEFAULT_POLL_IDLE_WINDOW,
+                 jitter=CONST.DEFAULT_POLL_JITTER):
+        """Set up the scheduler for a Skybell instance."""
+        self._skybell = skybell
+        self._interval = interval
+        self._active_interval = active_interval
+        self._idle_interval = idle_interval
+        self._down_interval = down_interval
+        self._active_window = active_window
+        self._idle_window = idle_window
+        self._jitter = jitter
+
+        self._queue = []
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Spread the first refreshes and start polling in the background."""
+        if self._thread is not None:
+            return
+
+        devices = self._skybell.get_devices()
+        now = time.monotonic()
+
+        # Offset each device evenly across one interval to avoid bursts
+        self._queue = []
+        for index, device in enumerate(devices):
+            offset = self._interval * index / len(devices)
+            heapq.heappush(self._queue,
+                           (now + self._jittered(offset), device.device_id))
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run,
+                                        name='skybellpy-scheduler',
+                                        daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop polling."""
+        self._stop.set()
+
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def interval_for(self, device, now=None):
+        """Get how long to wait before refreshing a device again."""
+        if not device.is_up:
+            return self._down_interval
+
+        if now is None:
+            now = time.time()
+
+        last_event = None
+        for event in (CONST.EVENT_MOTION, CONST.EVENT_BUTTON):
+            activity = device.latest(event)
+            created_at = UTILS.parse_timestamp(
+                activity.get(CONST.CREATED_AT) if activity else None)
+
+            if created_at is not None:
+                last_event = max(last_event or created_at, created_at)
+
+        if last_event is not None and now - last_event <= self._active_window:
+            return self._active_interval
+
+        if last_event is None or now - last_event > self._idle_window:
+            return self._idle_interval
+
+        return self._interval
+
+    def _jittered(self, delay):
+        """Add up to +/- jitter of the base interval to a delay."""
+        spread = self._interval * self._jitter
+        return max(0, delay + random.uniform(-spread, spread))
+
+    def _run(self):
+        """Refresh devices as they become due."""
+        while self._queue and not self._stop.is_set():
+            due, device_id = self._queue[0]
+
+            if self._stop.wait(max(0, due - time.monotonic())):
+                break
+
+            heapq.heappop(self._queue)
+
+            device = self._skybell.get_device(device_id)
+            if device is None:
+                continue
+
+            try:
+                device.refresh()
+            except SkybellException as exc:
+                _LOGGER.warning("Scheduled refresh of %s failed: %s",
+                                device_id, exc)
+
+            heapq.heappush(self._queue, (
+                time.monotonic() + self._jittered(self.interval_for(device)),
+                device_id))
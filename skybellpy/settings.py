@@ -0,0 +1,171 @@
+"""
+Device setting schema used by SkybellPy.
+
+Every setting key maps to a schema of its value type, allowed values and
+wire encoding. The validators are built once at import time, so checking
+a setting is a dict lookup and a single test rather than a comparison
+against every known setting. Setters, bulk writes, the reconciler and the
+command line all validate through this registry.
+"""
+from skybellpy.exceptions import SkybellException
+import skybellpy.helpers.constants as CONST
+import skybellpy.helpers.errors as ERROR
+
+
+class SettingSchema():
+    """Value type, allowed values and wire encoding of a device setting."""
+
+    __slots__ = ('key', 'type', 'choices', 'bounds', 'encode', 'validate')
+
+    # pylint: disable=too-many-arguments
+    def __init__(self, key, value_type, choices=None, bounds=None,
+                 type_error=None, encode=None):
+        """Set up the schema, values must be in choices or within bounds.
+
+        Values that aren't a value_type fail with type_error when one is
+        given. encode turns a value into what the api expects.
+        """
+        self.key = key
+        self.type = value_type
+        self.choices = None if choices is None else frozenset(choices)
+        self.bounds = None if bounds is None else tuple(bounds)
+        self.encode = encode or _identity
+
+        if self.choices is not None:
+            self.validate = _choice_validator(key, self.choices)
+        else:
+            self.validate = _range_validator(key, self.bounds, value_type,
+                                             type_error)
+
+    def parse(self, text):
+        """Get the encoded value of a setting given as text."""
+        try:
+            value = self.encode(self.type(text))
+        except ValueError:
+            raise SkybellException(ERROR.INVALID_SETTING_VALUE,
+                                   (self.key, text))
+
+        self.validate(value)
+
+        return value
+
+    def __repr__(self):
+        """Get the setting key and type of the schema."""
+        return '<SettingSchema {} {}>'.format(self.key, self.type.__name__)
+
+
+def _identity(value):
+    """Get a value as is."""
+    return value
+
+
+def _lower(value):
+    """Get a value as a lower case string, True becomes 'true'."""
+    return str(value).lower()
+
+
+def _choice_validator(key, choices):
+    """Build a validator accepting only the given choices."""
+    def _validate(value):
+        """Raise a SkybellException unless value is one of the choices."""
+        try:
+            valid = value in choices
+        except TypeError:
+            valid = False
+
+        if not valid:
+            raise SkybellException(ERROR.INVALID_SETTING_VALUE, (key, value))
+
+    return _validate
+
+
+def _range_validator(key, bounds, value_type, type_error):
+    """Build a validator accepting values within inclusive bounds."""
+    low, high = bounds
+
+    def _validate(value):
+        """Raise a SkybellException unless value is within the bounds."""
+        if type_error is not None and not isinstance(value, value_type):
+            raise SkybellException(type_error, value)
+
+        try:
+            valid = low <= value <= high
+        except TypeError:
+            valid = False
+
+        if not valid:
+            raise SkybellException(ERROR.INVALID_SETTING_VALUE, (key, value))
+
+    return _validate
+
+
+def _build_schema():
+    """Build the schema of every device setting."""
+    schemas = [
+        SettingSchema(CONST.SETTINGS_DO_NOT_DISTURB, str,
+                      choices=CONST.SETTINGS_DO_NOT_DISTURB_VALUES,
+                      encode=_lower),
+        SettingSchema(CONST.SETTINGS_OUTDOOR_CHIME, int,
+                      choices=CONST.SETTINGS_OUTDOOR_CHIME_VALUES),
+        SettingSchema(CONST.SETTINGS_MOTION_POLICY, str,
+                      choices=CONST.SETTINGS_MOTION_POLICY_VALUES),
+        SettingSchema(CONST.SETTINGS_MOTION_THRESHOLD, int,
+                      choices=CONST.SETTINGS_MOTION_THRESHOLD_VALUES),
+        SettingSchema(CONST.SETTINGS_VIDEO_PROFILE, int,
+                      choices=CONST.SETTINGS_VIDEO_PROFILE_VALUES),
+        SettingSchema(CONST.SETTINGS_LED_INTENSITY, int,
+                      bounds=CONST.SETTINGS_LED_INTENSITY_VALUES,
+                      type_error=ERROR.COLOR_INTENSITY_NOT_VALID)
+    ]
+
+    schemas.extend(SettingSchema(key, int, bounds=CONST.SETTINGS_LED_VALUES)
+                   for key in CONST.SETTINGS_LED_COLOR)
+
+    return {schema.key: schema for schema in schemas}
+
+
+SCHEMA = _build_schema()
+
+# Validators by setting key, the hot path of every settings write
+_VALIDATORS = {key: schema.validate for key, schema in SCHEMA.items()}
+
+
+def get_schema(setting):
+    """Get the schema of a setting, raising for unknown settings."""
+    try:
+        return SCHEMA[setting]
+    except KeyError:
+        raise SkybellException(ERROR.INVALID_SETTING, setting)
+
+
+def validate_setting(setting, value):
+    """Validate the setting and value."""
+    try:
+        validate = _VALIDATORS[setting]
+    except (KeyError, TypeError):
+        raise SkybellException(ERROR.INVALID_SETTING, setting)
+
+    validate(value)
+
+
+def validate_settings(settings):
+    """Validate every setting and value."""
+    for setting, value in settings.items():
+        validate_setting(setting, value)
+
+
+def encode_setting(setting, value):
+    """Get a setting value as the api expects it."""
+    return get_schema(setting).encode(value)
+
+
+def parse_setting(text):
+    """Parse 'setting=value' text into a validated (setting, value)."""
+    setting, sep, value = text.partition('=')
+
+    if not sep:
+        raise SkybellException(ERROR.INVALID_SETTING, text)
+
+    setting = setting.strip()
+
+    return setting, get_schema(setting).parse(value.strip())
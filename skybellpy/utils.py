@@ -1,9 +1,18 @@
 """Skybellpy utility methods."""
+import calendar
+import datetime
+import email.utils
 import pickle
 import random
+import re
 import string
+import time
 import uuid
 
+_TIMESTAMP = re.compile(
+    r'^(\d{4}-\d{2}-\d{2})[T ](\d{2}:\d{2}:\d{2})(\.\d+)?'
+    r'(Z|[+-]\d{2}:?\d{2})?$')
+
 
 def save_cache(data, filename):
     """Save cookies to a file."""
@@ -38,3 +47,61 @@ def update(dct, dct_merge):
         else:
             dct[key] = value
     return dct
+
+
+def parse_timestamp(value):
+    """Parse an ISO 8601 timestamp into epoch seconds, None if invalid."""
+    match = _TIMESTAMP.match(value or '') if isinstance(value, str) else None
+
+    if not match:
+        return None
+
+    date, clock, fraction, offset = match.groups()
+
+    try:
+        seconds = calendar.timegm(datetime.datetime.strptime(
+            date + 'T' + clock, '%Y-%m-%dT%H:%M:%S').timetuple())
+    except ValueError:
+        return None
+
+    if fraction:
+        seconds += float(fraction)
+
+    if offset and offset != 'Z':
+        sign = -1 if offset[0] == '-' else 1
+        offset = offset[1:].replace(':', '')
+        seconds -= sign * (int(offset[:2]) * 3600 + int(offset[2:]) * 60)
+
+    return seconds
+
+
+def to_epoch(value):
+    """Get epoch seconds from epoch seconds or an ISO 8601 timestamp."""
+    if isinstance(value, str):
+        return parse_timestamp(value) or 0
+
+    return value
+
+
+def parse_retry_after(value, now=None):
+    """Parse a Retry-After header into seconds to wait, None if invalid."""
+    if not isinstance(value, str) or not value.strip():
+        return None
+
+    value = value.strip()
+
+    if value.isdigit():
+        return int(value)
+
+    try:
+        parsed = email.utils.parsedate_tz(value)
+    except (TypeError, ValueError):
+        return None
+
+    if parsed is None:
+        return None
+
+    if now is None:
+        now = time.time()
+
+    return max(0, email.utils.mktime_tz(parsed) - now)
@@ -0,0 +1,60 @@
+"""Local keep-alive stand-in for the Skybell cloud API."""
+import threading
+import time
+
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    """HTTP server handling each connection in its own thread."""
+
+    daemon_threads = True
+
+
+class _ApiHandler(BaseHTTPRequestHandler):
+    """Answer every GET with an empty json list."""
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        """Return an empty list, after the configured delay."""
+        time.sleep(self.server.delay)
+
+        body = b'[]'
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        """Keep the test output quiet."""
+
+
+class ApiServer():
+    """HTTP/1.1 server that keeps connections alive."""
+
+    def __init__(self, delay=0):
+        """Set up the api server on a free local port."""
+        self._server = _ThreadingHTTPServer(('127.0.0.1', 0), _ApiHandler)
+        self._server.delay = delay
+        self._thread = None
+
+    @property
+    def url(self):
+        """Get the url of the api server."""
+        return 'http://127.0.0.1:{}/'.format(self._server.server_port)
+
+    def start(self):
+        """Start serving in a background thread."""
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop serving and close the socket."""
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
@@ -0,0 +1,103 @@
+"""Local stand-in for the Skybell socket.io push server."""
+import json
+import queue
+import threading
+
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from urllib.parse import parse_qs, urlparse
+
+SID = 'pushsid123'
+
+HANDSHAKE = json.dumps({
+    'sid': SID,
+    'upgrades': [],
+    'pingInterval': 25000,
+    'pingTimeout': 5000
+})
+
+
+def _encode(packets):
+    """Encode packets as an engine.io v3 text payload."""
+    return ''.join('{}:{}'.format(len(packet), packet) for packet in packets)
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    """HTTP server handling each long poll in its own thread."""
+
+    daemon_threads = True
+
+
+class _PushHandler(BaseHTTPRequestHandler):
+    """Answer engine.io polling requests."""
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        """Handshake or return the queued packets."""
+        params = parse_qs(urlparse(self.path).query)
+
+        if 'sid' not in params:
+            packets = ['0' + HANDSHAKE, '40']
+        else:
+            try:
+                packets = [self.server.packets.get(timeout=0.1)]
+            except queue.Empty:
+                packets = ['6']
+
+        self._respond(_encode(packets))
+
+    def do_POST(self):  # pylint: disable=invalid-name
+        """Record packets sent by the client."""
+        length = int(self.headers.get('Content-Length', 0))
+        self.server.posts.append(self.rfile.read(length).decode())
+
+        self._respond('ok')
+
+    def _respond(self, body):
+        """Send a plain text response."""
+        body = body.encode()
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; charset=UTF-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        """Keep the test output quiet."""
+
+
+class PushServer():
+    """Engine.io long-polling server pushing socket.io events."""
+
+    def __init__(self):
+        """Set up the push server on a free local port."""
+        self._server = _ThreadingHTTPServer(('127.0.0.1', 0), _PushHandler)
+        self._server.packets = queue.Queue()
+        self._server.posts = []
+        self._thread = None
+
+    @property
+    def url(self):
+        """Get the url of the push server."""
+        return 'http://127.0.0.1:{}/'.format(self._server.server_port)
+
+    @property
+    def posts(self):
+        """Get the payloads posted by the client."""
+        return self._server.posts
+
+    def start(self):
+        """Start serving in a background thread."""
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop serving and close the socket."""
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+
+    def push_event(self, name, data):
+        """Queue a socket.io event for the client."""
+        self._server.packets.put('42' + json.dumps([name, data]))
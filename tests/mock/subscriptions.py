@@ -0,0 +1,23 @@
+"""Mock Skybell Subscriptions Response."""
+
+from tests.mock import USERID
+import tests.mock.device as DEVICE
+
+
+def get_response_ok(device=None, user_id=USERID, sub_id='subid123abc'):
+    """Return a single subscription response json."""
+    if device is None:
+        device = DEVICE.get_response_ok(user_id=user_id)
+
+    return '''
+    {
+        "user": "''' + user_id + '''",
+        "owner": {
+            "firstName": "John",
+            "lastName": "Doe",
+            "id": "''' + user_id + '''"
+        },
+        "device": ''' + device + ''',
+        "id": "''' + sub_id + '''",
+        "acl": "owner"
+    }'''
@@ -0,0 +1,160 @@
+"""
+Test the Skybell activity records and store.
+
+Tests parsing activity records, the time range and event queries and the
+retention limits.
+"""
+import datetime
+import json
+import pickle
+import time
+import unittest
+
+from skybellpy.activities import Activity, ActivityStore
+import skybellpy.helpers.constants as CONST
+
+import tests.mock.device_activities as DEVICE_ACTIVITIES
+
+
+def _activity(activity_id, created_at, event=CONST.EVENT_MOTION):
+    """Return an activity created at the given epoch seconds."""
+    return {
+        CONST.ID: activity_id,
+        CONST.EVENT: event,
+        CONST.CREATED_AT: time.strftime('%Y-%m-%dT%H:%M:%SZ',
+                                        time.gmtime(created_at))
+    }
+
+
+class TestActivityStore(unittest.TestCase):
+    """Test the activity records and store used by skybellpy."""
+
+    def tests_records(self):
+        """Check that activity json is parsed once into a record."""
+        activity_json = json.loads(DEVICE_ACTIVITIES.get_response_ok(
+            event=CONST.EVENT_BUTTON,
+            created_at=datetime.datetime(2018, 1, 1, 0, 0, 0)))
+
+        activity = Activity.from_json(activity_json)
+        self.assertEqual(activity.id, 'activityId')
+        self.assertEqual(activity.event, CONST.EVENT_BUTTON)
+        self.assertEqual(activity.created_at, 1514764800)
+        self.assertEqual(activity.video_state, CONST.VIDEO_STATE_READY)
+
+        # Readable and comparable like the json it came from
+        self.assertEqual(activity[CONST.CREATED_AT], '2018-01-01T00:00:00Z')
+        self.assertEqual(activity.get(CONST.MEDIA_URL),
+                         activity_json[CONST.MEDIA_URL])
+        self.assertIsNone(activity.get('callId'))
+        self.assertEqual(activity, activity_json)
+        self.assertEqual(pickle.loads(pickle.dumps(activity)), activity)
+        self.assertIs(Activity.from_json(activity), activity)
+
+        # The full json is only kept when asked for
+        activity = Activity.from_json(activity_json, keep_json=True)
+        self.assertEqual(activity.get('callId'), activity_json['callId'])
+        self.assertEqual(activity.json, activity_json)
+
+        # Times compare as instants, not as strings
+        earlier = Activity.from_json({
+            CONST.CREATED_AT: '2018-01-01T01:00:00.500+02:00'})
+        later = Activity.from_json({CONST.CREATED_AT: '2018-01-01T00:00:00Z'})
+        self.assertLess(earlier.created_at, later.created_at)
+        self.assertEqual(earlier[CONST.CREATED_AT],
+                         '2017-12-31T23:00:00.500Z')
+
+        # Dates that don't exist are unknown instead of an error
+        for created_at in ('2020-02-30T00:00:00Z', '2020-13-01T00:00:00Z',
+                           '2020-01-01T25:00:00Z'):
+            self.assertIsNone(Activity.from_json(
+                {CONST.CREATED_AT: created_at}).created_at)
+
+    def tests_queries(self):
+        """Check event and time range queries, newest first."""
+        store = ActivityStore()
+
+        # Out of order, as pushed and polled activities can be
+        store.add([_activity('b', 2000, CONST.EVENT_BUTTON),
+                   _activity('c', 3000),
+                   _activity('a', 1000)])
+        store.add([_activity('d', 4000, CONST.EVENT_BUTTON)])
+
+        ids = [activity[CONST.ID] for activity in store.query()]
+        self.assertEqual(ids, ['d', 'c', 'b', 'a'])
+
+        ids = [activity[CONST.ID]
+               for activity in store.query(event=CONST.EVENT_BUTTON)]
+        self.assertEqual(ids, ['d', 'b'])
+
+        # Both ends are inclusive and accept ISO timestamps
+        ids = [activity[CONST.ID] for activity in store.query(
+            since=2000, until=_activity('x', 3000)[CONST.CREATED_AT])]
+        self.assertEqual(ids, ['c', 'b'])
+
+        ids = [activity[CONST.ID] for activity in store.query(limit=2)]
+        self.assertEqual(ids, ['d', 'c'])
+
+        self.assertEqual(store.query(event=CONST.EVENT_ON_DEMAND), [])
+        self.assertEqual(store.latest()[CONST.ID], 'd')
+        self.assertEqual(store.latest(CONST.EVENT_MOTION)[CONST.ID], 'c')
+        self.assertIsNone(store.latest(CONST.EVENT_ON_DEMAND))
+
+        store.replace([_activity('e', 5000)])
+        self.assertEqual(len(store), 1)
+        self.assertIsNone(store.latest(CONST.EVENT_BUTTON))
+
+    def tests_retention(self):
+        """Check that the oldest activities are evicted past the limits."""
+        store = ActivityStore(max_count=3)
+        store.add([_activity(str(index), index * 1000,
+                             CONST.EVENT_BUTTON if index % 2 else
+                             CONST.EVENT_MOTION)
+                   for index in range(1, 6)])
+
+        self.assertEqual(len(store), 3)
+        self.assertEqual([activity[CONST.ID] for activity in store.query()],
+                         ['5', '4', '3'])
+        self.assertEqual([activity[CONST.ID] for activity in
+                          store.query(event=CONST.EVENT_BUTTON)],
+                         ['5', '3'])
+
+        now = time.time()
+        store = ActivityStore(max_count=None, max_age=3600)
+        store.add([_activity('old', now - 7200),
+                   _activity('new', now - 60)])
+
+        self.assertEqual([activity[CONST.ID] for activity in store.query()],
+                         ['new'])
+        self.assertEqual(store.latest(CONST.EVENT_MOTION)[CONST.ID], 'new')
+
+    def tests_update(self):
+        """Check that stored activities are replaced by fresh records."""
+        store = ActivityStore()
+        store.add([_activity('1', 1000), _activity('2', 2000),
+                   {CONST.ID: '3', CONST.CREATED_AT: '1970-01-01T01:00:00Z'}])
+
+        # Activities without an event type are only indexed once
+        self.assertEqual(len(store), 3)
+        self.assertEqual([activity[CONST.ID] for activity in store.query()],
+                         ['3', '2', '1'])
+        self.assertEqual(len(store.query(event=None)), 3)
+
+        ready = dict(_activity('1', 1000),
+                     **{CONST.VIDEO_STATE: CONST.VIDEO_STATE_READY})
+        moved = _activity('2', 2000, CONST.EVENT_BUTTON)
+
+        self.assertEqual(store.update([ready, moved,
+                                       _activity('4', 4000)]), 2)
+        self.assertEqual(len(store), 3)
+        self.assertEqual(store.query(event=CONST.EVENT_MOTION)[0].video_state,
+                         CONST.VIDEO_STATE_READY)
+        self.assertEqual(store.latest(CONST.EVENT_BUTTON)[CONST.ID], '2')
+        self.assertEqual([activity[CONST.ID] for activity in store.query()],
+                         ['3', '2', '1'])
+
+        store = ActivityStore(max_count=1)
+        store.add([{CONST.ID: '1', CONST.CREATED_AT: 1},
+                   {CONST.ID: '2', CONST.CREATED_AT: 2}])
+
+        self.assertEqual([activity[CONST.ID] for activity in store.query()],
+                         ['2'])
@@ -0,0 +1,397 @@
+"""
+Test the asyncio Skybell client.
+
+Tests that AsyncSkybell and AsyncSkybellDevice mirror the blocking API.
+"""
+import asyncio
+import json
+import time
+import unittest
+
+from aioresponses import CallbackResult, aioresponses
+
+from skybellpy.aio import AsyncSkybell
+from skybellpy.auth import TokenManager
+from skybellpy.exceptions import SkybellException
+import skybellpy.helpers.constants as CONST
+import skybellpy.helpers.errors as ERROR
+
+import tests.mock as MOCK
+import tests.mock.login as LOGIN
+import tests.mock.device as DEVICE
+import tests.mock.device_avatar as DEVICE_AVATAR
+import tests.mock.device_info as DEVICE_INFO
+import tests.mock.device_settings as DEVICE_SETTINGS
+import tests.mock.device_activities as DEVICE_ACTIVITIES
+
+USERNAME = 'foobar'
+PASSWORD = 'deadbeef'
+
+
+def _device_url(url, dev_id=DEVICE.DEVID):
+    """Return a device specific url."""
+    return str.replace(url, '$DEVID$', dev_id)
+
+
+class TestAsyncSkybell(unittest.TestCase):
+    """Test the AsyncSkybell class in skybellpy."""
+
+    def setUp(self):
+        """Set up an event loop and AsyncSkybell module."""
+        self.loop = asyncio.new_event_loop()
+        self.skybell = AsyncSkybell(username=USERNAME,
+                                    password=PASSWORD,
+                                    disable_cache=True,
+                                    login_sleep=False)
+
+    def tearDown(self):
+        """Clean up after test."""
+        self.loop.run_until_complete(self.skybell.close())
+        self.loop.close()
+        self.skybell = None
+
+    def _run(self, coro):
+        """Run a coroutine to completion."""
+        return self.loop.run_until_complete(coro)
+
+    def _mock_device(self, mock, dev_id=DEVICE.DEVID, name='Front Door',
+                     repeat=True):
+        """Mock every endpoint of a single device."""
+        mock.get(_device_url(CONST.DEVICE_URL, dev_id),
+                 body=DEVICE.get_response_ok(name=name, dev_id=dev_id),
+                 repeat=repeat)
+        mock.get(_device_url(CONST.DEVICE_AVATAR_URL, dev_id),
+                 body=DEVICE_AVATAR.get_response_ok(dev_id), repeat=repeat)
+        mock.get(_device_url(CONST.DEVICE_INFO_URL, dev_id),
+                 body=DEVICE_INFO.get_response_ok(dev_id=dev_id),
+                 repeat=repeat)
+        mock.get(_device_url(CONST.DEVICE_SETTINGS_URL, dev_id),
+                 body=DEVICE_SETTINGS.get_response_ok(), repeat=repeat)
+        mock.get(_device_url(CONST.DEVICE_ACTIVITIES_URL, dev_id),
+                 body='[' + DEVICE_ACTIVITIES.get_response_ok(
+                     dev_id=dev_id) + ']',
+                 repeat=repeat)
+
+    def tests_login(self):
+        """Check that the async login stores the access token."""
+        with aioresponses() as mock:
+            mock.post(CONST.LOGIN_URL, body=LOGIN.post_response_ok())
+
+            self.assertTrue(self._run(self.skybell.login()))
+
+        self.assertEqual(self.skybell.cache(CONST.ACCESS_TOKEN),
+                         MOCK.ACCESS_TOKEN)
+
+        self._run(self.skybell.logout())
+        self.assertIsNone(self.skybell.cache(CONST.ACCESS_TOKEN))
+
+    def tests_get_devices(self):
+        """Check that all devices and endpoints are gathered."""
+        dev1 = DEVICE.get_response_ok(name='Dev1', dev_id='dev1')
+        dev2 = DEVICE.get_response_ok(name='Dev2', dev_id='dev2')
+
+        with aioresponses() as mock:
+            mock.post(CONST.LOGIN_URL, body=LOGIN.post_response_ok())
+            mock.get(CONST.DEVICES_URL, body='[' + dev1 + ',' + dev2 + ']',
+                     repeat=True)
+            self._mock_device(mock, 'dev1', 'Dev1')
+            self._mock_device(mock, 'dev2', 'Dev2')
+
+            devices = self._run(self.skybell.get_devices())
+            self.assertEqual(len(devices), 2)
+
+            device = self._run(self.skybell.get_device('dev1'))
+
+            # pylint: disable=W0212
+            self.assertEqual(device.name, 'Dev1')
+            self.assertEqual(device._info_json,
+                             json.loads(DEVICE_INFO.get_response_ok(
+                                 dev_id='dev1')))
+            self.assertEqual(device.motion_sensor, True)
+            self.assertEqual(len(device.activities()), 1)
+
+            # A refresh reuses the same device objects
+            self._run(self.skybell.get_devices(refresh=True))
+            self.assertIs(self._run(self.skybell.get_device('dev1')), device)
+
+    def tests_concurrency_limit(self):
+        """Check that no more than max_concurrency requests are in flight."""
+        skybell = AsyncSkybell(username=USERNAME,
+                               password=PASSWORD,
+                               disable_cache=True,
+                               login_sleep=False,
+                               max_concurrency=2)
+
+        state = {'active': 0, 'peak': 0}
+
+        async def _track(url, **kwargs):
+            """Count overlapping requests."""
+            state['active'] += 1
+            state['peak'] = max(state['peak'], state['active'])
+            await asyncio.sleep(0.01)
+            state['active'] -= 1
+
+        with aioresponses() as mock:
+            mock.post(CONST.LOGIN_URL, body=LOGIN.post_response_ok())
+            mock.get(CONST.DEVICES_URL,
+                     body='[' + DEVICE.get_response_ok() + ']')
+
+            for url in CONST.ENDPOINT_URLS.values():
+                mock.get(_device_url(url), body='[]', callback=_track)
+
+            self._run(skybell.get_devices())
+
+        self.assertEqual(state['peak'], 2)
+        self._run(skybell.close())
+
+    def tests_set_setting(self):
+        """Check that async setters PATCH the settings endpoint."""
+        settings_url = _device_url(CONST.DEVICE_SETTINGS_URL)
+
+        with aioresponses() as mock:
+            mock.post(CONST.LOGIN_URL, body=LOGIN.post_response_ok())
+            mock.get(CONST.DEVICES_URL,
+                     body='[' + DEVICE.get_response_ok() + ']')
+            self._mock_device(mock)
+            mock.patch(settings_url, body=DEVICE_SETTINGS.PATCH_RESPONSE_OK)
+
+            device = self._run(self.skybell.get_device(DEVICE.DEVID))
+
+            async def _set_threshold():
+                """Use the setter from inside the running loop."""
+                device.motion_threshold = CONST.SETTINGS_MOTION_THRESHOLD_LOW
+
+                # pylint: disable=W0212
+                await asyncio.gather(*device._setting_tasks)
+
+            self._run(_set_threshold())
+
+        self.assertEqual(device.motion_threshold,
+                         CONST.SETTINGS_MOTION_THRESHOLD_LOW)
+
+    def tests_apply_settings(self):
+        """Check that async settings are sent as one PATCH per device."""
+        settings_url = _device_url(CONST.DEVICE_SETTINGS_URL)
+        scene = {
+            CONST.SETTINGS_DO_NOT_DISTURB: 'true',
+            CONST.SETTINGS_LED_INTENSITY: 50
+        }
+
+        with aioresponses() as mock:
+            mock.post(CONST.LOGIN_URL, body=LOGIN.post_response_ok())
+            mock.get(CONST.DEVICES_URL,
+                     body='[' + DEVICE.get_response_ok() + ']')
+            self._mock_device(mock)
+            mock.patch(settings_url, body=DEVICE_SETTINGS.PATCH_RESPONSE_OK)
+
+            results, errors = self._run(
+                self.skybell.apply_settings({DEVICE.DEVID: scene}))
+
+            patches = [call for (method, _), call in mock.requests.items()
+                       if method.upper() == 'PATCH']
+
+        self.assertEqual(errors, {})
+        self.assertEqual(results, {DEVICE.DEVID: scene})
+        self.assertEqual(len(patches), 1)
+        self.assertEqual(patches[0][0].kwargs['json'], scene)
+
+        device = self._run(self.skybell.get_device(DEVICE.DEVID))
+        self.assertEqual(device.led_intensity, 50)
+
+    def tests_reconcile(self):
+        """Check that async reconciling only sends what differs."""
+        settings_url = _device_url(CONST.DEVICE_SETTINGS_URL)
+        desired = {
+            'default': {CONST.SETTINGS_LED_INTENSITY: 50},
+            'devices': {DEVICE.DEVID: {CONST.SETTINGS_DO_NOT_DISTURB: 'true'}}
+        }
+
+        with aioresponses() as mock:
+            mock.post(CONST.LOGIN_URL, body=LOGIN.post_response_ok())
+            mock.get(CONST.DEVICES_URL,
+                     body='[' + DEVICE.get_response_ok() + ']')
+            self._mock_device(mock)
+            mock.patch(settings_url, body=DEVICE_SETTINGS.PATCH_RESPONSE_OK)
+
+            plan = self._run(self.skybell.reconcile(desired, dry_run=True))
+            report = self._run(self.skybell.reconcile(desired))
+            again = self._run(self.skybell.reconcile(desired))
+
+            patches = [call for (method, _), call in mock.requests.items()
+                       if method.upper() == 'PATCH']
+
+        self.assertEqual(plan.pending, [DEVICE.DEVID])
+        self.assertEqual(report.applied, plan.plan)
+        self.assertEqual(report.attempts, {DEVICE.DEVID: 1})
+        self.assertEqual(again.unchanged, [DEVICE.DEVID])
+        self.assertEqual(len(patches), 1)
+        self.assertEqual(len(patches[0]), 1)
+
+    def tests_optimistic_settings(self):
+        """Check that async optimistic settings roll back on failure."""
+        skybell = AsyncSkybell(username=USERNAME,
+                               password=PASSWORD,
+                               disable_cache=True,
+                               login_sleep=False,
+                               optimistic_settings=True)
+        settings_url = _device_url(CONST.DEVICE_SETTINGS_URL)
+
+        with aioresponses() as mock:
+            mock.post(CONST.LOGIN_URL, body=LOGIN.post_response_ok())
+            mock.get(CONST.DEVICES_URL,
+                     body='[' + DEVICE.get_response_ok() + ']')
+            self._mock_device(mock)
+            mock.patch(settings_url, status=400,
+                       body=DEVICE_SETTINGS.PATHCH_RESPONSE_BAD_REQUEST)
+
+            device = self._run(skybell.get_device(DEVICE.DEVID))
+
+            async def _set_intensity():
+                """Use the setter from inside the running loop."""
+                device.led_intensity = 50
+
+                self.assertEqual(device.led_intensity, 50)
+                self.assertEqual(
+                    device.setting_state(CONST.SETTINGS_LED_INTENSITY),
+                    CONST.SETTING_PENDING)
+
+                return await device.wait_for_settings(5)
+
+            self.assertTrue(self._run(_set_intensity()))
+
+        self.assertEqual(device.led_intensity, 100)
+        self.assertEqual(device.setting_state(CONST.SETTINGS_LED_INTENSITY),
+                         CONST.SETTING_FAILED)
+        self._run(skybell.close())
+
+    def tests_sync_only_apis(self):
+        """Check that inherited apis are awaitable or refuse clearly."""
+        with aioresponses() as mock:
+            mock.post(CONST.LOGIN_URL, body=LOGIN.post_response_ok())
+            mock.get(CONST.DEVICES_URL,
+                     body='[' + DEVICE.get_response_ok() + ']')
+            self._mock_device(mock)
+
+            self.assertIsNone(self._run(self.skybell.prefetch()))
+
+            with self.assertRaises(SkybellException) as context:
+                self._run(self.skybell.prefetch(['bogus']))
+
+            self.assertEqual(context.exception.errcode,
+                             ERROR.ENDPOINT_REQUESTS_FAILED[0])
+
+            device = self._run(self.skybell.get_device(DEVICE.DEVID))
+            self._run(device.prefetch([CONST.ENDPOINT_SETTINGS]))
+
+        for start in (self.skybell.start_polling, self.skybell.start_push):
+            with self.assertRaises(SkybellException) as context:
+                start()
+
+            self.assertEqual(context.exception.errcode,
+                             ERROR.ASYNC_UNSUPPORTED[0])
+
+    def tests_media_unsupported(self):
+        """Check that media downloads refuse clearly instead of crashing."""
+        with aioresponses() as mock:
+            mock.post(CONST.LOGIN_URL, body=LOGIN.post_response_ok())
+            mock.get(CONST.DEVICES_URL,
+                     body='[' + DEVICE.get_response_ok() + ']')
+            self._mock_device(mock)
+
+            device = self._run(self.skybell.get_device(DEVICE.DEVID))
+
+        for call in (device.download_media, self.skybell.download_media,
+                     lambda: self.skybell.fetch_media('key', 'http://a/b'),
+                     lambda: self.skybell.stream('http://a/b')):
+            with self.assertRaises(SkybellException) as context:
+                call()
+
+            self.assertEqual(context.exception.errcode,
+                             ERROR.ASYNC_UNSUPPORTED[0])
+
+    def tests_images_unsupported(self):
+        """Check that avatar images refuse clearly instead of crashing."""
+        with aioresponses() as mock:
+            mock.post(CONST.LOGIN_URL, body=LOGIN.post_response_ok())
+            mock.get(CONST.DEVICES_URL,
+                     body='[' + DEVICE.get_response_ok() + ']')
+            self._mock_device(mock)
+
+            device = self._run(self.skybell.get_device(DEVICE.DEVID))
+
+        for call in (device.image_bytes,
+                     lambda: device.image_bytes((64, 64)),
+                     lambda: self.skybell.fetch_image('key', 'http://a/b')):
+            with self.assertRaises(SkybellException) as context:
+                call()
+
+            self.assertEqual(context.exception.errcode,
+                             ERROR.ASYNC_UNSUPPORTED[0])
+
+        with self.assertRaises(TypeError):
+            AsyncSkybell(username=USERNAME, password=PASSWORD,
+                         disable_cache=True, image_cache_size=1024)
+
+    def tests_single_flight_login(self):
+        """Check that concurrent auth failures share a single login."""
+        tokens = []
+
+        def _login(url, **kwargs):
+            """Hand out a new access token per login."""
+            tokens.append('token{}'.format(len(tokens)))
+            return CallbackResult(body=LOGIN.post_response_ok(
+                access_token=tokens[-1]))
+
+        async def _devices(url, **kwargs):
+            """Reject every token but the newest, answering concurrently."""
+            await asyncio.sleep(0)
+
+            if kwargs['headers']['Authorization'] != 'Bearer ' + tokens[-1]:
+                return CallbackResult(status=401, body='')
+
+            return CallbackResult(body=DEVICE.EMPTY_DEVICE_RESPONSE)
+
+        with aioresponses() as mock:
+            mock.post(CONST.LOGIN_URL, callback=_login, repeat=True)
+            mock.get(CONST.DEVICES_URL, callback=_devices, repeat=True)
+
+            self._run(self.skybell.login())
+
+            # The token expires while the requests are in flight
+            tokens.append('expired')
+
+            async def _requests():
+                """Send requests that all fail with the same token."""
+                return await asyncio.gather(
+                    *(self.skybell.send_request('get', CONST.DEVICES_URL)
+                      for _ in range(20)))
+
+            responses = self._run(_requests())
+
+        self.assertEqual([response.status for response in responses],
+                         [200] * 20)
+        self.assertEqual(tokens, ['token0', 'expired', 'token2'])
+
+    def tests_token_wait_deadline(self):
+        """Check that the wait for a settling token keeps to the deadline."""
+        # pylint: disable=protected-access
+        self.skybell._token_manager = TokenManager(self.skybell,
+                                                   settle_time=5)
+
+        with aioresponses() as mock:
+            mock.post(CONST.LOGIN_URL, body=LOGIN.post_response_ok())
+            mock.get(CONST.DEVICES_URL, body=DEVICE.EMPTY_DEVICE_RESPONSE)
+
+            self._run(self.skybell.login())
+            self.assertFalse(self.skybell.token_ready)
+
+            start = time.monotonic()
+
+            with self.assertRaises(SkybellException) as context:
+                self._run(self.skybell.send_request(
+                    'get', CONST.DEVICES_URL,
+                    deadline=time.monotonic() + 0.1))
+
+        self.assertEqual(context.exception.errcode,
+                         ERROR.DEADLINE_EXCEEDED[0])
+        self.assertLess(time.monotonic() - start, 1)
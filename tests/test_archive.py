@@ -0,0 +1,145 @@
+"""
+Test the Skybell activity archive.
+
+Tests archiving and querying activities and archiving device activities.
+"""
+import datetime
+import json
+import os
+import tempfile
+import unittest
+
+import requests_mock
+
+import skybellpy
+from skybellpy.archive import ActivityArchive
+import skybellpy.helpers.constants as CONST
+
+import tests.mock.login as LOGIN
+import tests.mock.device as DEVICE
+import tests.mock.device_avatar as DEVICE_AVATAR
+import tests.mock.device_info as DEVICE_INFO
+import tests.mock.device_settings as DEVICE_SETTINGS
+import tests.mock.device_activities as DEVICE_ACTIVITIES
+
+USERNAME = 'foobar'
+PASSWORD = 'deadbeef'
+
+
+def _activity(activity_id, day, event=CONST.EVENT_MOTION):
+    """Return an activity json with an id and creation day."""
+    activity = json.loads(DEVICE_ACTIVITIES.get_response_ok(
+        event=event, created_at=datetime.datetime(2018, 1, day)))
+    activity[CONST.ID] = activity_id
+
+    return activity
+
+
+class TestArchive(unittest.TestCase):
+    """Test the activity archive in skybellpy."""
+
+    def setUp(self):
+        """Create a temporary directory for the archive."""
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmpdir.name, 'archive.db')
+
+    def tearDown(self):
+        """Clean up after test."""
+        self.tmpdir.cleanup()
+
+    def tests_archive(self):
+        """Check that archived activities are queried and persisted."""
+        archive = ActivityArchive(self.db_path)
+
+        added = archive.append('dev1', [
+            _activity('a', 1),
+            _activity('b', 2, CONST.EVENT_BUTTON),
+            _activity('c', 3)])
+        self.assertEqual(added, 3)
+
+        # Activities already archived are skipped
+        added = archive.append('dev1', [_activity('c', 3), _activity('d', 4)])
+        self.assertEqual(added, 1)
+
+        archive.append('dev2', [_activity('a', 5)])
+        archive.close()
+
+        archive = ActivityArchive(self.db_path)
+
+        self.assertEqual(archive.count('dev1'), 4)
+        self.assertEqual(archive.count('dev1', CONST.EVENT_BUTTON), 1)
+        self.assertEqual(
+            [activity.id for activity in archive.query('dev1')],
+            ['d', 'c', 'b', 'a'])
+        self.assertEqual(
+            [activity.id for activity in archive.query(
+                'dev1', event=CONST.EVENT_MOTION, limit=2)],
+            ['d', 'c'])
+        self.assertEqual(
+            [activity.id for activity in archive.query(
+                'dev1', since='2018-01-02T00:00:00Z',
+                until=datetime.datetime(2018, 1, 3).replace(
+                    tzinfo=datetime.timezone.utc).timestamp())],
+            ['c', 'b'])
+        self.assertEqual(archive.latest('dev1'), _activity('d', 4))
+        self.assertEqual(archive.latest('dev2').id, 'a')
+        self.assertIsNone(archive.latest('dev3'))
+
+        archive.close()
+
+    @requests_mock.mock()
+    def tests_device_history(self, m):
+        """Check that device activities are archived as they arrive."""
+        m.post(CONST.LOGIN_URL, text=LOGIN.post_response_ok())
+
+        archive = ActivityArchive(self.db_path)
+        skybell = skybellpy.Skybell(username=USERNAME,
+                                    password=PASSWORD,
+                                    disable_cache=True,
+                                    login_sleep=False,
+                                    activity_retention=1,
+                                    activity_archive=archive)
+
+        # Set up device
+        device_text = '[' + DEVICE.get_response_ok() + ']'
+        device_url = str.replace(CONST.DEVICE_URL, '$DEVID$', DEVICE.DEVID)
+        avatar_url = str.replace(CONST.DEVICE_AVATAR_URL,
+                                 '$DEVID$', DEVICE.DEVID)
+        info_url = str.replace(CONST.DEVICE_INFO_URL, '$DEVID$', DEVICE.DEVID)
+        settings_url = str.replace(CONST.DEVICE_SETTINGS_URL,
+                                   '$DEVID$', DEVICE.DEVID)
+        activities_url = str.replace(CONST.DEVICE_ACTIVITIES_URL,
+                                     '$DEVID$', DEVICE.DEVID)
+
+        m.get(CONST.DEVICES_URL, text=device_text)
+        m.get(device_url, text=DEVICE.get_response_ok())
+        m.get(avatar_url, text=DEVICE_AVATAR.get_response_ok())
+        m.get(info_url, text=DEVICE_INFO.get_response_ok())
+        m.get(settings_url, text=DEVICE_SETTINGS.get_response_ok())
+        m.get(activities_url, text=json.dumps(
+            [_activity('second', 2), _activity('first', 1)]))
+
+        device = skybell.get_device(DEVICE.DEVID)
+
+        m.get(activities_url, text=json.dumps([_activity('third', 3)]))
+        device.refresh()
+
+        device.add_activity(_activity('pushed', 4, CONST.EVENT_BUTTON))
+
+        # Memory only keeps the newest, the archive keeps everything
+        self.assertEqual(len(device.activities(limit=None)), 1)
+        self.assertEqual(
+            [activity.id for activity in device.history()],
+            ['pushed', 'third', 'second', 'first'])
+        self.assertEqual(
+            [activity.id for activity in device.history(
+                event=CONST.EVENT_MOTION, until='2018-01-02T00:00:00Z')],
+            ['second', 'first'])
+
+        skybell.close()
+
+        # The history outlives the client
+        archive = ActivityArchive(self.db_path)
+        self.assertEqual(archive.count(DEVICE.DEVID), 4)
+
+        archive.close()
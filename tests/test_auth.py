@@ -0,0 +1,109 @@
+"""
+Test the Skybell access token lifecycle.
+
+Tests that logins don't sleep and tokens are refreshed before expiry.
+"""
+import threading
+import time
+import unittest
+
+import requests_mock
+
+import skybellpy
+from skybellpy.auth import TokenManager
+import skybellpy.helpers.constants as CONST
+
+import tests.mock.login as LOGIN
+import tests.mock.device as DEVICE
+
+USERNAME = 'foobar'
+PASSWORD = 'deadbeef'
+
+
+class TestAuth(unittest.TestCase):
+    """Test the TokenManager class in skybellpy."""
+
+    def setUp(self):
+        """Set up Skybell module."""
+        self.skybell = skybellpy.Skybell(username=USERNAME,
+                                         password=PASSWORD,
+                                         disable_cache=True,
+                                         login_sleep=False)
+
+    def tearDown(self):
+        """Clean up after test."""
+        self.skybell.close()
+        self.skybell = None
+
+    @requests_mock.mock()
+    def tests_shared_settle(self, m):
+        """Check that callers share one wait for a new token."""
+        m.post(CONST.LOGIN_URL, text=LOGIN.post_response_ok())
+        m.get(CONST.DEVICES_URL, text=DEVICE.EMPTY_DEVICE_RESPONSE)
+
+        # pylint: disable=protected-access
+        self.skybell._token_manager = TokenManager(self.skybell,
+                                                   settle_time=0.2)
+
+        start = time.monotonic()
+        self.skybell.login()
+
+        # Logging in no longer blocks
+        self.assertLess(time.monotonic() - start, 0.2)
+        self.assertFalse(self.skybell.token_ready)
+
+        finished = []
+
+        def _request():
+            """Request the devices and record when it finished."""
+            self.skybell.send_request('get', CONST.DEVICES_URL)
+            finished.append(time.monotonic() - start)
+
+        threads = [threading.Thread(target=_request) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertTrue(self.skybell.token_ready)
+        self.assertEqual(len(finished), 5)
+        self.assertGreaterEqual(min(finished), 0.19)
+        self.assertLess(max(finished), 1)
+
+    @requests_mock.mock()
+    def tests_proactive_refresh(self, m):
+        """Check that the token is refreshed in the background."""
+        m.post(CONST.LOGIN_URL, [
+            {'text': LOGIN.post_response_ok(access_token='first')},
+            {'text': LOGIN.post_response_ok(access_token='second')}
+        ])
+
+        # pylint: disable=protected-access
+        self.skybell._token_manager = TokenManager(self.skybell,
+                                                   settle_time=0.3,
+                                                   lifetime=0.5,
+                                                   refresh_margin=0.1)
+
+        self.skybell.login()
+        self.assertEqual(self.skybell.cache(CONST.ACCESS_TOKEN), 'first')
+
+        # The old token stays in use while the new one settles
+        end = time.monotonic() + 5
+        while m.call_count < 2 and time.monotonic() < end:
+            time.sleep(0.01)
+
+        self.assertEqual(m.call_count, 2)
+        self.assertEqual(self.skybell.cache(CONST.ACCESS_TOKEN), 'first')
+        self.assertTrue(self.skybell.token_ready)
+
+        while self.skybell.cache(CONST.ACCESS_TOKEN) == 'first' and \
+                time.monotonic() < end:
+            time.sleep(0.01)
+
+        self.assertEqual(self.skybell.cache(CONST.ACCESS_TOKEN), 'second')
+
+        # Logging out stops any further refresh
+        self.skybell.logout()
+        calls = m.call_count
+        time.sleep(0.3)
+        self.assertEqual(m.call_count, calls)
@@ -0,0 +1,150 @@
+"""
+Test the Skybell cache backends.
+
+Tests the SQLite backend and the write-behind cache flushing in Skybell.
+"""
+import os
+import sqlite3
+import tempfile
+import unittest
+
+import skybellpy
+from skybellpy.cache import SqliteCache
+import skybellpy.helpers.constants as CONST
+
+USERNAME = 'foobar'
+PASSWORD = 'deadbeef'
+
+
+class CountingCache():
+    """Cache backend that records every save call."""
+
+    def __init__(self):
+        """Set up the counting cache."""
+        self.saves = []
+
+    def load(self):
+        """Nothing to load."""
+        return None
+
+    def save(self, data, dirty=None):
+        """Record the dirty keys."""
+        self.saves.append(None if dirty is None else set(dirty))
+
+    def close(self):
+        """Nothing to release."""
+
+
+class TestCache(unittest.TestCase):
+    """Test the cache backends in skybellpy."""
+
+    def setUp(self):
+        """Create a temporary directory for cache files."""
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmpdir.name, 'skybell.db')
+
+    def tearDown(self):
+        """Clean up after test."""
+        self.tmpdir.cleanup()
+
+    def tests_sqlite_round_trip(self):
+        """Check that the SQLite cache loads what it saved."""
+        cache = SqliteCache(self.db_path)
+        self.assertIsNone(cache.load())
+
+        data = {
+            CONST.APP_ID: 'app',
+            CONST.ACCESS_TOKEN: None,
+            CONST.DEVICES: {
+                'dev1': {CONST.EVENT: {'a': 1}},
+                'dev2': {CONST.EVENT: {'b': 2}}
+            }
+        }
+
+        cache.save(data)
+        cache.close()
+
+        cache = SqliteCache(self.db_path)
+        self.assertEqual(cache.load(), data)
+        cache.close()
+
+    def tests_sqlite_dirty_devices(self):
+        """Check that only the dirty device rows are rewritten."""
+        cache = SqliteCache(self.db_path)
+
+        data = {
+            CONST.DEVICES: {
+                'dev1': {CONST.EVENT: {'a': 1}},
+                'dev2': {CONST.EVENT: {'b': 2}}
+            }
+        }
+        cache.save(data)
+
+        data[CONST.DEVICES]['dev1'] = {CONST.EVENT: {'a': 10}}
+        data[CONST.DEVICES]['dev2'] = {CONST.EVENT: {'b': 20}}
+        cache.save(data, {(CONST.DEVICES, 'dev1')})
+
+        loaded = cache.load()
+        self.assertEqual(loaded[CONST.DEVICES]['dev1'],
+                         {CONST.EVENT: {'a': 10}})
+        self.assertEqual(loaded[CONST.DEVICES]['dev2'],
+                         {CONST.EVENT: {'b': 2}})
+        cache.close()
+
+        conn = sqlite3.connect(self.db_path)
+        self.assertEqual(
+            conn.execute('SELECT COUNT(*) FROM devices').fetchone()[0], 2)
+        conn.close()
+
+    def tests_skybell_sqlite_cache(self):
+        """Check that Skybell persists its ids with the SQLite backend."""
+        skybell = skybellpy.Skybell(username=USERNAME,
+                                    password=PASSWORD,
+                                    cache_backend=SqliteCache(self.db_path),
+                                    login_sleep=False)
+        app_id = skybell.cache(CONST.APP_ID)
+        skybell.close()
+
+        skybell = skybellpy.Skybell(username=USERNAME,
+                                    password=PASSWORD,
+                                    cache_backend=SqliteCache(self.db_path),
+                                    login_sleep=False)
+        self.assertEqual(skybell.cache(CONST.APP_ID), app_id)
+        skybell.close()
+
+    def tests_write_behind(self):
+        """Check that cache writes are coalesced until flushed."""
+        backend = CountingCache()
+        skybell = skybellpy.Skybell(username=USERNAME,
+                                    password=PASSWORD,
+                                    cache_backend=backend,
+                                    cache_flush_interval=3600,
+                                    login_sleep=False)
+
+        # The merged template is written once in full
+        self.assertEqual(backend.saves, [None])
+
+        skybell.update_cache({CONST.ACCESS_TOKEN: 'token'})
+        skybell.update_cache({CONST.DEVICES: {'dev1': {CONST.EVENT: {}}}})
+        skybell.update_cache({CONST.DEVICES: {'dev2': {CONST.EVENT: {}}}})
+        self.assertEqual(len(backend.saves), 1)
+
+        # Shutting down flushes everything dirty in a single write
+        skybell.close()
+        self.assertEqual(backend.saves[1], {CONST.ACCESS_TOKEN,
+                                            (CONST.DEVICES, 'dev1'),
+                                            (CONST.DEVICES, 'dev2')})
+
+    def tests_write_through(self):
+        """Check that a zero interval writes every update."""
+        backend = CountingCache()
+        skybell = skybellpy.Skybell(username=USERNAME,
+                                    password=PASSWORD,
+                                    cache_backend=backend,
+                                    login_sleep=False)
+
+        skybell.update_cache({CONST.ACCESS_TOKEN: 'token'})
+        skybell.update_cache({CONST.ACCESS_TOKEN: 'other'})
+        self.assertEqual(backend.saves, [None, {CONST.ACCESS_TOKEN},
+                                         {CONST.ACCESS_TOKEN}])
+        skybell.close()
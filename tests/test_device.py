@@ -5,7 +5,10 @@ Tests the device initialization and attributes of the Skybell device class.
 """
 import datetime
 import json
+import threading
+import time
 import unittest
+from unittest import mock
 
 from distutils.util import strtobool
 
@@ -13,6 +16,7 @@ import requests_mock
 
 import skybellpy
 import skybellpy.helpers.constants as CONST
+from skybellpy.activities import Activity
 
 import tests.mock.login as LOGIN
 import tests.mock.device as DEVICE
@@ -49,7 +53,6 @@ class TestSkybell(unittest.TestCase):
         device_json = json.loads(device_text)
 
         avatar_text = DEVICE_AVATAR.get_response_ok()
-        avatar_json = json.loads(avatar_text)
         avatar_url = str.replace(CONST.DEVICE_AVATAR_URL,
                                  '$DEVID$', DEVICE.DEVID)
 
@@ -100,11 +103,15 @@ class TestSkybell(unittest.TestCase):
                          device_json[0][CONST.LOCATION][CONST.LOCATION_LAT])
         self.assertEqual(device.location[1],
                          device_json[0][CONST.LOCATION][CONST.LOCATION_LNG])
-        self.assertEqual(device.image,
-                         avatar_json[CONST.AVATAR_URL])
         self.assertEqual(device.activity_image,
                          activities_json[0][CONST.MEDIA_URL])
 
+        # The avatar comes with the device json, the endpoint isn't needed
+        self.assertEqual(device.image,
+                         device_json[0][CONST.AVATAR][CONST.AVATAR_URL])
+        self.assertFalse(any(request.url == avatar_url
+                             for request in m.request_history))
+
         # Test Info Details
         self.assertEqual(device.wifi_status,
                          info_json[CONST.STATUS][CONST.WIFI_LINK])
@@ -679,3 +686,1021 @@ class TestSkybell(unittest.TestCase):
         # Test
         self.assertIsNotNone(event)
         self.assertEqual(event.get(CONST.STATE), 'alpha')
+
+    @requests_mock.mock()
+    def tests_events_cache_lock(self, m):
+        """Check that cached events only change under the cache lock."""
+        m.post(CONST.LOGIN_URL, text=LOGIN.post_response_ok())
+
+        # Set up device
+        device = DEVICE.get_response_ok()
+        device_text = '[' + device + ']'
+        device_url = str.replace(CONST.DEVICE_URL, '$DEVID$', DEVICE.DEVID)
+
+        avatar_text = DEVICE_AVATAR.get_response_ok()
+        avatar_url = str.replace(CONST.DEVICE_AVATAR_URL,
+                                 '$DEVID$', DEVICE.DEVID)
+
+        info_text = DEVICE_INFO.get_response_ok()
+        info_url = str.replace(CONST.DEVICE_INFO_URL, '$DEVID$', DEVICE.DEVID)
+
+        settings_text = DEVICE_SETTINGS.get_response_ok()
+        settings_url = str.replace(CONST.DEVICE_SETTINGS_URL,
+                                   '$DEVID$', DEVICE.DEVID)
+
+        activities_text = '[' + DEVICE_ACTIVITIES.get_response_ok(
+            dev_id=DEVICE.DEVID,
+            event=CONST.EVENT_BUTTON) + ']'
+        activities_url = str.replace(CONST.DEVICE_ACTIVITIES_URL,
+                                     '$DEVID$', DEVICE.DEVID)
+
+        m.get(CONST.DEVICES_URL, text=device_text)
+        m.get(avatar_url, text=avatar_text)
+        m.get(device_url, text=device)
+        m.get(info_url, text=info_text)
+        m.get(settings_url, text=settings_text)
+        m.get(activities_url, text=activities_text)
+
+        device = self.skybell.get_device(DEVICE.DEVID)
+        events = self.skybell.dev_cache(device, CONST.EVENT)
+        self.assertIn(CONST.EVENT_BUTTON, events)
+
+        motion = Activity.from_json(json.loads(
+            DEVICE_ACTIVITIES.get_response_ok(
+                dev_id=DEVICE.DEVID,
+                event=CONST.EVENT_MOTION)))
+
+        # Hold the cache lock, as the cache writer does while pickling
+        # pylint: disable=protected-access
+        with self.skybell._cache_lock:
+            thread = threading.Thread(target=device._update_events,
+                                      args=([motion],))
+            thread.start()
+            thread.join(0.2)
+
+            # Test
+            self.assertTrue(thread.is_alive())
+            self.assertNotIn(CONST.EVENT_MOTION, events)
+
+        thread.join()
+
+        self.assertIn(CONST.EVENT_MOTION,
+                      self.skybell.dev_cache(device, CONST.EVENT))
+
+    @requests_mock.mock()
+    def tests_legacy_events_replaced(self, m):
+        """Check that a newer event replaces a cached event json whole."""
+        m.post(CONST.LOGIN_URL, text=LOGIN.post_response_ok())
+
+        # Set up device
+        device = DEVICE.get_response_ok()
+        device_text = '[' + device + ']'
+
+        m.get(CONST.DEVICES_URL, text=device_text)
+        m.get(str.replace(CONST.DEVICE_AVATAR_URL, '$DEVID$', DEVICE.DEVID),
+              text=DEVICE_AVATAR.get_response_ok())
+        m.get(str.replace(CONST.DEVICE_URL, '$DEVID$', DEVICE.DEVID),
+              text=device)
+        m.get(str.replace(CONST.DEVICE_INFO_URL, '$DEVID$', DEVICE.DEVID),
+              text=DEVICE_INFO.get_response_ok())
+        m.get(str.replace(CONST.DEVICE_SETTINGS_URL, '$DEVID$', DEVICE.DEVID),
+              text=DEVICE_SETTINGS.get_response_ok())
+        m.get(str.replace(CONST.DEVICE_ACTIVITIES_URL,
+                          '$DEVID$', DEVICE.DEVID),
+              text=DEVICE_ACTIVITIES.EMPTY_ACTIVITIES_RESPONSE)
+
+        device = self.skybell.get_device(DEVICE.DEVID)
+
+        # Caches written by older versions hold the full activity json
+        legacy = json.loads(DEVICE_ACTIVITIES.get_response_ok(
+            dev_id=DEVICE.DEVID,
+            event=CONST.EVENT_MOTION,
+            created_at=datetime.datetime(2017, 1, 1, 0, 0, 0)))
+
+        self.skybell.update_dev_cache(
+            device, {CONST.EVENT: {CONST.EVENT_MOTION: legacy}})
+
+        motion = Activity(
+            'newer', CONST.EVENT_MOTION,
+            Activity.from_json(legacy).created_at + 60)
+
+        # pylint: disable=protected-access
+        device._update_events([motion])
+
+        # Test
+        cached = self.skybell.dev_cache(device, CONST.EVENT)
+        self.assertEqual(dict(cached[CONST.EVENT_MOTION]), motion.json)
+        self.assertNotIn('callId', cached[CONST.EVENT_MOTION])
+
+        # Only plain json is persisted
+        for event in cached.values():
+            self.assertIs(type(event), dict)
+        self.assertEqual(device.latest(CONST.EVENT_MOTION).id, 'newer')
+
+    @requests_mock.mock()
+    def tests_concurrent_refresh(self, m):
+        """Check that the device endpoints can be requested concurrently."""
+        skybell = skybellpy.Skybell(username=USERNAME,
+                                    password=PASSWORD,
+                                    disable_cache=True,
+                                    login_sleep=False,
+                                    max_workers=4)
+
+        m.post(CONST.LOGIN_URL, text=LOGIN.post_response_ok())
+
+        # Set up device
+        device_text = '[' + DEVICE.get_response_ok() + ']'
+        device_url = str.replace(CONST.DEVICE_URL, '$DEVID$', DEVICE.DEVID)
+
+        avatar_text = DEVICE_AVATAR.get_response_ok()
+        avatar_url = str.replace(CONST.DEVICE_AVATAR_URL,
+                                 '$DEVID$', DEVICE.DEVID)
+
+        info_text = DEVICE_INFO.get_response_ok()
+        info_url = str.replace(CONST.DEVICE_INFO_URL, '$DEVID$', DEVICE.DEVID)
+
+        settings_text = DEVICE_SETTINGS.get_response_ok()
+        settings_url = str.replace(CONST.DEVICE_SETTINGS_URL,
+                                   '$DEVID$', DEVICE.DEVID)
+
+        activities_text = '[' + DEVICE_ACTIVITIES.get_response_ok(
+            dev_id=DEVICE.DEVID,
+            event=CONST.EVENT_BUTTON) + ']'
+        activities_url = str.replace(CONST.DEVICE_ACTIVITIES_URL,
+                                     '$DEVID$', DEVICE.DEVID)
+
+        m.get(CONST.DEVICES_URL, text=device_text)
+        m.get(device_url, text=DEVICE.get_response_ok(name='Renamed'))
+        m.get(avatar_url, text=avatar_text)
+        m.get(info_url, text=info_text)
+        m.get(settings_url, text=settings_text)
+        m.get(activities_url, text=activities_text)
+
+        # Get our specific device
+        # pylint: disable=W0212
+        device = skybell.get_device(DEVICE.DEVID)
+        self.assertIsNotNone(device)
+        self.assertEqual(device._avatar_json,
+                         json.loads(device_text)[0][CONST.AVATAR])
+        self.assertEqual(device._info_json, json.loads(info_text))
+        self.assertEqual(device._settings_json, json.loads(settings_text))
+        self.assertEqual(device._activities, json.loads(activities_text))
+
+        # Refresh all endpoints at once
+        device.refresh()
+        self.assertEqual(device.name, 'Renamed')
+        self.assertEqual(device.image,
+                         json.loads(avatar_text)[CONST.AVATAR_URL])
+
+        skybell.close()
+
+    @requests_mock.mock()
+    def tests_concurrent_stress(self, m):
+        """Check that many threads can share one client and device."""
+        skybell = skybellpy.Skybell(username=USERNAME,
+                                    password=PASSWORD,
+                                    disable_cache=True,
+                                    login_sleep=False,
+                                    max_workers=4)
+
+        m.post(CONST.LOGIN_URL, text=LOGIN.post_response_ok())
+
+        # Set up device
+        device_text = '[' + DEVICE.get_response_ok() + ']'
+        device_url = str.replace(CONST.DEVICE_URL, '$DEVID$', DEVICE.DEVID)
+        avatar_url = str.replace(CONST.DEVICE_AVATAR_URL,
+                                 '$DEVID$', DEVICE.DEVID)
+        info_url = str.replace(CONST.DEVICE_INFO_URL, '$DEVID$', DEVICE.DEVID)
+        settings_url = str.replace(CONST.DEVICE_SETTINGS_URL,
+                                   '$DEVID$', DEVICE.DEVID)
+        activities_url = str.replace(CONST.DEVICE_ACTIVITIES_URL,
+                                     '$DEVID$', DEVICE.DEVID)
+
+        m.get(CONST.DEVICES_URL, text=device_text)
+        m.get(device_url, text=DEVICE.get_response_ok())
+        m.get(avatar_url, text=DEVICE_AVATAR.get_response_ok())
+        m.get(info_url, text=DEVICE_INFO.get_response_ok())
+        m.get(settings_url, text=DEVICE_SETTINGS.get_response_ok())
+        m.get(activities_url, text=DEVICE_ACTIVITIES.EMPTY_ACTIVITIES_RESPONSE)
+
+        received = []
+        errors = []
+        start = threading.Barrier(8)
+
+        def _worker(index):
+            """Refresh the device and push activities from many threads."""
+            try:
+                start.wait()
+
+                for count in range(10):
+                    device = skybell.get_device(DEVICE.DEVID)
+                    device.refresh(force=True)
+
+                    activity = json.loads(DEVICE_ACTIVITIES.get_response_ok(
+                        event=CONST.EVENT_MOTION))
+                    activity[CONST.ID] = '{}-{}'.format(index, count)
+                    device.add_activity(activity)
+            except Exception as exc:  # pylint: disable=broad-except
+                errors.append(exc)
+
+        skybell.get_device(DEVICE.DEVID).add_callback(
+            lambda device, activity: received.append(activity[CONST.ID]))
+
+        threads = [threading.Thread(target=_worker, args=(index,))
+                   for index in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+
+        # A single login was shared by every thread
+        logins = [request for request in m.request_history
+                  if request.url == CONST.LOGIN_URL]
+        self.assertEqual(len(logins), 1)
+
+        # Every pushed activity was notified exactly once
+        self.assertEqual(len(received), 80)
+        self.assertEqual(len(set(received)), 80)
+
+        skybell.close()
+
+    @requests_mock.mock()
+    def tests_refresh_deadline(self, m):
+        """Check that a refresh returns what finished before its timeout."""
+        skybell = skybellpy.Skybell(username=USERNAME,
+                                    password=PASSWORD,
+                                    disable_cache=True,
+                                    login_sleep=False,
+                                    max_workers=4)
+
+        m.post(CONST.LOGIN_URL, text=LOGIN.post_response_ok())
+
+        # Set up device
+        device_text = '[' + DEVICE.get_response_ok() + ']'
+        device_url = str.replace(CONST.DEVICE_URL, '$DEVID$', DEVICE.DEVID)
+        avatar_url = str.replace(CONST.DEVICE_AVATAR_URL,
+                                 '$DEVID$', DEVICE.DEVID)
+        info_url = str.replace(CONST.DEVICE_INFO_URL, '$DEVID$', DEVICE.DEVID)
+        settings_url = str.replace(CONST.DEVICE_SETTINGS_URL,
+                                   '$DEVID$', DEVICE.DEVID)
+        activities_url = str.replace(CONST.DEVICE_ACTIVITIES_URL,
+                                     '$DEVID$', DEVICE.DEVID)
+
+        m.get(CONST.DEVICES_URL, text=device_text)
+        m.get(device_url, text=DEVICE.get_response_ok())
+        m.get(avatar_url, text=DEVICE_AVATAR.get_response_ok())
+        m.get(info_url, text=DEVICE_INFO.get_response_ok())
+        m.get(settings_url, text=DEVICE_SETTINGS.get_response_ok())
+        m.get(activities_url, text=DEVICE_ACTIVITIES.EMPTY_ACTIVITIES_RESPONSE)
+
+        device = skybell.get_device(DEVICE.DEVID)
+        self.assertIsNotNone(device)
+
+        send_request = skybell.send_request
+
+        def _hang(**kwargs):
+            """Send the info request far too late.
+
+            The delay comes before the mock, requests_mock answers one
+            request at a time and would hold up the other endpoints.
+            """
+            if kwargs['url'] == info_url:
+                time.sleep(0.5)
+
+            return send_request(**kwargs)
+
+        m.get(device_url, text=DEVICE.get_response_ok(name='Renamed'))
+
+        start = time.monotonic()
+
+        with mock.patch.object(skybell, 'send_request', side_effect=_hang):
+            refreshed = device.refresh(force=True, timeout=0.2)
+
+        # The hung endpoint is skipped, everything else was merged
+        self.assertLess(time.monotonic() - start, 0.45)
+        self.assertNotIn(CONST.ENDPOINT_INFO, refreshed)
+        self.assertIn(CONST.ENDPOINT_DEVICE, refreshed)
+        self.assertEqual(device.name, 'Renamed')
+
+        # Requests use the default timeout, clipped to the deadline
+        self.assertEqual(m.request_history[0].timeout, CONST.DEFAULT_TIMEOUT)
+        self.assertLessEqual(max(m.last_request.timeout), 0.2)
+
+        skybell.close()
+
+    @requests_mock.mock()
+    def tests_abandoned_revalidation(self, m):
+        """Check that a response that wasn't merged keeps no validators."""
+        skybell = skybellpy.Skybell(
+            username=USERNAME,
+            password=PASSWORD,
+            disable_cache=True,
+            login_sleep=False,
+            max_workers=4,
+            endpoint_ttls={endpoint: 3600 for endpoint in CONST.ALL_ENDPOINTS
+                           if endpoint != CONST.ENDPOINT_SETTINGS})
+
+        m.post(CONST.LOGIN_URL, text=LOGIN.post_response_ok())
+
+        server = {'led_intensity': 10, 'etag': '"v1"', 'delay': 0}
+
+        def _settings(request, context):
+            """Answer with the current settings unless they're known."""
+            time.sleep(server['delay'])
+            context.headers['ETag'] = server['etag']
+
+            if request.headers.get('If-None-Match') == server['etag']:
+                context.status_code = 304
+                return ''
+
+            return DEVICE_SETTINGS.get_response_ok(
+                led_intensity=server['led_intensity'])
+
+        m.get(CONST.DEVICES_URL, text='[' + DEVICE.get_response_ok() + ']')
+        m.get(str.replace(CONST.DEVICE_URL, '$DEVID$', DEVICE.DEVID),
+              text=DEVICE.get_response_ok())
+        m.get(str.replace(CONST.DEVICE_AVATAR_URL, '$DEVID$', DEVICE.DEVID),
+              text=DEVICE_AVATAR.get_response_ok())
+        m.get(str.replace(CONST.DEVICE_INFO_URL, '$DEVID$', DEVICE.DEVID),
+              text=DEVICE_INFO.get_response_ok())
+        m.get(str.replace(CONST.DEVICE_SETTINGS_URL,
+                          '$DEVID$', DEVICE.DEVID), text=_settings)
+        m.get(str.replace(CONST.DEVICE_ACTIVITIES_URL,
+                          '$DEVID$', DEVICE.DEVID),
+              text=DEVICE_ACTIVITIES.EMPTY_ACTIVITIES_RESPONSE)
+
+        device = skybell.get_device(DEVICE.DEVID)
+        self.assertEqual(device.led_intensity, 10)
+
+        # The new settings arrive after the refresh gave up on them
+        server.update(led_intensity=99, etag='"v2"', delay=0.3)
+
+        self.assertNotIn(CONST.ENDPOINT_SETTINGS,
+                         device.refresh(timeout=0.1))
+        time.sleep(0.4)
+
+        server['delay'] = 0
+
+        self.assertIn(CONST.ENDPOINT_SETTINGS, device.refresh())
+        self.assertEqual(device.led_intensity, 99)
+
+        skybell.close()
+
+    @requests_mock.mock()
+    def tests_partial_refresh_failure(self, m):
+        """Check that a failed endpoint doesn't discard the others."""
+        m.post(CONST.LOGIN_URL, text=LOGIN.post_response_ok())
+
+        # Set up device
+        device_text = '[' + DEVICE.get_response_ok() + ']'
+        device_url = str.replace(CONST.DEVICE_URL, '$DEVID$', DEVICE.DEVID)
+
+        avatar_text = DEVICE_AVATAR.get_response_ok()
+        avatar_url = str.replace(CONST.DEVICE_AVATAR_URL,
+                                 '$DEVID$', DEVICE.DEVID)
+
+        info_text = DEVICE_INFO.get_response_ok()
+        info_url = str.replace(CONST.DEVICE_INFO_URL, '$DEVID$', DEVICE.DEVID)
+
+        settings_text = DEVICE_SETTINGS.get_response_ok()
+        settings_url = str.replace(CONST.DEVICE_SETTINGS_URL,
+                                   '$DEVID$', DEVICE.DEVID)
+        activities_url = str.replace(CONST.DEVICE_ACTIVITIES_URL,
+                                     '$DEVID$', DEVICE.DEVID)
+
+        m.get(CONST.DEVICES_URL, text=device_text)
+        m.get(avatar_url, text=avatar_text)
+        m.get(info_url, text=info_text)
+        m.get(settings_url, text=settings_text)
+        m.get(activities_url, text=DEVICE_ACTIVITIES.EMPTY_ACTIVITIES_RESPONSE)
+
+        # Get our specific device
+        device = self.skybell.get_device(DEVICE.DEVID)
+        self.assertIsNotNone(device)
+
+        # Break the info endpoint and change the device name
+        m.get(device_url, text=DEVICE.get_response_ok(name='Renamed'))
+        m.get(info_url, text='', status_code=500)
+
+        with self.assertRaises(skybellpy.SkybellException) as context:
+            device.refresh()
+
+        self.assertEqual(list(context.exception.details.keys()),
+                         [CONST.ENDPOINT_INFO])
+        self.assertEqual(device.name, 'Renamed')
+
+    @requests_mock.mock()
+    def tests_conditional_refresh(self, m):
+        """Check that unchanged endpoints are revalidated and skipped."""
+        m.post(CONST.LOGIN_URL, text=LOGIN.post_response_ok())
+
+        # Set up device
+        device_text = '[' + DEVICE.get_response_ok() + ']'
+        device_url = str.replace(CONST.DEVICE_URL, '$DEVID$', DEVICE.DEVID)
+
+        avatar_text = DEVICE_AVATAR.get_response_ok()
+        avatar_url = str.replace(CONST.DEVICE_AVATAR_URL,
+                                 '$DEVID$', DEVICE.DEVID)
+
+        info_text = DEVICE_INFO.get_response_ok(ssid='first')
+        info_url = str.replace(CONST.DEVICE_INFO_URL, '$DEVID$', DEVICE.DEVID)
+
+        settings_text = DEVICE_SETTINGS.get_response_ok()
+        settings_url = str.replace(CONST.DEVICE_SETTINGS_URL,
+                                   '$DEVID$', DEVICE.DEVID)
+        activities_url = str.replace(CONST.DEVICE_ACTIVITIES_URL,
+                                     '$DEVID$', DEVICE.DEVID)
+
+        m.get(CONST.DEVICES_URL, text=device_text)
+        m.get(device_url, text=DEVICE.get_response_ok())
+        m.get(avatar_url, text=avatar_text)
+        m.get(info_url, [
+            {'text': info_text, 'headers': {'ETag': '"v1"'}},
+            {'text': '', 'status_code': 304},
+            {'text': DEVICE_INFO.get_response_ok(ssid='second'),
+             'headers': {'ETag': '"v2"'}}
+        ])
+        m.get(settings_url, text=settings_text,
+              headers={'Last-Modified': 'Wed, 21 Oct 2015 07:28:00 GMT'})
+        m.get(activities_url, text=DEVICE_ACTIVITIES.EMPTY_ACTIVITIES_RESPONSE)
+
+        # Get our specific device
+        device = self.skybell.get_device(DEVICE.DEVID)
+        self.assertEqual(device.wifi_ssid, 'first')
+
+        # The info endpoint is unchanged
+        device.refresh()
+        self.assertEqual(device.wifi_ssid, 'first')
+
+        info_requests = [request for request in m.request_history
+                         if request.url == info_url]
+        self.assertNotIn('If-None-Match', info_requests[0].headers)
+        self.assertEqual(info_requests[1].headers['If-None-Match'], '"v1"')
+
+        settings_requests = [request for request in m.request_history
+                             if request.url == settings_url]
+        self.assertEqual(settings_requests[1].headers['If-Modified-Since'],
+                         'Wed, 21 Oct 2015 07:28:00 GMT')
+
+        # The info endpoint changed again
+        device.refresh()
+        self.assertEqual(device.wifi_ssid, 'second')
+
+        self.assertEqual(
+            self.skybell.stats[CONST.STAT_REVALIDATION_HITS], 1)
+        self.assertEqual(
+            self.skybell.stats[CONST.STAT_REVALIDATION_MISSES], 3)
+
+    @requests_mock.mock()
+    def tests_endpoint_ttls(self, m):
+        """Check that refresh only requests endpoints past their TTL."""
+        skybell = skybellpy.Skybell(username=USERNAME,
+                                    password=PASSWORD,
+                                    disable_cache=True,
+                                    login_sleep=False,
+                                    endpoint_ttls={
+                                        CONST.ENDPOINT_AVATAR: 600,
+                                        CONST.ENDPOINT_INFO: 600,
+                                        CONST.ENDPOINT_SETTINGS: 600
+                                    })
+
+        m.post(CONST.LOGIN_URL, text=LOGIN.post_response_ok())
+
+        # Set up device
+        device_text = '[' + DEVICE.get_response_ok() + ']'
+        device_url = str.replace(CONST.DEVICE_URL, '$DEVID$', DEVICE.DEVID)
+        avatar_url = str.replace(CONST.DEVICE_AVATAR_URL,
+                                 '$DEVID$', DEVICE.DEVID)
+        info_url = str.replace(CONST.DEVICE_INFO_URL, '$DEVID$', DEVICE.DEVID)
+        settings_url = str.replace(CONST.DEVICE_SETTINGS_URL,
+                                   '$DEVID$', DEVICE.DEVID)
+        activities_url = str.replace(CONST.DEVICE_ACTIVITIES_URL,
+                                     '$DEVID$', DEVICE.DEVID)
+
+        m.get(CONST.DEVICES_URL, text=device_text)
+        m.get(device_url, text=DEVICE.get_response_ok())
+        m.get(avatar_url, text=DEVICE_AVATAR.get_response_ok())
+        m.get(info_url, text=DEVICE_INFO.get_response_ok())
+        m.get(settings_url, text=DEVICE_SETTINGS.get_response_ok())
+        m.get(activities_url, text=DEVICE_ACTIVITIES.EMPTY_ACTIVITIES_RESPONSE)
+
+        def _count(url):
+            """Count the requests made to a url."""
+            return len([request for request in m.request_history
+                        if request.url == url])
+
+        device = skybell.get_device(DEVICE.DEVID)
+
+        # Only the expired endpoints are requested again
+        device.refresh()
+        self.assertEqual(_count(device_url), 1)
+        self.assertEqual(_count(activities_url), 2)
+        self.assertEqual(_count(info_url), 1)
+        self.assertEqual(_count(settings_url), 1)
+
+        # The avatar was seeded from the device json
+        self.assertEqual(_count(avatar_url), 0)
+
+        # Forcing a refresh ignores the policy
+        device.refresh(force=True)
+        self.assertEqual(_count(device_url), 2)
+        self.assertEqual(_count(activities_url), 3)
+        self.assertEqual(_count(avatar_url), 1)
+        self.assertEqual(_count(info_url), 2)
+        self.assertEqual(_count(settings_url), 2)
+
+        with self.assertRaises(skybellpy.SkybellException):
+            skybellpy.Skybell(disable_cache=True,
+                              endpoint_ttls={'lol': 10})
+
+    @requests_mock.mock()
+    def tests_lazy_load(self, m):
+        """Check that lazy devices only request endpoints on first use."""
+        skybell = skybellpy.Skybell(username=USERNAME,
+                                    password=PASSWORD,
+                                    disable_cache=True,
+                                    login_sleep=False,
+                                    lazy_load=True,
+                                    max_workers=4)
+
+        m.post(CONST.LOGIN_URL, text=LOGIN.post_response_ok())
+
+        # Set up device
+        device_text = '[' + DEVICE.get_response_ok() + ']'
+        device_url = str.replace(CONST.DEVICE_URL, '$DEVID$', DEVICE.DEVID)
+        avatar_url = str.replace(CONST.DEVICE_AVATAR_URL,
+                                 '$DEVID$', DEVICE.DEVID)
+        info_url = str.replace(CONST.DEVICE_INFO_URL, '$DEVID$', DEVICE.DEVID)
+        settings_url = str.replace(CONST.DEVICE_SETTINGS_URL,
+                                   '$DEVID$', DEVICE.DEVID)
+        activities_url = str.replace(CONST.DEVICE_ACTIVITIES_URL,
+                                     '$DEVID$', DEVICE.DEVID)
+
+        m.get(CONST.DEVICES_URL, text=device_text)
+        m.get(device_url, text=DEVICE.get_response_ok())
+        m.get(avatar_url, text=DEVICE_AVATAR.get_response_ok())
+        m.get(info_url, text=DEVICE_INFO.get_response_ok(ssid='lazy'))
+        m.get(settings_url, text=DEVICE_SETTINGS.get_response_ok())
+        m.get(activities_url, text=DEVICE_ACTIVITIES.EMPTY_ACTIVITIES_RESPONSE)
+
+        def _count(url):
+            """Count the requests made to a url."""
+            return len([request for request in m.request_history
+                        if request.url == url])
+
+        # Reading the device json requests nothing else
+        device = skybell.get_device(DEVICE.DEVID)
+        self.assertEqual(device.name, 'Front Door')
+        self.assertTrue(device.is_up)
+        self.assertEqual(len(m.request_history), 2)
+
+        # The info endpoint is requested once on first use
+        self.assertEqual(device.wifi_ssid, 'lazy')
+        self.assertEqual(device.wifi_status, 'good')
+        self.assertEqual(_count(info_url), 1)
+        self.assertEqual(_count(settings_url), 0)
+
+        # A refresh leaves unused endpoints alone
+        device.refresh()
+        self.assertEqual(_count(device_url), 1)
+        self.assertEqual(_count(info_url), 2)
+        self.assertEqual(_count(settings_url), 0)
+
+        # Warm the remaining endpoints for all devices
+        skybell.prefetch()
+        self.assertEqual(_count(avatar_url), 1)
+        self.assertEqual(_count(settings_url), 1)
+        self.assertEqual(_count(activities_url), 1)
+        self.assertEqual(_count(info_url), 2)
+
+        self.assertEqual(device.led_intensity, 100)
+        self.assertEqual(_count(settings_url), 1)
+
+        with self.assertRaises(skybellpy.SkybellException):
+            device.prefetch(['lol'])
+
+        skybell.close()
+
+    @requests_mock.mock()
+    def tests_activity_cursor(self, m):
+        """Check that only activities past the high-water mark are new."""
+        m.post(CONST.LOGIN_URL, text=LOGIN.post_response_ok())
+
+        # Set up device
+        device_text = '[' + DEVICE.get_response_ok() + ']'
+        device_url = str.replace(CONST.DEVICE_URL, '$DEVID$', DEVICE.DEVID)
+        avatar_url = str.replace(CONST.DEVICE_AVATAR_URL,
+                                 '$DEVID$', DEVICE.DEVID)
+        info_url = str.replace(CONST.DEVICE_INFO_URL, '$DEVID$', DEVICE.DEVID)
+        settings_url = str.replace(CONST.DEVICE_SETTINGS_URL,
+                                   '$DEVID$', DEVICE.DEVID)
+        activities_url = str.replace(CONST.DEVICE_ACTIVITIES_URL,
+                                     '$DEVID$', DEVICE.DEVID)
+
+        def _activity(activity_id, created_at):
+            """Return an activity json with an id and creation time."""
+            activity = json.loads(DEVICE_ACTIVITIES.get_response_ok(
+                event=CONST.EVENT_MOTION, created_at=created_at))
+            activity[CONST.ID] = activity_id
+
+            return activity
+
+        first = _activity('first', datetime.datetime(2018, 1, 1, 0, 0, 0))
+        second = _activity('second', datetime.datetime(2018, 1, 2, 0, 0, 0))
+        older = _activity('older', datetime.datetime(2017, 1, 1, 0, 0, 0))
+
+        m.get(CONST.DEVICES_URL, text=device_text)
+        m.get(device_url, text=DEVICE.get_response_ok())
+        m.get(avatar_url, text=DEVICE_AVATAR.get_response_ok())
+        m.get(info_url, text=DEVICE_INFO.get_response_ok())
+        m.get(settings_url, text=DEVICE_SETTINGS.get_response_ok())
+        m.get(activities_url, text=json.dumps([first]))
+
+        device = self.skybell.get_device(DEVICE.DEVID)
+
+        received = []
+        device.add_callback(
+            lambda dev, activity: received.append(activity[CONST.ID]))
+
+        self.assertEqual(
+            self.skybell.dev_cache(device, CONST.ACTIVITY_CURSOR),
+            {CONST.CREATED_AT: first[CONST.CREATED_AT], CONST.ID: 'first'})
+
+        # An unchanged list writes nothing and notifies nobody
+        with mock.patch.object(self.skybell, 'update_cache',
+                               wraps=self.skybell.update_cache) as update:
+            device.refresh()
+            self.assertEqual(update.call_count, 0)
+
+        self.assertEqual(received, [])
+
+        # Only the newer activity is processed and moves the mark
+        m.get(activities_url, text=json.dumps([second, first, older]))
+        device.refresh()
+
+        self.assertEqual(received, ['second'])
+        self.assertEqual(device.latest(CONST.EVENT_MOTION), second)
+        self.assertEqual(
+            self.skybell.dev_cache(device, CONST.ACTIVITY_CURSOR)[CONST.ID],
+            'second')
+
+    @requests_mock.mock()
+    def tests_activity_updates(self, m):
+        """Check that changes to activities seen before are kept."""
+        m.post(CONST.LOGIN_URL, text=LOGIN.post_response_ok())
+
+        activities_url = str.replace(CONST.DEVICE_ACTIVITIES_URL,
+                                     '$DEVID$', DEVICE.DEVID)
+        created_at = datetime.datetime(2018, 1, 1)
+
+        m.get(CONST.DEVICES_URL, text='[' + DEVICE.get_response_ok() + ']')
+        m.get(str.replace(CONST.DEVICE_URL, '$DEVID$', DEVICE.DEVID),
+              text=DEVICE.get_response_ok())
+        m.get(str.replace(CONST.DEVICE_AVATAR_URL, '$DEVID$', DEVICE.DEVID),
+              text=DEVICE_AVATAR.get_response_ok())
+        m.get(str.replace(CONST.DEVICE_INFO_URL, '$DEVID$', DEVICE.DEVID),
+              text=DEVICE_INFO.get_response_ok())
+        m.get(str.replace(CONST.DEVICE_SETTINGS_URL,
+                          '$DEVID$', DEVICE.DEVID),
+              text=DEVICE_SETTINGS.get_response_ok())
+
+        def _activities(video_state):
+            """Return the activities response with one motion activity."""
+            return '[' + DEVICE_ACTIVITIES.get_response_ok(
+                event=CONST.EVENT_MOTION, video_state=video_state,
+                created_at=created_at) + ']'
+
+        m.get(activities_url, text=_activities('processing'))
+
+        device = self.skybell.get_device(DEVICE.DEVID)
+        self.assertFalse(device.media_ready(device.latest()))
+
+        # The video finished processing between polls
+        m.get(activities_url, text=_activities(CONST.VIDEO_STATE_READY))
+        device.refresh()
+
+        self.assertEqual(len(device.activities(limit=10)), 1)
+        self.assertEqual(device.activities()[0].video_state,
+                         CONST.VIDEO_STATE_READY)
+        self.assertEqual(device.latest(CONST.EVENT_MOTION).video_state,
+                         CONST.VIDEO_STATE_READY)
+        self.assertTrue(device.media_ready(device.latest()))
+
+    @requests_mock.mock()
+    def tests_activity_history(self, m):
+        """Check that activities are kept and queried past the api window."""
+        m.post(CONST.LOGIN_URL, text=LOGIN.post_response_ok())
+
+        skybell = skybellpy.Skybell(username=USERNAME,
+                                    password=PASSWORD,
+                                    disable_cache=True,
+                                    login_sleep=False,
+                                    activity_retention=3)
+
+        # Set up device
+        device_text = '[' + DEVICE.get_response_ok() + ']'
+        device_url = str.replace(CONST.DEVICE_URL, '$DEVID$', DEVICE.DEVID)
+        avatar_url = str.replace(CONST.DEVICE_AVATAR_URL,
+                                 '$DEVID$', DEVICE.DEVID)
+        info_url = str.replace(CONST.DEVICE_INFO_URL, '$DEVID$', DEVICE.DEVID)
+        settings_url = str.replace(CONST.DEVICE_SETTINGS_URL,
+                                   '$DEVID$', DEVICE.DEVID)
+        activities_url = str.replace(CONST.DEVICE_ACTIVITIES_URL,
+                                     '$DEVID$', DEVICE.DEVID)
+
+        def _activity(activity_id, day, event=CONST.EVENT_MOTION):
+            """Return an activity json with an id and creation day."""
+            activity = json.loads(DEVICE_ACTIVITIES.get_response_ok(
+                event=event, created_at=datetime.datetime(2018, 1, day)))
+            activity[CONST.ID] = activity_id
+
+            return activity
+
+        first = _activity('first', 1, CONST.EVENT_BUTTON)
+        second = _activity('second', 2)
+        third = _activity('third', 3)
+
+        m.get(CONST.DEVICES_URL, text=device_text)
+        m.get(device_url, text=DEVICE.get_response_ok())
+        m.get(avatar_url, text=DEVICE_AVATAR.get_response_ok())
+        m.get(info_url, text=DEVICE_INFO.get_response_ok())
+        m.get(settings_url, text=DEVICE_SETTINGS.get_response_ok())
+        m.get(activities_url, text=json.dumps([second, first]))
+
+        device = skybell.get_device(DEVICE.DEVID)
+
+        # The api only returns its latest window, we keep the history
+        m.get(activities_url, text=json.dumps([third]))
+        device.refresh()
+
+        self.assertEqual(
+            [activity[CONST.ID] for activity in device.activities(limit=10)],
+            ['third', 'second', 'first'])
+        self.assertEqual(
+            [activity[CONST.ID] for activity in device.activities(
+                limit=10, since='2018-01-02T00:00:00Z',
+                until='2018-01-02T23:59:59Z')],
+            ['second'])
+        self.assertEqual(device.latest(CONST.EVENT_BUTTON), first)
+        self.assertEqual(device.latest(), third)
+
+        # Past the retention limit the oldest activity is evicted
+        device.add_activity(_activity('pushed', 4))
+
+        self.assertEqual(
+            [activity[CONST.ID] for activity in device.activities(limit=10)],
+            ['pushed', 'third', 'second'])
+        self.assertEqual(device.activities(event=CONST.EVENT_BUTTON), [])
+
+    @requests_mock.mock()
+    def tests_batch_settings(self, m):
+        """Check that batched settings are sent in a single PATCH."""
+        m.post(CONST.LOGIN_URL, text=LOGIN.post_response_ok())
+
+        settings_url = str.replace(CONST.DEVICE_SETTINGS_URL,
+                                   '$DEVID$', DEVICE.DEVID)
+
+        m.get(CONST.DEVICES_URL, text='[' + DEVICE.get_response_ok() + ']')
+        m.get(str.replace(CONST.DEVICE_AVATAR_URL, '$DEVID$', DEVICE.DEVID),
+              text=DEVICE_AVATAR.get_response_ok())
+        m.get(str.replace(CONST.DEVICE_INFO_URL, '$DEVID$', DEVICE.DEVID),
+              text=DEVICE_INFO.get_response_ok())
+        m.get(settings_url, text=DEVICE_SETTINGS.get_response_ok())
+        m.get(str.replace(CONST.DEVICE_ACTIVITIES_URL,
+                          '$DEVID$', DEVICE.DEVID),
+              text=DEVICE_ACTIVITIES.EMPTY_ACTIVITIES_RESPONSE)
+        patch = m.patch(settings_url, text=DEVICE_SETTINGS.PATCH_RESPONSE_OK)
+
+        device = self.skybell.get_device(DEVICE.DEVID)
+
+        with device.batch_settings():
+            device.do_not_disturb = True
+            device.led_rgb = (10, 20, 30)
+
+            with device.batch_settings():
+                device.motion_threshold = CONST.SETTINGS_MOTION_THRESHOLD_LOW
+
+            self.assertEqual(patch.call_count, 0)
+
+        self.assertEqual(patch.call_count, 1)
+        self.assertEqual(patch.last_request.json(), {
+            CONST.SETTINGS_DO_NOT_DISTURB: 'true',
+            CONST.SETTINGS_LED_R: 10,
+            CONST.SETTINGS_LED_G: 20,
+            CONST.SETTINGS_LED_B: 30,
+            CONST.SETTINGS_MOTION_THRESHOLD:
+                CONST.SETTINGS_MOTION_THRESHOLD_LOW
+        })
+        self.assertEqual(device.led_rgb, (10, 20, 30))
+
+        # An invalid setting discards the whole batch
+        with self.assertRaises(skybellpy.SkybellException):
+            with device.batch_settings():
+                device.led_intensity = 50
+                device.outdoor_chime_level = 'loud'
+
+        self.assertEqual(patch.call_count, 1)
+
+        device.apply_settings({CONST.SETTINGS_LED_INTENSITY: 50})
+        self.assertEqual(patch.call_count, 2)
+        self.assertEqual(device.led_intensity, 50)
+
+    @requests_mock.mock()
+    def tests_diff_settings(self, m):
+        """Check that settings already holding their value aren't sent."""
+        m.post(CONST.LOGIN_URL, text=LOGIN.post_response_ok())
+
+        settings_url = str.replace(CONST.DEVICE_SETTINGS_URL,
+                                   '$DEVID$', DEVICE.DEVID)
+
+        m.get(CONST.DEVICES_URL, text='[' + DEVICE.get_response_ok() + ']')
+        m.get(str.replace(CONST.DEVICE_AVATAR_URL, '$DEVID$', DEVICE.DEVID),
+              text=DEVICE_AVATAR.get_response_ok())
+        m.get(str.replace(CONST.DEVICE_INFO_URL, '$DEVID$', DEVICE.DEVID),
+              text=DEVICE_INFO.get_response_ok())
+        m.get(settings_url, text=DEVICE_SETTINGS.get_response_ok(
+            do_not_disturb=False, led_rgb=(255, 255, 255), led_intensity=100))
+        m.get(str.replace(CONST.DEVICE_ACTIVITIES_URL,
+                          '$DEVID$', DEVICE.DEVID),
+              text=DEVICE_ACTIVITIES.EMPTY_ACTIVITIES_RESPONSE)
+        patch = m.patch(settings_url, text=DEVICE_SETTINGS.PATCH_RESPONSE_OK)
+
+        device = self.skybell.get_device(DEVICE.DEVID)
+
+        # Re-asserting the current state sends nothing
+        device.do_not_disturb = False
+        device.led_rgb = (255, 255, 255)
+        self.assertEqual(patch.call_count, 0)
+
+        # Only the changed settings are sent
+        sent = device.apply_settings({
+            CONST.SETTINGS_LED_INTENSITY: 100,
+            CONST.SETTINGS_MOTION_THRESHOLD:
+                CONST.SETTINGS_MOTION_THRESHOLD_LOW})
+        self.assertEqual(sent, {CONST.SETTINGS_MOTION_THRESHOLD:
+                                CONST.SETTINGS_MOTION_THRESHOLD_LOW})
+        self.assertEqual(patch.call_count, 1)
+        self.assertEqual(patch.last_request.json(), sent)
+
+        stats = self.skybell.stats
+        self.assertEqual(stats[CONST.STAT_SUPPRESSED_WRITES], 2)
+        self.assertEqual(stats[CONST.STAT_SUPPRESSED_SETTINGS], 5)
+
+        # Forced writes are always sent
+        device.apply_settings({CONST.SETTINGS_LED_INTENSITY: 100},
+                              force=True)
+        self.assertEqual(patch.call_count, 2)
+
+        with device.batch_settings(force=True):
+            device.do_not_disturb = False
+
+        self.assertEqual(patch.call_count, 3)
+        self.assertEqual(patch.last_request.json(),
+                         {CONST.SETTINGS_DO_NOT_DISTURB: 'false'})
+
+    @requests_mock.mock()
+    def tests_optimistic_settings(self, m):
+        """Check that optimistic settings are confirmed or rolled back."""
+        self.skybell = skybellpy.Skybell(username=USERNAME,
+                                         password=PASSWORD,
+                                         disable_cache=True,
+                                         login_sleep=False,
+                                         optimistic_settings=True)
+
+        m.post(CONST.LOGIN_URL, text=LOGIN.post_response_ok())
+
+        settings_url = str.replace(CONST.DEVICE_SETTINGS_URL,
+                                   '$DEVID$', DEVICE.DEVID)
+        server = {'led_intensity': 100, 'do_not_disturb': False}
+        released = threading.Event()
+
+        def _get_settings(request, context):
+            """Return the settings the device currently holds."""
+            return DEVICE_SETTINGS.get_response_ok(**server)
+
+        def _patch_settings(request, context):
+            """Hold the write until released, then store it."""
+            released.wait(5)
+            server.update(request.json())
+            return DEVICE_SETTINGS.PATCH_RESPONSE_OK
+
+        m.get(CONST.DEVICES_URL, text='[' + DEVICE.get_response_ok() + ']')
+        m.get(str.replace(CONST.DEVICE_AVATAR_URL, '$DEVID$', DEVICE.DEVID),
+              text=DEVICE_AVATAR.get_response_ok())
+        m.get(str.replace(CONST.DEVICE_INFO_URL, '$DEVID$', DEVICE.DEVID),
+              text=DEVICE_INFO.get_response_ok())
+        m.get(settings_url, text=_get_settings)
+        m.get(str.replace(CONST.DEVICE_ACTIVITIES_URL,
+                          '$DEVID$', DEVICE.DEVID),
+              text=DEVICE_ACTIVITIES.EMPTY_ACTIVITIES_RESPONSE)
+        patch = m.patch(settings_url, text=_patch_settings)
+
+        device = self.skybell.get_device(DEVICE.DEVID)
+
+        # The new value shows at once, even over older responses
+        device.led_intensity = 50
+
+        self.assertEqual(device.led_intensity, 50)
+        self.assertEqual(device.setting_state(CONST.SETTINGS_LED_INTENSITY),
+                         CONST.SETTING_PENDING)
+
+        device.hydrate({CONST.ENDPOINT_SETTINGS:
+                        json.loads(_get_settings(None, None))})
+        self.assertEqual(device.led_intensity, 50)
+
+        released.set()
+
+        self.assertTrue(device.wait_for_settings(5))
+        self.assertEqual(patch.call_count, 1)
+        self.assertEqual(device.led_intensity, 50)
+        self.assertEqual(device.setting_state(CONST.SETTINGS_LED_INTENSITY),
+                         CONST.SETTING_CONFIRMED)
+
+        # A write the device doesn't keep takes the value it reports
+        m.patch(settings_url, text=DEVICE_SETTINGS.PATCH_RESPONSE_OK)
+
+        device.led_intensity = 75
+        self.assertTrue(device.wait_for_settings(5))
+        self.assertEqual(device.led_intensity, 50)
+        self.assertEqual(device.setting_state(CONST.SETTINGS_LED_INTENSITY),
+                         CONST.SETTING_FAILED)
+
+        # A failed write rolls back
+        released.clear()
+
+        def _reject_settings(request, context):
+            """Hold the write until released, then reject it."""
+            released.wait(5)
+            context.status_code = 400
+            return DEVICE_SETTINGS.PATHCH_RESPONSE_BAD_REQUEST
+
+        m.patch(settings_url, text=_reject_settings)
+
+        device.do_not_disturb = True
+        self.assertTrue(device.do_not_disturb)
+
+        released.set()
+
+        self.assertTrue(device.wait_for_settings(5))
+        self.assertFalse(device.do_not_disturb)
+        self.assertEqual(device.setting_state(CONST.SETTINGS_DO_NOT_DISTURB),
+                         CONST.SETTING_FAILED)
+        self.assertIsNone(device.setting_state(CONST.SETTINGS_VIDEO_PROFILE))
+
+    @requests_mock.mock()
+    def tests_optimistic_settings_bad_body(self, m):
+        """Check that a write answered without json is still settled."""
+        self.skybell = skybellpy.Skybell(username=USERNAME,
+                                         password=PASSWORD,
+                                         disable_cache=True,
+                                         login_sleep=False,
+                                         optimistic_settings=True)
+
+        m.post(CONST.LOGIN_URL, text=LOGIN.post_response_ok())
+
+        settings_url = str.replace(CONST.DEVICE_SETTINGS_URL,
+                                   '$DEVID$', DEVICE.DEVID)
+
+        m.get(CONST.DEVICES_URL, text='[' + DEVICE.get_response_ok() + ']')
+        m.get(str.replace(CONST.DEVICE_AVATAR_URL, '$DEVID$', DEVICE.DEVID),
+              text=DEVICE_AVATAR.get_response_ok())
+        m.get(str.replace(CONST.DEVICE_INFO_URL, '$DEVID$', DEVICE.DEVID),
+              text=DEVICE_INFO.get_response_ok())
+        m.get(settings_url,
+              text=DEVICE_SETTINGS.get_response_ok(led_intensity=100))
+        m.get(str.replace(CONST.DEVICE_ACTIVITIES_URL,
+                          '$DEVID$', DEVICE.DEVID),
+              text=DEVICE_ACTIVITIES.EMPTY_ACTIVITIES_RESPONSE)
+        m.get(str.replace(CONST.DEVICE_URL, '$DEVID$', DEVICE.DEVID),
+              text=DEVICE.get_response_ok())
+        m.patch(settings_url, text='', status_code=204)
+
+        device = self.skybell.get_device(DEVICE.DEVID)
+
+        # An empty write response rolls back like a failed write
+        device.led_intensity = 50
+
+        self.assertTrue(device.wait_for_settings(5))
+        self.assertEqual(device.led_intensity, 100)
+        self.assertEqual(device.setting_state(CONST.SETTINGS_LED_INTENSITY),
+                         CONST.SETTING_FAILED)
+
+        # A confirmation without json trusts the accepted write
+        m.patch(settings_url, text=DEVICE_SETTINGS.PATCH_RESPONSE_OK)
+        m.get(settings_url, text='')
+
+        device.led_intensity = 25
+
+        self.assertTrue(device.wait_for_settings(5))
+        self.assertEqual(device.led_intensity, 25)
+        self.assertEqual(device.setting_state(CONST.SETTINGS_LED_INTENSITY),
+                         CONST.SETTING_CONFIRMED)
+
+        # Later refreshes take the value the device reports again
+        m.get(settings_url,
+              text=DEVICE_SETTINGS.get_response_ok(led_intensity=75))
+
+        device.refresh(force=True)
+        self.assertEqual(device.led_intensity, 75)
@@ -0,0 +1,160 @@
+"""
+Test the Skybell image cache.
+
+Tests fetching avatars on change, the memory LRU and the thumbnails.
+"""
+import io
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import requests_mock
+
+import skybellpy
+from skybellpy.images import ImageCache
+from skybellpy.media import MediaCache
+import skybellpy.helpers.constants as CONST
+
+import tests.mock.login as LOGIN
+import tests.mock.device as DEVICE
+import tests.mock.device_avatar as DEVICE_AVATAR
+import tests.mock.device_info as DEVICE_INFO
+import tests.mock.device_settings as DEVICE_SETTINGS
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+USERNAME = 'foobar'
+PASSWORD = 'deadbeef'
+
+IMAGE_URL = 'https://images.example.com/avatar.jpg'
+
+
+def _thumbnail(data, size):
+    """Stand in for resizing by tagging the bytes with the size."""
+    return '{}x{}:'.format(*size).encode() + data
+
+
+class TestImages(unittest.TestCase):
+    """Test the image cache in skybellpy."""
+
+    def setUp(self):
+        """Set up Skybell with a temporary media cache."""
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.media_cache = MediaCache(self.tmpdir.name)
+        self.skybell = skybellpy.Skybell(username=USERNAME,
+                                         password=PASSWORD,
+                                         disable_cache=True,
+                                         login_sleep=False,
+                                         media_cache=self.media_cache)
+
+    def tearDown(self):
+        """Clean up after test."""
+        self.skybell.close()
+        self.tmpdir.cleanup()
+
+    @requests_mock.mock()
+    def tests_image_bytes(self, m):
+        """Check that avatars are only downloaded again once changed."""
+        m.post(CONST.LOGIN_URL, text=LOGIN.post_response_ok())
+
+        avatar_url = str.replace(CONST.DEVICE_AVATAR_URL,
+                                 '$DEVID$', DEVICE.DEVID)
+
+        m.get(CONST.DEVICES_URL, text='[' + DEVICE.get_response_ok() + ']')
+        m.get(str.replace(CONST.DEVICE_URL, '$DEVID$', DEVICE.DEVID),
+              text=DEVICE.get_response_ok())
+        m.get(avatar_url, text=DEVICE_AVATAR.get_response_ok('first'))
+        m.get(str.replace(CONST.DEVICE_INFO_URL, '$DEVID$', DEVICE.DEVID),
+              text=DEVICE_INFO.get_response_ok())
+        m.get(str.replace(CONST.DEVICE_SETTINGS_URL, '$DEVID$', DEVICE.DEVID),
+              text=DEVICE_SETTINGS.get_response_ok())
+        m.get(str.replace(CONST.DEVICE_ACTIVITIES_URL,
+                          '$DEVID$', DEVICE.DEVID), text='[]')
+
+        device = self.skybell.get_device(DEVICE.DEVID)
+        first = m.get(device.image, content=b'first')
+
+        self.assertEqual(device.image_bytes(), b'first')
+        self.assertEqual(device.image_bytes(), b'first')
+        self.assertEqual(first.call_count, 1)
+
+        # A new avatar is downloaded on the next use
+        avatar = json.loads(DEVICE_AVATAR.get_response_ok('second'))
+        avatar[CONST.CREATED_AT] = '2019-01-01T00:00:00.000Z'
+        m.get(avatar_url, text=json.dumps(avatar))
+        device.refresh(force=True)
+
+        second = m.get(device.image, content=b'second')
+
+        self.assertEqual(device.image_bytes(), b'second')
+        self.assertEqual(second.call_count, 1)
+
+    @requests_mock.mock()
+    def tests_memory_lru(self, m):
+        """Check that memory is bounded and the disk cache serves misses."""
+        for name in ('a', 'b', 'c'):
+            m.get(IMAGE_URL + name, content=name.encode() * 10)
+
+        cache = ImageCache(self.media_cache, max_size=20)
+
+        for name in ('a', 'b', 'a', 'c'):
+            cache.fetch(name, IMAGE_URL + name, self.skybell.stream)
+
+        self.assertEqual(m.call_count, 3)
+
+        # pylint: disable=protected-access
+        self.assertEqual(list(cache._images), ['a', 'c'])
+
+        self.assertEqual(cache.fetch('b', IMAGE_URL + 'b',
+                                     self.skybell.stream), b'b' * 10)
+        self.assertEqual(m.call_count, 3)
+
+    @requests_mock.mock()
+    def tests_thumbnails(self, m):
+        """Check that a thumbnail is generated once per image and size."""
+        m.get(IMAGE_URL, content=b'image')
+
+        with mock.patch('skybellpy.images._thumbnail',
+                        side_effect=_thumbnail) as thumbnail:
+            data = self.skybell.fetch_image('key', IMAGE_URL, (40, 30))
+            self.assertEqual(data, b'40x30:image')
+            self.skybell.fetch_image('key', IMAGE_URL, (40, 30))
+
+            # Memory is empty but the disk cache still has the thumbnail
+            cache = ImageCache(self.media_cache)
+            self.assertEqual(cache.fetch('key', IMAGE_URL,
+                                         self.skybell.stream, (40, 30)),
+                             b'40x30:image')
+
+            self.skybell.fetch_image('key', IMAGE_URL, (80, 60))
+
+        self.assertEqual(thumbnail.call_count, 2)
+        self.assertEqual(m.call_count, 1)
+
+    @unittest.skipIf(Image is None, "Pillow is not installed")
+    @requests_mock.mock()
+    def tests_pillow_thumbnail(self, m):
+        """Check that Pillow resizes images to fit the thumbnail size."""
+        image = io.BytesIO()
+        Image.new('RGB', (400, 300)).save(image, format='JPEG')
+        m.get(IMAGE_URL, content=image.getvalue())
+
+        data = self.skybell.fetch_image('key', IMAGE_URL, (40, 40))
+
+        self.assertEqual(Image.open(io.BytesIO(data)).size, (40, 30))
+
+    @unittest.skipIf(Image is not None, "Pillow is installed")
+    @requests_mock.mock()
+    def tests_thumbnails_unavailable(self, m):
+        """Check that thumbnails without Pillow raise an exception."""
+        m.get(IMAGE_URL, content=b'image')
+
+        with self.assertRaises(skybellpy.SkybellException):
+            self.skybell.fetch_image('key', IMAGE_URL, (40, 30))
+
+        self.assertTrue(os.listdir(self.tmpdir.name))
@@ -0,0 +1,172 @@
+"""
+Test the Skybell media cache.
+
+Tests streaming, resuming, deduplicating and evicting activity media.
+"""
+import datetime
+import hashlib
+import io
+import json
+import os
+import tempfile
+import unittest
+
+import requests
+import requests_mock
+
+import skybellpy
+from skybellpy.media import MediaCache
+import skybellpy.helpers.constants as CONST
+
+import tests.mock.login as LOGIN
+import tests.mock.device as DEVICE
+import tests.mock.device_avatar as DEVICE_AVATAR
+import tests.mock.device_info as DEVICE_INFO
+import tests.mock.device_settings as DEVICE_SETTINGS
+import tests.mock.device_activities as DEVICE_ACTIVITIES
+
+USERNAME = 'foobar'
+PASSWORD = 'deadbeef'
+
+MEDIA_URL = 'https://media.example.com/video.mp4'
+MEDIA = bytes(range(256)) * 64
+
+
+class _DroppedBody(io.BytesIO):
+    """Response body whose connection drops after the first read."""
+
+    def __init__(self, data, size):
+        """Set up the body, only size bytes arrive."""
+        super(_DroppedBody, self).__init__(data)
+        self._size = size
+
+    def read(self, *args):
+        """Read until the connection drops."""
+        if self.tell() >= self._size:
+            raise requests.exceptions.ConnectionError('dropped')
+
+        return super(_DroppedBody, self).read(self._size - self.tell())
+
+
+class TestMedia(unittest.TestCase):
+    """Test the media cache in skybellpy."""
+
+    def setUp(self):
+        """Set up Skybell with a temporary media cache."""
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.skybell = skybellpy.Skybell(
+            username=USERNAME,
+            password=PASSWORD,
+            disable_cache=True,
+            login_sleep=False,
+            max_workers=2,
+            media_cache=MediaCache(self.tmpdir.name,
+                                   max_size=(len(MEDIA) + 1) * 2,
+                                   chunk_size=1024))
+
+    def tearDown(self):
+        """Clean up after test."""
+        self.skybell.close()
+        self.tmpdir.cleanup()
+
+    @requests_mock.mock()
+    def tests_resume(self, m):
+        """Check that an interrupted download resumes where it stopped."""
+        m.get(MEDIA_URL, body=_DroppedBody(MEDIA, 5000))
+
+        with self.assertRaises(skybellpy.SkybellException):
+            self.skybell.fetch_media('key', MEDIA_URL)
+
+        offsets = []
+
+        def _rest(request, context):
+            """Return the requested range of the media."""
+            offsets.append(int(request.headers['Range'][6:-1]))
+            context.status_code = CONST.HTTP_PARTIAL_CONTENT
+
+            return MEDIA[offsets[-1]:]
+
+        m.get(MEDIA_URL, content=_rest)
+
+        path = self.skybell.fetch_media('key', MEDIA_URL)
+        self.assertGreater(offsets[0], 0)
+
+        with open(path, 'rb') as handle:
+            self.assertEqual(handle.read(), MEDIA)
+
+        self.assertEqual(os.path.basename(path),
+                         hashlib.sha256(MEDIA).hexdigest())
+
+        # Cached media isn't requested again
+        call_count = m.call_count
+        self.assertEqual(self.skybell.fetch_media('key', MEDIA_URL), path)
+        self.assertEqual(m.call_count, call_count)
+
+    @requests_mock.mock()
+    def tests_dedupe_and_evict(self, m):
+        """Check that media is stored once and evicted least recent first."""
+        for index in range(3):
+            m.get(MEDIA_URL + str(index), content=MEDIA + bytes([index]))
+
+        m.get(MEDIA_URL + 'copy', content=MEDIA + bytes([0]))
+
+        first = self.skybell.fetch_media('first', MEDIA_URL + '0')
+        copy = self.skybell.fetch_media('copy', MEDIA_URL + 'copy')
+        self.assertEqual(first, copy)
+
+        second = self.skybell.fetch_media('second', MEDIA_URL + '1')
+
+        # Using the first media makes the second the least recently used
+        os.utime(second, (0, 0))
+        self.skybell.fetch_media('first', MEDIA_URL + '0')
+
+        third = self.skybell.fetch_media('third', MEDIA_URL + '2')
+
+        self.assertTrue(os.path.exists(first))
+        self.assertTrue(os.path.exists(third))
+        self.assertFalse(os.path.exists(second))
+
+    @requests_mock.mock()
+    def tests_download_recent(self, m):
+        """Check that recent activity media is downloaded for all devices."""
+        m.post(CONST.LOGIN_URL, text=LOGIN.post_response_ok())
+
+        def _activity(activity_id, day, video_state):
+            """Return an activity json with its own media url."""
+            activity = json.loads(DEVICE_ACTIVITIES.get_response_ok(
+                video_state=video_state,
+                created_at=datetime.datetime(2018, 1, day)))
+            activity[CONST.ID] = activity_id
+            activity[CONST.MEDIA_URL] = MEDIA_URL + activity_id
+
+            return activity
+
+        activities_url = str.replace(CONST.DEVICE_ACTIVITIES_URL,
+                                     '$DEVID$', DEVICE.DEVID)
+
+        m.get(CONST.DEVICES_URL, text='[' + DEVICE.get_response_ok() + ']')
+        m.get(str.replace(CONST.DEVICE_AVATAR_URL, '$DEVID$', DEVICE.DEVID),
+              text=DEVICE_AVATAR.get_response_ok())
+        m.get(str.replace(CONST.DEVICE_INFO_URL, '$DEVID$', DEVICE.DEVID),
+              text=DEVICE_INFO.get_response_ok())
+        m.get(str.replace(CONST.DEVICE_SETTINGS_URL, '$DEVID$', DEVICE.DEVID),
+              text=DEVICE_SETTINGS.get_response_ok())
+        m.get(activities_url, text=json.dumps([
+            _activity('new', 3, 'download:pending'),
+            _activity('ready', 2, CONST.VIDEO_STATE_READY),
+            _activity('old', 1, CONST.VIDEO_STATE_READY)]))
+        m.get(MEDIA_URL + 'ready', content=MEDIA)
+
+        paths, errors = self.skybell.download_media(limit=2)
+
+        # Media still being processed isn't downloaded
+        self.assertEqual(errors, {})
+        self.assertEqual(list(paths), [(DEVICE.DEVID, 'ready')])
+
+        device = self.skybell.get_device(DEVICE.DEVID)
+
+        with self.assertRaises(skybellpy.SkybellException):
+            device.download_media()
+
+        self.assertEqual(device.download_media(device.activities(2)[1]),
+                         paths[(DEVICE.DEVID, 'ready')])
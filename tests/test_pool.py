@@ -0,0 +1,96 @@
+"""
+Test the Skybell connection pool.
+
+Tests pool sizing, connection reuse across logins and the pool stats.
+"""
+import threading
+import unittest
+
+import requests_mock
+
+import skybellpy
+import skybellpy.helpers.constants as CONST
+
+import tests.mock.login as LOGIN
+from tests.mock.api_server import ApiServer
+
+USERNAME = 'foobar'
+PASSWORD = 'deadbeef'
+
+
+class TestPool(unittest.TestCase):
+    """Test the connection pool used by skybellpy."""
+
+    def setUp(self):
+        """Set up the api server."""
+        self.server = ApiServer(delay=0.05)
+        self.server.start()
+
+    def tearDown(self):
+        """Clean up after test."""
+        self.server.stop()
+
+    def _skybell(self, **kwargs):
+        """Create a Skybell instance that already has an access token."""
+        skybell = skybellpy.Skybell(username=USERNAME,
+                                    password=PASSWORD,
+                                    disable_cache=True,
+                                    login_sleep=False,
+                                    **kwargs)
+        skybell.update_cache({CONST.ACCESS_TOKEN: 'token'})
+
+        return skybell
+
+    def tests_connection_reuse(self):
+        """Check that sequential requests reuse one warm connection."""
+        skybell = self._skybell()
+
+        for _ in range(5):
+            skybell.send_request('get', self.server.url)
+
+        stats = skybell.stats
+        self.assertEqual(stats[CONST.STAT_CONNECTIONS_OPENED], 1)
+        self.assertEqual(stats[CONST.STAT_CONNECTIONS_REUSED], 4)
+        self.assertEqual(stats[CONST.STAT_CONNECTIONS_WAITED], 0)
+
+    def tests_pool_block(self):
+        """Check that a blocking pool never opens more than its size."""
+        skybell = self._skybell(pool_size=2, pool_block=True)
+
+        threads = [threading.Thread(target=skybell.send_request,
+                                    args=('get', self.server.url))
+                   for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        stats = skybell.stats
+        self.assertLessEqual(stats[CONST.STAT_CONNECTIONS_OPENED], 2)
+        self.assertGreater(stats[CONST.STAT_CONNECTIONS_WAITED], 0)
+
+    def tests_keep_alive_disabled(self):
+        """Check that disabling keep-alive opens a connection per request."""
+        skybell = self._skybell(keep_alive=False)
+
+        for _ in range(3):
+            skybell.send_request('get', self.server.url)
+
+        self.assertEqual(skybell.stats[CONST.STAT_CONNECTIONS_OPENED], 3)
+
+    def tests_session_kept_across_logins(self):
+        """Check that logging in again keeps the connection pool."""
+        skybell = self._skybell()
+
+        # pylint: disable=protected-access
+        session = skybell._session
+
+        with requests_mock.mock() as m:
+            m.post(CONST.LOGIN_URL, text=LOGIN.post_response_ok())
+            skybell.login()
+
+        self.assertIs(skybell._session, session)
+
+        skybell.send_request('get', self.server.url)
+        skybell.send_request('get', self.server.url)
+        self.assertEqual(skybell.stats[CONST.STAT_CONNECTIONS_OPENED], 1)
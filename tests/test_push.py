@@ -0,0 +1,178 @@
+"""
+Test the Skybell push subsystem.
+
+Tests SkybellPush against a local stand-in socket.io server.
+"""
+import json
+import threading
+import time
+import unittest
+
+import requests_mock
+
+import skybellpy
+from skybellpy.push import SkybellPush, _decode_payload, _encode_payload
+import skybellpy.helpers.constants as CONST
+
+import tests.mock.login as LOGIN
+import tests.mock.device as DEVICE
+import tests.mock.device_avatar as DEVICE_AVATAR
+import tests.mock.device_info as DEVICE_INFO
+import tests.mock.device_settings as DEVICE_SETTINGS
+import tests.mock.device_activities as DEVICE_ACTIVITIES
+from tests.mock.push_server import PushServer
+
+USERNAME = 'foobar'
+PASSWORD = 'deadbeef'
+
+
+def _wait_for(condition, timeout=5):
+    """Wait until condition() is true."""
+    end = time.monotonic() + timeout
+
+    while not condition():
+        if time.monotonic() > end:
+            return False
+
+        time.sleep(0.01)
+
+    return True
+
+
+class TestPush(unittest.TestCase):
+    """Test the SkybellPush class in skybellpy."""
+
+    def setUp(self):
+        """Set up Skybell module and the push server."""
+        self.skybell = skybellpy.Skybell(username=USERNAME,
+                                         password=PASSWORD,
+                                         disable_cache=True,
+                                         login_sleep=False)
+        self.server = PushServer()
+        self.server.start()
+
+    def tearDown(self):
+        """Clean up after test."""
+        self.skybell = None
+
+    def tests_payload_encoding(self):
+        """Check the engine.io payload framing."""
+        self.assertEqual(_encode_payload(['2', '42["a"]']), '1:27:42["a"]')
+        self.assertEqual(_decode_payload('1:27:42["a"]'), ['2', '42["a"]'])
+        self.assertEqual(_decode_payload('2\x1e42["a"]'), ['2', '42["a"]'])
+
+    @requests_mock.mock(real_http=True)
+    def tests_push_events(self, m):
+        """Check that pushed activities reach the device and callbacks."""
+        m.post(CONST.LOGIN_URL, text=LOGIN.post_response_ok())
+        m.post(CONST.REGISTER_URL, text='{}')
+
+        # Set up device
+        device_text = '[' + DEVICE.get_response_ok() + ']'
+        device_url = str.replace(CONST.DEVICE_URL, '$DEVID$', DEVICE.DEVID)
+        avatar_url = str.replace(CONST.DEVICE_AVATAR_URL,
+                                 '$DEVID$', DEVICE.DEVID)
+        info_url = str.replace(CONST.DEVICE_INFO_URL, '$DEVID$', DEVICE.DEVID)
+        settings_url = str.replace(CONST.DEVICE_SETTINGS_URL,
+                                   '$DEVID$', DEVICE.DEVID)
+        activities_url = str.replace(CONST.DEVICE_ACTIVITIES_URL,
+                                     '$DEVID$', DEVICE.DEVID)
+
+        m.get(CONST.DEVICES_URL, text=device_text)
+        m.get(device_url, text=DEVICE.get_response_ok())
+        m.get(avatar_url, text=DEVICE_AVATAR.get_response_ok())
+        m.get(info_url, text=DEVICE_INFO.get_response_ok())
+        m.get(settings_url, text=DEVICE_SETTINGS.get_response_ok())
+        m.get(activities_url, text=DEVICE_ACTIVITIES.EMPTY_ACTIVITIES_RESPONSE)
+
+        device = self.skybell.get_device(DEVICE.DEVID)
+
+        received = []
+        pushed = threading.Event()
+
+        def _callback(dev, activity):
+            """Record a pushed activity."""
+            received.append((dev, activity))
+            pushed.set()
+
+        device.add_callback(_callback, CONST.EVENT_MOTION)
+
+        push = SkybellPush(self.skybell, url=self.server.url,
+                           fallback_interval=0.05)
+        push.start()
+
+        self.assertTrue(_wait_for(lambda: push.connected))
+
+        register = [request for request in m.request_history
+                    if request.url == CONST.REGISTER_URL]
+        self.assertEqual(register[0].json()['protocol'], 'socketio')
+
+        # Button events don't reach the motion callback
+        self.server.push_event('activity', json.loads(
+            DEVICE_ACTIVITIES.get_response_ok(event=CONST.EVENT_BUTTON)))
+
+        motion = json.loads(DEVICE_ACTIVITIES.get_response_ok(
+            event=CONST.EVENT_MOTION))
+        motion[CONST.ID] = 'motionId'
+        self.server.push_event('activity', motion)
+
+        self.assertTrue(pushed.wait(5))
+        self.assertEqual(received, [(device, motion)])
+        self.assertEqual(len(device.activities(limit=10)), 2)
+        self.assertEqual(device.latest(CONST.EVENT_MOTION), motion)
+
+        # Losing the connection falls back to polling
+        polls = len([request for request in m.request_history
+                     if request.url == activities_url])
+        self.server.stop()
+
+        self.assertTrue(_wait_for(lambda: not push.connected))
+        self.assertTrue(_wait_for(
+            lambda: len([request for request in m.request_history
+                         if request.url == activities_url]) > polls))
+
+        push.stop()
+
+    @requests_mock.mock()
+    def tests_invalid_handshake(self, m):
+        """Check that a handshake without a sid falls back to polling."""
+        push_url = 'https://push.example.com/'
+
+        m.post(CONST.LOGIN_URL, text=LOGIN.post_response_ok())
+        m.get(push_url.rstrip('/') + CONST.PUSH_PATH,
+              text=_encode_payload(['0' + json.dumps({'upgrades': []})]))
+
+        # Set up device
+        activities_url = str.replace(CONST.DEVICE_ACTIVITIES_URL,
+                                     '$DEVID$', DEVICE.DEVID)
+
+        m.get(CONST.DEVICES_URL, text='[' + DEVICE.get_response_ok() + ']')
+        m.get(str.replace(CONST.DEVICE_URL, '$DEVID$', DEVICE.DEVID),
+              text=DEVICE.get_response_ok())
+        m.get(str.replace(CONST.DEVICE_AVATAR_URL, '$DEVID$', DEVICE.DEVID),
+              text=DEVICE_AVATAR.get_response_ok())
+        m.get(str.replace(CONST.DEVICE_INFO_URL, '$DEVID$', DEVICE.DEVID),
+              text=DEVICE_INFO.get_response_ok())
+        m.get(str.replace(CONST.DEVICE_SETTINGS_URL, '$DEVID$', DEVICE.DEVID),
+              text=DEVICE_SETTINGS.get_response_ok())
+        m.get(activities_url, text=DEVICE_ACTIVITIES.EMPTY_ACTIVITIES_RESPONSE)
+
+        push = self.skybell.start_push(register=False, url=push_url,
+                                       fallback_interval=0.05)
+        self.assertIs(self.skybell.start_push(), push)
+
+        # Test
+        self.assertTrue(_wait_for(
+            lambda: len([request for request in m.request_history
+                         if request.url == activities_url]) > 1))
+        self.assertFalse(push.connected)
+
+        # Closing the client stops the push thread
+        self.skybell.close()
+
+        polls = m.call_count
+        time.sleep(0.2)
+        self.assertEqual(m.call_count, polls)
+        self.assertIsNot(self.skybell.start_push(register=False,
+                                                 url=push_url), push)
+        self.skybell.stop_push()
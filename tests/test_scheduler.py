@@ -0,0 +1,137 @@
+"""
+Test the Skybell polling scheduler.
+
+Tests the request budget and the adaptive, jittered device polling.
+"""
+import calendar
+import time
+import unittest
+
+import requests_mock
+
+import skybellpy
+from skybellpy.scheduler import RateLimiter, SkybellScheduler
+import skybellpy.helpers.constants as CONST
+
+import tests.mock.login as LOGIN
+import tests.mock.device as DEVICE
+import tests.mock.device_avatar as DEVICE_AVATAR
+import tests.mock.device_info as DEVICE_INFO
+import tests.mock.device_settings as DEVICE_SETTINGS
+import tests.mock.device_activities as DEVICE_ACTIVITIES
+
+USERNAME = 'foobar'
+PASSWORD = 'deadbeef'
+
+NOW = calendar.timegm((2018, 6, 1, 12, 0, 0))
+
+
+class FakeDevice():
+    """Device stand-in with a fixed status and latest activities."""
+
+    def __init__(self, is_up=True, events=None):
+        """Set up the fake device."""
+        self.is_up = is_up
+        self._events = events or {}
+
+    def latest(self, event=None):
+        """Return the latest activity for an event."""
+        return self._events.get(event)
+
+
+def _activity(seconds_ago):
+    """Return an activity created some seconds before NOW."""
+    created_at = time.strftime('%Y-%m-%dT%H:%M:%S.000Z',
+                               time.gmtime(NOW - seconds_ago))
+    return {CONST.CREATED_AT: created_at}
+
+
+class TestScheduler(unittest.TestCase):
+    """Test the polling scheduler in skybellpy."""
+
+    def setUp(self):
+        """Set up Skybell module."""
+        self.skybell = skybellpy.Skybell(username=USERNAME,
+                                         password=PASSWORD,
+                                         disable_cache=True,
+                                         login_sleep=False)
+
+    def tearDown(self):
+        """Clean up after test."""
+        self.skybell.stop_polling()
+        self.skybell = None
+
+    def tests_rate_limiter(self):
+        """Check that the rate limiter spaces out requests."""
+        limiter = RateLimiter(50)
+
+        start = time.monotonic()
+        for _ in range(6):
+            limiter.acquire()
+
+        # The first token is free, the other five wait 20ms each
+        self.assertGreaterEqual(time.monotonic() - start, 0.09)
+
+    def tests_adaptive_intervals(self):
+        """Check that active devices poll faster and idle ones slower."""
+        scheduler = SkybellScheduler(self.skybell, interval=60,
+                                     active_interval=15, idle_interval=300,
+                                     down_interval=600, active_window=300,
+                                     idle_window=86400)
+
+        active = FakeDevice(events={CONST.EVENT_BUTTON: _activity(30)})
+        self.assertEqual(scheduler.interval_for(active, NOW), 15)
+
+        recent = FakeDevice(events={CONST.EVENT_MOTION: _activity(3600),
+                                    CONST.EVENT_BUTTON: _activity(7200)})
+        self.assertEqual(scheduler.interval_for(recent, NOW), 60)
+
+        idle = FakeDevice(events={CONST.EVENT_MOTION: _activity(172800)})
+        self.assertEqual(scheduler.interval_for(idle, NOW), 300)
+        self.assertEqual(scheduler.interval_for(FakeDevice(), NOW), 300)
+
+        down = FakeDevice(is_up=False,
+                          events={CONST.EVENT_BUTTON: _activity(30)})
+        self.assertEqual(scheduler.interval_for(down, NOW), 600)
+
+    @requests_mock.mock()
+    def tests_polling(self, m):
+        """Check that polling refreshes the devices in the background."""
+        m.post(CONST.LOGIN_URL, text=LOGIN.post_response_ok())
+
+        # Set up device
+        device_text = '[' + DEVICE.get_response_ok() + ']'
+        device_url = str.replace(CONST.DEVICE_URL, '$DEVID$', DEVICE.DEVID)
+        avatar_url = str.replace(CONST.DEVICE_AVATAR_URL,
+                                 '$DEVID$', DEVICE.DEVID)
+        info_url = str.replace(CONST.DEVICE_INFO_URL, '$DEVID$', DEVICE.DEVID)
+        settings_url = str.replace(CONST.DEVICE_SETTINGS_URL,
+                                   '$DEVID$', DEVICE.DEVID)
+        activities_url = str.replace(CONST.DEVICE_ACTIVITIES_URL,
+                                     '$DEVID$', DEVICE.DEVID)
+
+        m.get(CONST.DEVICES_URL, text=device_text)
+        m.get(device_url, text=DEVICE.get_response_ok())
+        m.get(avatar_url, text=DEVICE_AVATAR.get_response_ok())
+        m.get(info_url, text=DEVICE_INFO.get_response_ok())
+        m.get(settings_url, text=DEVICE_SETTINGS.get_response_ok())
+        m.get(activities_url, text=DEVICE_ACTIVITIES.EMPTY_ACTIVITIES_RESPONSE)
+
+        self.skybell.get_devices()
+        fetched = m.call_count
+
+        self.skybell.start_polling(interval=0.05, active_interval=0.05,
+                                   idle_interval=0.05, down_interval=0.05,
+                                   jitter=0)
+
+        end = time.monotonic() + 5
+        while m.call_count < fetched + 10 and time.monotonic() < end:
+            time.sleep(0.01)
+
+        self.skybell.stop_polling()
+        self.assertGreaterEqual(m.call_count, fetched + 10)
+
+        # Nothing is refreshed once polling stops
+        stopped = m.call_count
+        time.sleep(0.1)
+        self.assertEqual(m.call_count, stopped)
@@ -0,0 +1,150 @@
+"""
+Test the device setting schema.
+
+Tests that the registry covers every setting and keeps the validation
+rules of the setters. The timing against the if-chain it replaced only
+runs with SKYBELLPY_BENCHMARK set, timings aren't reliable under coverage
+or on a loaded machine.
+"""
+import os
+import timeit
+import unittest
+
+import skybellpy
+import skybellpy.helpers.constants as CONST
+import skybellpy.helpers.errors as ERROR
+import skybellpy.settings as SETTINGS
+
+VALID = [
+    (CONST.SETTINGS_DO_NOT_DISTURB, 'true'),
+    (CONST.SETTINGS_OUTDOOR_CHIME, CONST.SETTINGS_OUTDOOR_CHIME_LOW),
+    (CONST.SETTINGS_MOTION_POLICY, CONST.SETTINGS_MOTION_POLICY_ON),
+    (CONST.SETTINGS_MOTION_THRESHOLD, CONST.SETTINGS_MOTION_THRESHOLD_HIGH),
+    (CONST.SETTINGS_VIDEO_PROFILE, CONST.SETTINGS_VIDEO_PROFILE_480P),
+    (CONST.SETTINGS_LED_R, 0),
+    (CONST.SETTINGS_LED_G, 128),
+    (CONST.SETTINGS_LED_B, 255),
+    (CONST.SETTINGS_LED_INTENSITY, 100)
+]
+
+INVALID = [
+    (CONST.SETTINGS_DO_NOT_DISTURB, True),
+    (CONST.SETTINGS_OUTDOOR_CHIME, 'bamboo'),
+    (CONST.SETTINGS_OUTDOOR_CHIME, [1]),
+    (CONST.SETTINGS_MOTION_POLICY, 'dumbo'),
+    (CONST.SETTINGS_MOTION_THRESHOLD, 51),
+    (CONST.SETTINGS_VIDEO_PROFILE, 'alpha'),
+    (CONST.SETTINGS_LED_R, -1),
+    (CONST.SETTINGS_LED_G, 256),
+    (CONST.SETTINGS_LED_B, 'peaches'),
+    (CONST.SETTINGS_LED_INTENSITY, 101),
+    ('bogus', 1)
+]
+
+
+def _chain_validate_setting(setting, value):
+    """Validate the setting and value the way the if-chain did."""
+    if setting not in CONST.ALL_SETTINGS:
+        raise skybellpy.SkybellException(ERROR.INVALID_SETTING, setting)
+
+    if setting == CONST.SETTINGS_DO_NOT_DISTURB:
+        if value not in CONST.SETTINGS_DO_NOT_DISTURB_VALUES:
+            raise skybellpy.SkybellException(ERROR.INVALID_SETTING_VALUE,
+                                             (setting, value))
+
+    if setting == CONST.SETTINGS_OUTDOOR_CHIME:
+        if value not in CONST.SETTINGS_OUTDOOR_CHIME_VALUES:
+            raise skybellpy.SkybellException(ERROR.INVALID_SETTING_VALUE,
+                                             (setting, value))
+
+    if setting == CONST.SETTINGS_MOTION_POLICY:
+        if value not in CONST.SETTINGS_MOTION_POLICY_VALUES:
+            raise skybellpy.SkybellException(ERROR.INVALID_SETTING_VALUE,
+                                             (setting, value))
+
+    if setting == CONST.SETTINGS_MOTION_THRESHOLD:
+        if value not in CONST.SETTINGS_MOTION_THRESHOLD_VALUES:
+            raise skybellpy.SkybellException(ERROR.INVALID_SETTING_VALUE,
+                                             (setting, value))
+
+    if setting == CONST.SETTINGS_VIDEO_PROFILE:
+        if value not in CONST.SETTINGS_VIDEO_PROFILE_VALUES:
+            raise skybellpy.SkybellException(ERROR.INVALID_SETTING_VALUE,
+                                             (setting, value))
+
+    if setting in CONST.SETTINGS_LED_COLOR:
+        if (value < CONST.SETTINGS_LED_VALUES[0] or
+                value > CONST.SETTINGS_LED_VALUES[1]):
+            raise skybellpy.SkybellException(ERROR.INVALID_SETTING_VALUE,
+                                             (setting, value))
+
+    if setting == CONST.SETTINGS_LED_INTENSITY:
+        if not isinstance(value, int):
+            raise skybellpy.SkybellException(
+                ERROR.COLOR_INTENSITY_NOT_VALID, value)
+
+        if (value < CONST.SETTINGS_LED_INTENSITY_VALUES[0] or
+                value > CONST.SETTINGS_LED_INTENSITY_VALUES[1]):
+            raise skybellpy.SkybellException(ERROR.INVALID_SETTING_VALUE,
+                                             (setting, value))
+
+
+class TestSettings(unittest.TestCase):
+    """Test the setting schema in skybellpy."""
+
+    def tests_registry(self):
+        """Check that every setting has a schema enforcing its values."""
+        self.assertEqual(sorted(SETTINGS.SCHEMA), sorted(CONST.ALL_SETTINGS))
+
+        for setting, value in VALID:
+            SETTINGS.validate_setting(setting, value)
+            _chain_validate_setting(setting, value)
+
+        for setting, value in INVALID:
+            with self.assertRaises(skybellpy.SkybellException):
+                SETTINGS.validate_setting(setting, value)
+
+        with self.assertRaises(skybellpy.SkybellException) as context:
+            SETTINGS.validate_setting(CONST.SETTINGS_LED_INTENSITY, 'purple')
+
+        self.assertEqual(context.exception.errcode,
+                         ERROR.COLOR_INTENSITY_NOT_VALID[0])
+
+    def tests_encoding(self):
+        """Check that settings are encoded and parsed for the api."""
+        self.assertEqual(SETTINGS.encode_setting(
+            CONST.SETTINGS_DO_NOT_DISTURB, True), 'true')
+        self.assertEqual(SETTINGS.encode_setting(
+            CONST.SETTINGS_LED_INTENSITY, 50), 50)
+
+        self.assertEqual(SETTINGS.parse_setting('do_not_disturb=False'),
+                         (CONST.SETTINGS_DO_NOT_DISTURB, 'false'))
+        self.assertEqual(SETTINGS.parse_setting('led_intensity = 50'),
+                         (CONST.SETTINGS_LED_INTENSITY, 50))
+        self.assertEqual(SETTINGS.parse_setting('motion_policy=disabled'),
+                         (CONST.SETTINGS_MOTION_POLICY,
+                          CONST.SETTINGS_MOTION_POLICY_OFF))
+
+        for text in ('led_intensity', 'led_intensity=bright',
+                     'led_intensity=500', 'bogus=1'):
+            with self.assertRaises(skybellpy.SkybellException):
+                SETTINGS.parse_setting(text)
+
+    @unittest.skipUnless(os.environ.get('SKYBELLPY_BENCHMARK'),
+                         "SKYBELLPY_BENCHMARK is not set")
+    def tests_benchmark(self):
+        """Check that the registry validates faster than the if-chain."""
+        def _registry():
+            """Validate every valid setting through the registry."""
+            for setting, value in VALID:
+                SETTINGS.validate_setting(setting, value)
+
+        def _chain():
+            """Validate every valid setting through the if-chain."""
+            for setting, value in VALID:
+                _chain_validate_setting(setting, value)
+
+        registry = min(timeit.repeat(_registry, number=2000, repeat=5))
+        chain = min(timeit.repeat(_chain, number=2000, repeat=5))
+
+        self.assertLess(registry, chain)
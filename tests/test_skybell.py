@@ -5,6 +5,8 @@ Tests the system initialization and attributes of the main Skybell class.
 """
 import os
 import json
+import threading
+import time
 import unittest
 
 import requests
@@ -20,6 +22,7 @@ import tests.mock.device_avatar as DEVICE_AVATAR
 import tests.mock.device_info as DEVICE_INFO
 import tests.mock.device_settings as DEVICE_SETTINGS
 import tests.mock.device_activities as DEVICE_ACTIVITIES
+import tests.mock.subscriptions as SUBSCRIPTIONS
 
 USERNAME = 'foobar'
 PASSWORD = 'deadbeef'
@@ -156,8 +159,9 @@ class TestSkybell(unittest.TestCase):
 
         self.assertIsNone(self.skybell._cache['access_token'])
         self.assertIsNone(self.skybell._devices)
-        self.assertIsNotNone(self.skybell._session)
-        self.assertNotEqual(self.skybell._session, original_session)
+
+        # The connection pool outlives the login
+        self.assertEqual(self.skybell._session, original_session)
 
         self.skybell.logout()
 
@@ -216,6 +220,212 @@ class TestSkybell(unittest.TestCase):
 
         self.skybell.logout()
 
+    @requests_mock.mock()
+    def tests_single_flight_login(self, m):
+        """Check that concurrent callers share a single login."""
+        def _login(request, context):
+            """Answer the login slowly so the callers overlap."""
+            time.sleep(0.05)
+            return LOGIN.post_response_ok()
+
+        m.post(CONST.LOGIN_URL, text=_login)
+        m.get(CONST.DEVICES_URL, text=DEVICE.EMPTY_DEVICE_RESPONSE)
+
+        start = threading.Barrier(10)
+        errors = []
+
+        def _request():
+            """Send a request that needs a token."""
+            try:
+                start.wait()
+                self.skybell.send_request('get', CONST.DEVICES_URL)
+            except Exception as exc:  # pylint: disable=broad-except
+                errors.append(exc)
+
+        threads = [threading.Thread(target=_request) for _ in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+
+        logins = [request for request in m.request_history
+                  if request.url == CONST.LOGIN_URL]
+        self.assertEqual(len(logins), 1)
+
+        # A rejected token is only replaced once for everyone
+        m.get(CONST.DEVICES_URL, [
+            {'text': MOCK.UNAUTORIZED, 'status_code': 401},
+            {'text': DEVICE.EMPTY_DEVICE_RESPONSE, 'status_code': 200}
+        ])
+
+        threads = [threading.Thread(target=_request) for _ in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+
+        logins = [request for request in m.request_history
+                  if request.url == CONST.LOGIN_URL]
+        self.assertEqual(len(logins), 2)
+
+    @requests_mock.mock()
+    def tests_logout_during_devices(self, m):
+        """Check that a logout while devices are listed can't deadlock."""
+        logouts = []
+
+        def _devices(request, context):
+            """Log out from another thread, then reject the token."""
+            if logouts:
+                return DEVICE.EMPTY_DEVICE_RESPONSE
+
+            logout = threading.Thread(target=self.skybell.logout)
+            logout.daemon = True
+            logout.start()
+            logouts.append(logout)
+
+            # Let the logout take whatever locks it can get
+            logout.join(0.1)
+
+            context.status_code = 401
+            return MOCK.UNAUTORIZED
+
+        m.post(CONST.LOGIN_URL, text=LOGIN.post_response_ok())
+        m.get(CONST.DEVICES_URL, text=_devices)
+
+        self.skybell.login()
+
+        devices = []
+        listing = threading.Thread(
+            target=lambda: devices.append(self.skybell.get_devices()))
+        listing.daemon = True
+        listing.start()
+        listing.join(5)
+
+        # Test
+        self.assertFalse(listing.is_alive())
+        self.assertEqual(devices, [[]])
+
+        logouts[0].join(5)
+        self.assertFalse(logouts[0].is_alive())
+
+    @requests_mock.mock()
+    def tests_throttled_retry(self, m):
+        """Check that throttled requests back off instead of logging in."""
+        m.post(CONST.LOGIN_URL, text=LOGIN.post_response_ok())
+        m.get(CONST.DEVICES_URL, [
+            {'text': '', 'status_code': 429, 'headers': {'Retry-After': '0'}},
+            {'text': '', 'status_code': 503},
+            {'text': DEVICE.EMPTY_DEVICE_RESPONSE, 'status_code': 200}
+        ])
+
+        skybell = skybellpy.Skybell(username=USERNAME,
+                                    password=PASSWORD,
+                                    disable_cache=True,
+                                    login_sleep=False,
+                                    backoff_base=0.01)
+
+        self.assertEqual(skybell.get_devices(), [])
+
+        # Only the initial login, the retries reused the access token
+        logins = [request for request in m.request_history
+                  if request.url == CONST.LOGIN_URL]
+        self.assertEqual(len(logins), 1)
+        self.assertEqual(skybell.stats[CONST.STAT_RETRIES], 2)
+
+    @requests_mock.mock()
+    def tests_client_error(self, m):
+        """Check that client errors fail without a retry or login."""
+        m.post(CONST.LOGIN_URL, text=LOGIN.post_response_ok())
+        m.get(CONST.DEVICES_URL, text='', status_code=404)
+
+        with self.assertRaises(skybellpy.SkybellException):
+            self.skybell.get_devices()
+
+        self.assertEqual(m.call_count, 2)
+
+    @requests_mock.mock()
+    def tests_circuit_breaker(self, m):
+        """Check that a failing endpoint family stops being requested."""
+        m.post(CONST.LOGIN_URL, text=LOGIN.post_response_ok())
+        m.get(CONST.DEVICES_URL, text='', status_code=503)
+
+        skybell = skybellpy.Skybell(username=USERNAME,
+                                    password=PASSWORD,
+                                    disable_cache=True,
+                                    login_sleep=False,
+                                    max_retries=0,
+                                    breaker_threshold=2,
+                                    breaker_cooldown=0.1)
+
+        for _ in range(2):
+            with self.assertRaises(skybellpy.SkybellException):
+                skybell.get_devices(refresh=True)
+
+        # The breaker is open, nothing is sent
+        calls = m.call_count
+
+        with self.assertRaises(skybellpy.SkybellException) as context:
+            skybell.get_devices(refresh=True)
+
+        self.assertEqual(context.exception.errcode, 11)
+        self.assertEqual(m.call_count, calls)
+        self.assertEqual(skybell.stats[CONST.STAT_SHORT_CIRCUITS], 1)
+
+        # After the cooldown a trial request closes it again
+        time.sleep(0.15)
+        m.get(CONST.DEVICES_URL, text=DEVICE.EMPTY_DEVICE_RESPONSE)
+
+        self.assertEqual(skybell.get_devices(refresh=True), [])
+
+    @requests_mock.mock()
+    def tests_circuit_breaker_trial(self, m):
+        """Check that a trial answered with a client error settles."""
+        m.post(CONST.LOGIN_URL, text=LOGIN.post_response_ok())
+
+        skybell = skybellpy.Skybell(username=USERNAME,
+                                    password=PASSWORD,
+                                    disable_cache=True,
+                                    login_sleep=False,
+                                    max_retries=0,
+                                    breaker_threshold=1,
+                                    breaker_cooldown=0.1)
+
+        def _trip():
+            """Open the breaker and wait for the cooldown to end."""
+            m.get(CONST.DEVICES_URL, text='', status_code=503)
+
+            with self.assertRaises(skybellpy.SkybellException):
+                skybell.get_devices(refresh=True)
+
+            time.sleep(0.15)
+
+        # A trial that isn't found still reached the server
+        _trip()
+        m.get(CONST.DEVICES_URL, text='', status_code=404)
+
+        with self.assertRaises(skybellpy.SkybellException) as context:
+            skybell.get_devices(refresh=True)
+
+        self.assertEqual(context.exception.errcode, 3)
+
+        m.get(CONST.DEVICES_URL, text=DEVICE.EMPTY_DEVICE_RESPONSE)
+        self.assertEqual(skybell.get_devices(refresh=True), [])
+
+        # A trial that needs a new login is retried without being refused
+        _trip()
+        m.get(CONST.DEVICES_URL, [
+            {'text': '', 'status_code': 401},
+            {'text': DEVICE.EMPTY_DEVICE_RESPONSE}])
+
+        self.assertEqual(skybell.get_devices(refresh=True), [])
+        self.assertNotIn(CONST.STAT_SHORT_CIRCUITS, skybell.stats)
+
+        skybell.close()
+
     @requests_mock.mock()
     def tests_cookies(self, m):
         """Check that cookies are saved and loaded successfully."""
@@ -372,8 +582,10 @@ class TestSkybell(unittest.TestCase):
         self.assertIsNotNone(dev2_dev)
         self.assertEqual(json.loads(dev1), dev1_dev._device_json)
         self.assertEqual(json.loads(dev2), dev2_dev._device_json)
-        self.assertEqual(json.loads(dev1_avatar), dev1_dev._avatar_json)
-        self.assertEqual(json.loads(dev2_avatar), dev2_dev._avatar_json)
+        self.assertEqual(json.loads(dev1)[CONST.AVATAR],
+                         dev1_dev._avatar_json)
+        self.assertEqual(json.loads(dev2)[CONST.AVATAR],
+                         dev2_dev._avatar_json)
         self.assertEqual(json.loads(dev1_info), dev1_dev._info_json)
         self.assertEqual(json.loads(dev2_info), dev2_dev._info_json)
         self.assertEqual(json.loads(dev1_settings),
@@ -460,3 +672,210 @@ class TestSkybell(unittest.TestCase):
         dev2b_dev = self.skybell.get_device(dev2_devid)
         self.assertEqual(json.loads(dev2b)['id'], dev2b_dev.device_id)
         self.assertIs(dev2a_dev, dev2b_dev)
+
+    @requests_mock.mock()
+    def test_bulk_hydrate(self, m):
+        """Check that devices are seeded from the subscriptions list."""
+        skybell = skybellpy.Skybell(username=USERNAME,
+                                    password=PASSWORD,
+                                    disable_cache=True,
+                                    login_sleep=False,
+                                    bulk_hydrate=True)
+
+        m.post(CONST.LOGIN_URL, text=LOGIN.post_response_ok())
+
+        devices = {}
+
+        # Subscriptions only embed the device and its owner, the avatar
+        # comes with the device json
+        for dev_id in ('dev1', 'dev2'):
+            devices[dev_id] = DEVICE.get_response_ok(name=dev_id,
+                                                     dev_id=dev_id)
+
+            m.get(str.replace(CONST.DEVICE_INFO_URL, '$DEVID$', dev_id),
+                  text=DEVICE_INFO.get_response_ok(dev_id=dev_id))
+            m.get(str.replace(CONST.DEVICE_SETTINGS_URL, '$DEVID$', dev_id),
+                  text=DEVICE_SETTINGS.get_response_ok())
+            m.get(str.replace(CONST.DEVICE_ACTIVITIES_URL, '$DEVID$', dev_id),
+                  text=DEVICE_ACTIVITIES.EMPTY_ACTIVITIES_RESPONSE)
+
+        m.get(CONST.SUBSCRIPTIONS_URL, text='[' + ','.join(
+            SUBSCRIPTIONS.get_response_ok(device=device, sub_id=dev_id)
+            for dev_id, device in devices.items()) + ']')
+
+        self.assertEqual(len(skybell.get_devices()), 2)
+
+        # One listing request, then info, settings and activities per device
+        self.assertEqual(
+            sum(request.url != CONST.LOGIN_URL
+                for request in m.request_history), 7)
+        self.assertFalse(any(
+            request.url.endswith('/avatar/')
+            for request in m.request_history))
+
+        # pylint: disable=W0212
+        dev1_dev = skybell.get_device('dev1')
+        self.assertEqual(dev1_dev.name, 'dev1')
+        self.assertEqual(dev1_dev.image,
+                         json.loads(devices['dev1'])['avatar']['url'])
+        self.assertEqual(
+            json.loads(DEVICE_INFO.get_response_ok(dev_id='dev1')),
+            dev1_dev._info_json)
+        self.assertEqual(json.loads(DEVICE_SETTINGS.get_response_ok()),
+                         dev1_dev._settings_json)
+
+        # Refreshing the list reuses the same devices
+        skybell.get_devices(refresh=True)
+        self.assertIs(skybell.get_device('dev1'), dev1_dev)
+
+    @requests_mock.mock()
+    def tests_apply_settings(self, m):
+        """Check that settings are sent as one PATCH per device."""
+        skybell = skybellpy.Skybell(username=USERNAME,
+                                    password=PASSWORD,
+                                    disable_cache=True,
+                                    login_sleep=False,
+                                    max_workers=4)
+
+        m.post(CONST.LOGIN_URL, text=LOGIN.post_response_ok())
+        m.get(CONST.DEVICES_URL, text='[' + ','.join(
+            DEVICE.get_response_ok(name=dev_id, dev_id=dev_id)
+            for dev_id in ('dev1', 'dev2')) + ']')
+
+        patches = {}
+
+        for dev_id in ('dev1', 'dev2'):
+            def _url(url, dev_id=dev_id):
+                """Return a device specific url."""
+                return str.replace(url, '$DEVID$', dev_id)
+
+            m.get(_url(CONST.DEVICE_AVATAR_URL),
+                  text=DEVICE_AVATAR.get_response_ok())
+            m.get(_url(CONST.DEVICE_INFO_URL),
+                  text=DEVICE_INFO.get_response_ok(dev_id=dev_id))
+            m.get(_url(CONST.DEVICE_SETTINGS_URL),
+                  text=DEVICE_SETTINGS.get_response_ok())
+            m.get(_url(CONST.DEVICE_ACTIVITIES_URL),
+                  text=DEVICE_ACTIVITIES.EMPTY_ACTIVITIES_RESPONSE)
+            patches[dev_id] = m.patch(_url(CONST.DEVICE_SETTINGS_URL),
+                                      text=DEVICE_SETTINGS.PATCH_RESPONSE_OK)
+
+        scene = {
+            CONST.SETTINGS_DO_NOT_DISTURB: 'true',
+            CONST.SETTINGS_MOTION_THRESHOLD:
+                CONST.SETTINGS_MOTION_THRESHOLD_LOW,
+            CONST.SETTINGS_LED_INTENSITY: 50
+        }
+
+        # Nothing is sent unless every device's settings are valid
+        with self.assertRaises(skybellpy.SkybellException):
+            skybell.apply_settings({
+                'dev1': scene,
+                'dev2': {CONST.SETTINGS_LED_INTENSITY: 500}})
+
+        with self.assertRaises(skybellpy.SkybellException):
+            skybell.apply_settings({'dev1': scene, 'dev3': scene})
+
+        self.assertEqual(patches['dev1'].call_count, 0)
+
+        results, errors = skybell.apply_settings(
+            {'dev1': scene, 'dev2': scene})
+
+        self.assertEqual(errors, {})
+        self.assertEqual(results, {'dev1': scene, 'dev2': scene})
+
+        for dev_id in ('dev1', 'dev2'):
+            self.assertEqual(patches[dev_id].call_count, 1)
+            self.assertEqual(patches[dev_id].last_request.json(), scene)
+            self.assertEqual(skybell.get_device(dev_id).led_intensity, 50)
+
+        skybell.close()
+
+    @requests_mock.mock()
+    def tests_reconcile(self, m):
+        """Check that devices are brought to a desired state."""
+        skybell = skybellpy.Skybell(username=USERNAME,
+                                    password=PASSWORD,
+                                    disable_cache=True,
+                                    login_sleep=False,
+                                    max_retries=0,
+                                    backoff_base=0.01)
+
+        m.post(CONST.LOGIN_URL, text=LOGIN.post_response_ok())
+        m.get(CONST.DEVICES_URL, text='[' + ','.join(
+            DEVICE.get_response_ok(name=dev_id, dev_id=dev_id)
+            for dev_id in ('dev1', 'dev2', 'dev3')) + ']')
+
+        patches = {}
+
+        for dev_id in ('dev1', 'dev2', 'dev3'):
+            def _url(url, dev_id=dev_id):
+                """Return a device specific url."""
+                return str.replace(url, '$DEVID$', dev_id)
+
+            m.get(_url(CONST.DEVICE_AVATAR_URL),
+                  text=DEVICE_AVATAR.get_response_ok())
+            m.get(_url(CONST.DEVICE_INFO_URL),
+                  text=DEVICE_INFO.get_response_ok(dev_id=dev_id))
+            m.get(_url(CONST.DEVICE_SETTINGS_URL),
+                  text=DEVICE_SETTINGS.get_response_ok())
+            m.get(_url(CONST.DEVICE_ACTIVITIES_URL),
+                  text=DEVICE_ACTIVITIES.EMPTY_ACTIVITIES_RESPONSE)
+            patches[dev_id] = m.patch(
+                _url(CONST.DEVICE_SETTINGS_URL),
+                [{'status_code': 500, 'text': ''},
+                 {'text': DEVICE_SETTINGS.PATCH_RESPONSE_OK}]
+                if dev_id == 'dev2' else
+                [{'text': DEVICE_SETTINGS.PATCH_RESPONSE_OK}])
+
+        led = skybell.get_device('dev1').led_intensity
+        desired = {
+            'default': {CONST.SETTINGS_LED_INTENSITY: led},
+            'groups': {
+                'front': {
+                    'devices': ['dev1', 'dev2'],
+                    'settings': {CONST.SETTINGS_DO_NOT_DISTURB: 'true'}
+                }
+            },
+            'devices': {
+                'dev2': {CONST.SETTINGS_LED_INTENSITY: 50}
+            }
+        }
+
+        # Unknown devices fail before anything is sent
+        with self.assertRaises(skybellpy.SkybellException):
+            skybell.reconcile({'devices': {'dev4': {}}})
+
+        report = skybell.reconcile(desired, dry_run=True)
+
+        self.assertTrue(report.dry_run)
+        self.assertEqual(report.plan, {
+            'dev1': {CONST.SETTINGS_DO_NOT_DISTURB: 'true'},
+            'dev2': {CONST.SETTINGS_DO_NOT_DISTURB: 'true',
+                     CONST.SETTINGS_LED_INTENSITY: 50},
+            'dev3': {}
+        })
+        self.assertEqual(report.unchanged, ['dev3'])
+        self.assertEqual(report.pending, ['dev1', 'dev2'])
+
+        for dev_id in ('dev1', 'dev2', 'dev3'):
+            self.assertEqual(patches[dev_id].call_count, 0)
+
+        report = skybell.reconcile(desired)
+
+        self.assertTrue(report.ok)
+        self.assertEqual(report.pending, [])
+        self.assertEqual(sorted(report.applied), ['dev1', 'dev2'])
+        self.assertEqual(report.attempts, {'dev1': 1, 'dev2': 2})
+        self.assertEqual(patches['dev1'].call_count, 1)
+        self.assertEqual(patches['dev2'].call_count, 2)
+        self.assertEqual(patches['dev3'].call_count, 0)
+        self.assertEqual(skybell.get_device('dev2').led_intensity, 50)
+
+        # Once in the desired state there is nothing left to send
+        report = skybell.reconcile(desired)
+
+        self.assertEqual(report.unchanged, ['dev1', 'dev2', 'dev3'])
+        self.assertEqual(patches['dev1'].call_count, 1)
+
+        skybell.close()